@@ -1,23 +1,43 @@
 # app/db.py
 
+import math
+import time
+from typing import Any, Callable
+
+from fastapi import Request, Response
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
+from app.utils.metrics import db_replica_available, instrument_engine, timed_pool_class
+from app.utils.replicas import READ_PRIMARY_COOKIE, Replica, ReplicaSet, wants_primary
 
 # Engine with hardened pool options inspired by your db_pg.py patterns:
 # - pool_pre_ping: test connections before use, auto-dispose broken ones
 # - pool_size / max_overflow: small but non-trivial concurrency
 # - pool_recycle: recycle connections periodically to avoid stale TCP
-engine = create_engine(
-    settings.DATABASE_URL,
-    future=True,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=1800,  # seconds
-    connect_args={"connect_timeout": 10},
-)
+# The pool class records checkout waits for /metrics (pool exhaustion shows
+# up as db_pool_checkout_wait_seconds rather than unexplained stalls).
+def _create_engine(url: str, label: str, connect_timeout: int = 10):
+    sync_engine = create_engine(
+        url,
+        future=True,
+        poolclass=timed_pool_class(QueuePool, label),
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=1800,  # seconds
+        connect_args={"connect_timeout": connect_timeout},
+    )
+    instrument_engine(sync_engine, label)
+    return sync_engine
+
+
+engine = _create_engine(settings.DATABASE_URL, "sync")
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -40,13 +60,229 @@ def get_db():
         db.close()
 
 
-def init_db() -> None:
+# -----------------------------------------------------------------------------
+# Async mode (DB_ASYNC=1)
+#
+# Routes are `async def` and talk to the database through an AsyncSession,
+# running ConversationService's (sync) methods via `await db.run_sync(...)`.
+# With DB_ASYNC=1 that session sits on an async psycopg engine and the whole
+# request stays on the event loop. Otherwise get_async_db hands out a
+# ThreadpoolSession: the same interface over the sync engine, with each call
+# offloaded to Starlette's threadpool as the old sync routes were.
+# -----------------------------------------------------------------------------
+
+
+def _async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+psycopg")
+    return parsed.render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    def _create_async_engine(url: str, label: str, connect_timeout: int = 10):
+        created = create_async_engine(
+            _async_database_url(url),
+            poolclass=timed_pool_class(AsyncAdaptedQueuePool, label),
+            pool_pre_ping=True,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=1800,  # seconds
+            connect_args={"connect_timeout": connect_timeout},
+        )
+        instrument_engine(created.sync_engine, label)
+        return created
+
+    async_engine = _create_async_engine(settings.DATABASE_URL, "async")
+
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+class ThreadpoolSession:
+    """
+    AsyncSession-compatible facade over a sync Session (DB_ASYNC=0).
+
+    Only the subset the routes use is provided: run_sync, connection,
+    commit, rollback and close.
+    """
+
+    def __init__(self, sync_session: Session):
+        self.sync_session = sync_session
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def connection(self) -> Any:
+        return await run_in_threadpool(self.sync_session.connection)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+def _primary_session():
+    if AsyncSessionLocal is not None:
+        return AsyncSessionLocal()
+    return ThreadpoolSession(SessionLocal())
+
+
+async def get_async_db():
+    """
+    FastAPI dependency that yields an AsyncSession (or ThreadpoolSession).
+    """
+    db = _primary_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# -----------------------------------------------------------------------------
+# Read replicas (DATABASE_REPLICA_URLS)
+#
+# get_read_db hands out a session on a healthy replica, chosen by
+# REPLICA_STRATEGY, and falls back to the primary. Connecting happens up
+# front (pool_pre_ping doubles as the health check), so a dead replica is
+# ejected and the next one tried before the route runs. get_write_db is the
+# primary session for a client's own writes; it also pins that client's
+# reads to the primary for READ_YOUR_WRITES_SECONDS. With no replicas
+# configured both are plain primary sessions.
+# -----------------------------------------------------------------------------
+
+
+def _create_replica(index: int, url: str) -> Replica:
+    name = f"replica{index}"
+    timeout = settings.REPLICA_CONNECT_TIMEOUT_SECONDS
+    sync_engine = _create_engine(url, f"{name}:sync", timeout)
+    async_factory = None
+    if settings.DB_ASYNC:
+        replica_async_engine = _create_async_engine(url, f"{name}:async", timeout)
+        async_factory = async_sessionmaker(
+            bind=replica_async_engine, autoflush=False, expire_on_commit=False
+        )
+    replica = Replica(
+        name,
+        sessionmaker(bind=sync_engine, autoflush=False, autocommit=False, expire_on_commit=False),
+        async_factory,
+        eject_seconds=settings.REPLICA_EJECT_SECONDS,
+    )
+    replica.watch(sync_engine)
+    if settings.DB_ASYNC:
+        replica.watch(replica_async_engine.sync_engine)
+    return replica
+
+
+read_replicas = ReplicaSet(
+    [_create_replica(i, url) for i, url in enumerate(settings.DATABASE_REPLICA_URLS, 1)],
+    settings.REPLICA_STRATEGY,
+)
+db_replica_available.add_source(
+    lambda: [((r.name,), int(r.available)) for r in read_replicas.replicas]
+)
+
+
+def open_read_session(primary: bool = False) -> Session:
+    """
+    Sync session for a read-only caller: a healthy replica, else the primary.
+    """
+    if not primary:
+        for replica in read_replicas.candidates():
+            db = replica.session_factory()
+            try:
+                db.connection()
+            except DBAPIError:
+                db.close()
+                replica.eject()
+                continue
+            except BaseException:
+                db.close()
+                replica.breaker.release()
+                raise
+            replica.restore()
+            return db
+    return SessionLocal()
+
+
+async def _open_replica_session():
+    for replica in read_replicas.candidates():
+        if AsyncSessionLocal is not None:
+            db = replica.async_session_factory()
+        else:
+            db = ThreadpoolSession(replica.session_factory())
+        try:
+            await db.connection()
+        except DBAPIError:
+            await db.close()
+            replica.eject()
+            continue
+        except BaseException:
+            await db.close()
+            replica.breaker.release()
+            raise
+        replica.restore()
+        return db
+    return None
+
+
+async def get_read_db(request: Request):
+    """
+    FastAPI dependency for read-only routes; yields the same session types as
+    get_async_db.
+    """
+    db = None
+    if read_replicas and not wants_primary(request.cookies, request.headers):
+        db = await _open_replica_session()
+    if db is None:
+        db = _primary_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_write_db(response: Response):
+    """
+    FastAPI dependency for a client's own writes: a primary session, plus the
+    cookie that keeps its reads on the primary until replicas catch up.
+    """
+    if read_replicas and settings.READ_YOUR_WRITES_SECONDS > 0:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            f"{time.time() + settings.READ_YOUR_WRITES_SECONDS:.3f}",
+            max_age=math.ceil(settings.READ_YOUR_WRITES_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+    db = _primary_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def init_db(migrate: bool = settings.MIGRATE_ON_STARTUP) -> int:
     """
-    Create all tables on startup.
+    Startup schema check; returns the schema version.
 
-    For a real production system you'd use Alembic, but for this
-    take-home, auto-creating the schema is a pragmatic choice.
+    One query against schema_migrations when the database is current. A
+    database that is behind is migrated (under an advisory lock, so workers
+    starting together don't race) or, with migrate=False, rejected. See
+    app/migrations.
     """
-    from app import models
+    from app.migrations import check_schema
 
-    models.Base.metadata.create_all(bind=engine)
+    return check_schema(engine, migrate=migrate)
@@ -1,12 +1,52 @@
-from fastapi import FastAPI
+import threading
+from contextlib import asynccontextmanager
 
-from app.db import init_db
-from app.routers import messages, webhooks, conversations
+from fastapi import FastAPI, Response
 
-# Ensure DB tables are created
-init_db()
+from app.config import settings
+from app.db import SessionLocal, engine, init_db
+from app.routers import messages, webhooks, conversations, providers, realtime
+from app.services.outbox_dispatcher import start_worker_threads
+from app.services.realtime import start_listener
+from app.utils.idempotency import send_idempotency, webhook_dedupe
+from app.utils.metrics import MetricsMiddleware, render
+from app.utils.sql_profiler import SqlProfilerMiddleware, recent_profiles
 
-app = FastAPI(title="Messaging Service", version="0.3.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema version check (and migrations, if MIGRATE_ON_STARTUP) runs here
+    # rather than at import, so importing the app never touches the database
+    init_db()
+
+    # Only needed once per boot; kept out of the import path
+    from app.services.partitions import ensure_future_partitions, is_partitioned
+
+    # Warm the webhook dedupe filter so replays right after a deploy stay cheap
+    with SessionLocal() as db:
+        webhook_dedupe.warm(db)
+        send_idempotency.purge_expired(db)
+        # Upcoming months get their messages partitions before traffic arrives
+        if is_partitioned(db):
+            ensure_future_partitions(db)
+            db.commit()
+
+    # Optional in-process outbox dispatchers; bin/dispatcher.sh runs them standalone
+    stop = threading.Event()
+    start_worker_threads(settings.OUTBOX_INPROCESS_WORKERS, stop)
+    # Other processes' new messages reach this process's push subscribers
+    if settings.REALTIME_NOTIFY:
+        start_listener(engine, SessionLocal, stop)
+    yield
+    stop.set()
+
+
+app = FastAPI(title="Messaging Service", version="0.3.0", lifespan=lifespan)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if settings.SQL_PROFILER_ENABLED:
+    app.add_middleware(SqlProfilerMiddleware)
 
 # Match the endpoints expected by bin/test.sh:
 """
@@ -20,8 +60,24 @@ app = FastAPI(title="Messaging Service", version="0.3.0")
 app.include_router(messages.router, prefix="/api/messages", tags=["messages"])
 app.include_router(webhooks.router, prefix="/api/webhooks", tags=["webhooks"])
 app.include_router(conversations.router, prefix="/api/conversations", tags=["conversations"])
+app.include_router(realtime.router, prefix="/api/conversations", tags=["realtime"])
+app.include_router(providers.router, prefix="/api/providers", tags=["providers"])
 
 
 @app.get("/healthz")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus text exposition format
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+if settings.SQL_PROFILER_ENABLED:
+
+    @app.get("/debug/sql", include_in_schema=False)
+    def sql_profiles(limit: int = 20):
+        # Recent per-request statement profiles, newest first
+        return recent_profiles(limit)
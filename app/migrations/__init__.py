@@ -0,0 +1,237 @@
+"""
+Versioned schema migrations.
+
+Each module in this package named mNNNN_<description>.py defines
+`upgrade(conn)`; migrations are applied once each, in version order, in
+their own transaction, and recorded in schema_migrations. Runs are
+serialized with an advisory lock, so any number of workers or deploy jobs
+can call upgrade() at once.
+
+Startup only runs check_schema(): one query reading the recorded versions,
+which are compared with the modules here by number and name. Apply
+migrations as a deploy step
+
+    python -m app.migrations upgrade
+    python -m app.migrations current
+    ./bin/migrate.sh upgrade
+
+or let the first worker do it (MIGRATE_ON_STARTUP=1, the default).
+
+New migrations are plain DDL written against the schema as it was: never
+edit one that has shipped, and never import app.models from one. Keep them
+idempotent (IF NOT EXISTS, or has_column() around a backfill): databases
+adopted from a create_all() of a later release already have some changes.
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+# Distinct from the partition maintenance lock in app/services/partitions.py
+_ADVISORY_LOCK_KEY = 0x6D696772
+
+_MODULE_NAME = re.compile(r"^m(\d{4})_(\w+)$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: str
+
+    def upgrade(self, conn: Connection) -> None:
+        importlib.import_module(f"{__name__}.{self.module}").upgrade(conn)
+
+
+def available() -> list[Migration]:
+    """
+    Migrations shipped with this code, oldest first. Modules are only
+    imported when applied.
+    """
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(info.name)
+        if match:
+            found.append(Migration(int(match.group(1)), match.group(2), info.name))
+    return sorted(found, key=lambda m: m.version)
+
+
+def head() -> int:
+    migrations = available()
+    return migrations[-1].version if migrations else 0
+
+
+def recorded(conn: Connection) -> dict[int, str]:
+    """
+    Applied migrations as {version: name}; empty for a database that has
+    never been migrated.
+    """
+    try:
+        return dict(conn.execute(text("SELECT version, name FROM schema_migrations")).all())
+    except ProgrammingError:
+        # No schema_migrations table yet
+        conn.rollback()
+        return {}
+
+
+def current_version(conn: Connection) -> int:
+    """
+    Newest applied version; 0 for a database that has never been migrated.
+    """
+    return max(recorded(conn), default=0)
+
+
+# (version, name) rows written before 0001 became the pre-migrations
+# baseline and the later modules were renumbered. Those databases already
+# had every change the renumbered modules make, and each module is
+# idempotent, so the old rows are accepted as they are.
+RENUMBERED = {
+    (2, "message_change_xid"),
+    (3, "drop_conversations_version_index"),
+    (4, "message_customer_id"),
+}
+
+
+class SchemaHistoryMismatch(RuntimeError):
+    pass
+
+
+def check_history(applied: dict[int, str]) -> None:
+    """
+    Raise SchemaHistoryMismatch if a recorded version names a different
+    migration than the module shipped under that number: a migration was
+    renumbered or renamed, and upgrade() (which only compares versions)
+    would skip or repeat work.
+    """
+    names = {m.version: m.name for m in available()}
+    mismatched = sorted(
+        version
+        for version, name in applied.items()
+        if version in names and name != names[version] and (version, name) not in RENUMBERED
+    )
+    if mismatched:
+        raise SchemaHistoryMismatch(
+            "schema_migrations disagrees with app/migrations at "
+            + ", ".join(f"{v:04d} ({applied[v]} vs {names[v]})" for v in mismatched)
+        )
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> list[int]:
+    """
+    Apply every pending migration up to `target` (default: all). Returns the
+    versions applied.
+    """
+    applied = []
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        try:
+            conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                    " version INTEGER PRIMARY KEY,"
+                    " name VARCHAR NOT NULL,"
+                    " applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL)"
+                )
+            )
+            conn.commit()
+            # Read under the lock: another process may have just finished
+            applied_before = recorded(conn)
+            conn.commit()
+            check_history(applied_before)
+            current = max(applied_before, default=0)
+            for migration in available():
+                if migration.version <= current or (target is not None and migration.version > target):
+                    continue
+                with conn.begin():
+                    migration.upgrade(conn)
+                    conn.execute(
+                        text(
+                            "INSERT INTO schema_migrations (version, name, applied_at)"
+                            " VALUES (:version, :name, :applied_at)"
+                        ),
+                        {
+                            "version": migration.version,
+                            "name": migration.name,
+                            "applied_at": datetime.now(UTC).replace(tzinfo=None),
+                        },
+                    )
+                logger.info("Applied migration %04d_%s", migration.version, migration.name)
+                applied.append(migration.version)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+    return applied
+
+
+# -----------------------------------------------------------------------------
+# Helpers for migration modules
+# -----------------------------------------------------------------------------
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    """
+    Whether `table` in the current schema already has `column`; lets a
+    migration skip a backfill that a database created by a later
+    create_all() does not need.
+    """
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.columns"
+                " WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+            ),
+            {"table": table, "column": column},
+        ).first()
+        is not None
+    )
+
+
+def create_enum(conn: Connection, name: str, labels: tuple[str, ...]) -> None:
+    values = ", ".join(f"'{label}'" for label in labels)
+    # CREATE TYPE has no IF NOT EXISTS
+    conn.exec_driver_sql(
+        f"DO $$ BEGIN CREATE TYPE {name} AS ENUM ({values});"
+        " EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+    )
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def check_schema(engine: Engine, migrate: bool = False) -> int:
+    """
+    Startup check: make sure the database is at this code's schema version,
+    with the same migration recorded under each version (check_history()).
+
+    Behind: migrate if `migrate`, else raise SchemaOutOfDate. Ahead (a newer
+    deploy already migrated) is logged and allowed, since migrations are
+    expected to stay compatible with the previous release.
+    """
+    latest = head()
+    with engine.connect() as conn:
+        applied = recorded(conn)
+    check_history(applied)
+    current = max(applied, default=0)
+    if current < latest:
+        if not migrate:
+            raise SchemaOutOfDate(
+                f"Database schema is at version {current}, this code needs {latest};"
+                " run `python -m app.migrations upgrade`"
+            )
+        upgrade(engine)
+        return latest
+    if current > latest:
+        logger.warning("Database schema version %d is newer than this code (%d)", current, latest)
+    return current
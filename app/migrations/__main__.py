@@ -0,0 +1,30 @@
+import argparse
+import logging
+
+from app.db import engine
+from app.migrations import available, current_version, upgrade
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    up = commands.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--to", type=int, help="stop at this version")
+    commands.add_parser("current", help="show applied and pending versions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+        return
+
+    with engine.connect() as conn:
+        current = current_version(conn)
+    for migration in available():
+        state = "applied" if migration.version <= current else "pending"
+        print(f"{migration.version:04d} {migration.name:<32} {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Baseline: the schema as the original init_db() (create_all) built it, before
+migrations existed.
+
+Every statement is idempotent, so a database created by that init_db() is
+adopted as version 1 without changes and brought forward by the migrations
+after this one.
+"""
+
+from sqlalchemy.engine import Connection
+
+from app.migrations import create_enum
+
+ENUMS = {
+    "contactaddresstype": ("PHONE", "EMAIL"),
+    "messagechannel": ("SMS", "EMAIL"),
+    "messagetype": ("SMS", "MMS", "EMAIL"),
+    "messagedirection": ("INBOUND", "OUTBOUND"),
+    "participantrole": ("CUSTOMER", "CONTACT"),
+}
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS contacts (
+        id SERIAL NOT NULL,
+        address VARCHAR NOT NULL,
+        address_type contactaddresstype NOT NULL,
+        is_customer_owned BOOLEAN NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_contacts_id ON contacts (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_contacts_address_type ON contacts (address, address_type)",
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id SERIAL NOT NULL,
+        subject TEXT,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_conversations_id ON conversations (id)",
+    """
+    CREATE TABLE IF NOT EXISTS conversation_participants (
+        conversation_id INTEGER NOT NULL,
+        contact_id INTEGER NOT NULL,
+        role participantrole NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (conversation_id, contact_id),
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE,
+        FOREIGN KEY (contact_id) REFERENCES contacts (id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conv_participants_contact_id"
+    " ON conversation_participants (contact_id)",
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id SERIAL NOT NULL,
+        conversation_id INTEGER NOT NULL,
+        channel messagechannel NOT NULL,
+        message_type messagetype NOT NULL,
+        direction messagedirection NOT NULL,
+        provider_type VARCHAR,
+        provider_message_id VARCHAR,
+        from_contact_id INTEGER NOT NULL,
+        to_contact_id INTEGER NOT NULL,
+        body TEXT,
+        attachments JSON,
+        sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        received_at TIMESTAMP WITHOUT TIME ZONE,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE,
+        FOREIGN KEY (from_contact_id) REFERENCES contacts (id),
+        FOREIGN KEY (to_contact_id) REFERENCES contacts (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation_sent_at ON messages (conversation_id, sent_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_messages_provider_type_message_id"
+    " ON messages (provider_type, provider_message_id) WHERE provider_message_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_messages_from_contact_id ON messages (from_contact_id)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_id ON messages (id)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_to_contact_id ON messages (to_contact_id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for name, labels in ENUMS.items():
+        create_enum(conn, name, labels)
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,72 @@
+"""
+conversations.customer_id / contact_id: one thread per (customer, contact)
+pair, resolved with an upsert on uq_conversations_customer_contact.
+
+Existing threads take the pair from their participant rows, or, missing
+those, from their earliest message (the customer sends outbound and
+receives inbound messages); threads with neither are empty and deleted.
+The old participant lookup could open two threads for one pair under
+concurrent sends; those are merged into the oldest before the unique index
+is built. Recovered threads get their participant rows back.
+"""
+
+from sqlalchemy.engine import Connection
+
+STATEMENTS = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS customer_id INTEGER REFERENCES contacts (id)",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS contact_id INTEGER REFERENCES contacts (id)",
+    "UPDATE conversations SET customer_id = p.contact_id"
+    " FROM conversation_participants p"
+    " WHERE p.conversation_id = conversations.id AND p.role = 'CUSTOMER'"
+    " AND conversations.customer_id IS NULL",
+    "UPDATE conversations SET contact_id = p.contact_id"
+    " FROM conversation_participants p"
+    " WHERE p.conversation_id = conversations.id AND p.role = 'CONTACT'"
+    " AND conversations.contact_id IS NULL",
+    """
+    UPDATE conversations SET
+        customer_id = coalesce(conversations.customer_id, earliest.customer_id),
+        contact_id = coalesce(conversations.contact_id, earliest.contact_id)
+    FROM (
+        SELECT DISTINCT ON (conversation_id)
+            conversation_id,
+            CASE WHEN direction = 'OUTBOUND' THEN from_contact_id ELSE to_contact_id END AS customer_id,
+            CASE WHEN direction = 'OUTBOUND' THEN to_contact_id ELSE from_contact_id END AS contact_id
+        FROM messages
+        ORDER BY conversation_id, sent_at, id
+    ) earliest
+    WHERE earliest.conversation_id = conversations.id
+    AND (conversations.customer_id IS NULL OR conversations.contact_id IS NULL)
+    """,
+    # No participants and no messages: nothing to keep
+    "DELETE FROM conversations WHERE customer_id IS NULL OR contact_id IS NULL",
+    """
+    CREATE TEMPORARY TABLE duplicate_conversations ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, min(id) OVER (PARTITION BY customer_id, contact_id) AS keep_id
+        FROM conversations
+        WHERE customer_id IS NOT NULL AND contact_id IS NOT NULL
+    ) pairs
+    WHERE id <> keep_id
+    """,
+    "UPDATE messages SET conversation_id = d.keep_id"
+    " FROM duplicate_conversations d WHERE messages.conversation_id = d.id",
+    # Participant rows go with the thread (ON DELETE CASCADE)
+    "DELETE FROM conversations USING duplicate_conversations d WHERE conversations.id = d.id",
+    """
+    INSERT INTO conversation_participants (conversation_id, contact_id, role, created_at)
+    SELECT id, customer_id, 'CUSTOMER'::participantrole, created_at FROM conversations
+    UNION ALL
+    SELECT id, contact_id, 'CONTACT'::participantrole, created_at FROM conversations
+    ON CONFLICT DO NOTHING
+    """,
+    "ALTER TABLE conversations ALTER COLUMN customer_id SET NOT NULL",
+    "ALTER TABLE conversations ALTER COLUMN contact_id SET NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_conversations_customer_contact"
+    " ON conversations (customer_id, contact_id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
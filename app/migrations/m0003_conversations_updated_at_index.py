@@ -0,0 +1,12 @@
+"""
+idx_conversations_updated_at: keyset pagination of the conversation list,
+newest activity first.
+"""
+
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at, id)"
+    )
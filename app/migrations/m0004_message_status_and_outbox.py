@@ -0,0 +1,46 @@
+"""
+messages.status and the outbox table: outbound sends are written as pending
+messages plus an outbox entry and delivered by the dispatcher.
+
+Outbound messages stored before this went through the provider before they
+were written, so they are marked SENT; inbound ones keep a NULL status. The
+outbox has no foreign key to messages, which 0008 would have to drop again
+when it partitions messages.
+"""
+
+from sqlalchemy.engine import Connection
+
+from app.migrations import create_enum, has_column
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id SERIAL NOT NULL,
+        message_id INTEGER NOT NULL,
+        channel VARCHAR NOT NULL,
+        message_type VARCHAR NOT NULL,
+        payload JSON NOT NULL,
+        status outboxstatus NOT NULL,
+        attempts INTEGER NOT NULL,
+        next_attempt_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        locked_until TIMESTAMP WITHOUT TIME ZONE,
+        last_error TEXT,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (message_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt_at ON outbox (status, next_attempt_at)",
+    "CREATE INDEX IF NOT EXISTS ix_outbox_id ON outbox (id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    create_enum(conn, "messagestatus", ("PENDING", "SENT", "FAILED"))
+    create_enum(conn, "outboxstatus", ("PENDING", "IN_FLIGHT", "SENT", "DEAD"))
+    if not has_column(conn, "messages", "status"):
+        conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN status messagestatus")
+        conn.exec_driver_sql("UPDATE messages SET status = 'SENT' WHERE direction = 'OUTBOUND'")
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
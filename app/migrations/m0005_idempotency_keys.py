@@ -0,0 +1,28 @@
+"""
+idempotency_keys: stored responses for Idempotency-Key on the send routes.
+"""
+
+from sqlalchemy.engine import Connection
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        id SERIAL NOT NULL,
+        scope VARCHAR NOT NULL,
+        key VARCHAR NOT NULL,
+        fingerprint VARCHAR NOT NULL,
+        response JSON,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_id ON idempotency_keys (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_idempotency_keys_scope_key ON idempotency_keys (scope, key)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
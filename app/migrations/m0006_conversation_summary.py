@@ -0,0 +1,41 @@
+"""
+Denormalized thread summary on conversations (last message, preview, count),
+backfilled from the messages already stored. The preview length matches
+PREVIEW_LENGTH in app/services/conversations_service.py at the time (140).
+"""
+
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+ADD_COLUMNS = """
+    ALTER TABLE conversations
+        ADD COLUMN last_message_at TIMESTAMP WITHOUT TIME ZONE,
+        ADD COLUMN last_message_id INTEGER,
+        ADD COLUMN last_message_direction messagedirection,
+        ADD COLUMN last_message_preview TEXT,
+        ADD COLUMN message_count INTEGER DEFAULT '0' NOT NULL
+"""
+
+BACKFILL = """
+    UPDATE conversations SET
+        last_message_at = latest.sent_at,
+        last_message_id = latest.id,
+        last_message_direction = latest.direction,
+        last_message_preview = left(coalesce(latest.body, ''), 140),
+        message_count = latest.total
+    FROM (
+        SELECT DISTINCT ON (conversation_id)
+            conversation_id, id, sent_at, direction, body,
+            count(*) OVER (PARTITION BY conversation_id) AS total
+        FROM messages
+        ORDER BY conversation_id, sent_at DESC, id DESC
+    ) latest
+    WHERE latest.conversation_id = conversations.id
+"""
+
+
+def upgrade(conn: Connection) -> None:
+    if not has_column(conn, "conversations", "last_message_id"):
+        conn.exec_driver_sql(ADD_COLUMNS)
+        conn.exec_driver_sql(BACKFILL)
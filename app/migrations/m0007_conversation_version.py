@@ -0,0 +1,19 @@
+"""
+conversations.version, drawn from conversation_version_seq on every change
+to a thread; backs the conversation ETags. Adding the column gives each
+existing row its own value.
+"""
+
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+
+def upgrade(conn: Connection) -> None:
+    conn.exec_driver_sql("CREATE SEQUENCE IF NOT EXISTS conversation_version_seq")
+    if not has_column(conn, "conversations", "version"):
+        conn.exec_driver_sql(
+            "ALTER TABLE conversations"
+            " ADD COLUMN version BIGINT DEFAULT nextval('conversation_version_seq') NOT NULL"
+        )
+        conn.exec_driver_sql("CREATE INDEX idx_conversations_version ON conversations (version)")
@@ -0,0 +1,91 @@
+"""
+Range-partition messages by sent_at month, and move provider idempotency to
+message_dedupe_keys (a unique index on a partitioned table has to include
+the partition key).
+
+A plain messages table is rebuilt: renamed aside, replaced by the
+partitioned table with messages_default as its only partition, its rows
+copied over and the old table dropped, all in this migration's transaction
+(messages is locked until it commits). The id sequence is kept, so ids
+carry on. Run `python -m app.services.partitions maintain` afterwards to
+move the copied rows out of messages_default into monthly partitions.
+"""
+
+from sqlalchemy.engine import Connection
+
+COLUMNS = (
+    "id, conversation_id, channel, message_type, direction, provider_type,"
+    " provider_message_id, status, from_contact_id, to_contact_id, body,"
+    " attachments, sent_at, received_at, created_at, updated_at"
+)
+
+DEDUPE_KEYS = [
+    """
+    CREATE TABLE IF NOT EXISTS message_dedupe_keys (
+        provider_type VARCHAR NOT NULL,
+        provider_message_id VARCHAR NOT NULL,
+        sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (provider_type, provider_message_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_message_dedupe_keys_sent_at ON message_dedupe_keys (sent_at)",
+]
+
+REBUILD = [
+    "INSERT INTO message_dedupe_keys (provider_type, provider_message_id, sent_at)"
+    " SELECT provider_type, provider_message_id, min(sent_at) FROM messages"
+    " WHERE provider_type IS NOT NULL AND provider_message_id IS NOT NULL"
+    " GROUP BY provider_type, provider_message_id"
+    " ON CONFLICT DO NOTHING",
+    # messages.id alone stops being unique
+    "ALTER TABLE outbox DROP CONSTRAINT IF EXISTS outbox_message_id_fkey",
+    "ALTER TABLE messages RENAME TO messages_unpartitioned",
+    "ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey",
+    "DROP INDEX idx_messages_conversation_sent_at, uq_messages_provider_type_message_id,"
+    " ix_messages_from_contact_id, ix_messages_id, ix_messages_to_contact_id",
+    """
+    CREATE TABLE messages (
+        id INTEGER DEFAULT nextval('messages_id_seq') NOT NULL,
+        conversation_id INTEGER NOT NULL,
+        channel messagechannel NOT NULL,
+        message_type messagetype NOT NULL,
+        direction messagedirection NOT NULL,
+        provider_type VARCHAR,
+        provider_message_id VARCHAR,
+        status messagestatus,
+        from_contact_id INTEGER NOT NULL,
+        to_contact_id INTEGER NOT NULL,
+        body TEXT,
+        attachments JSON,
+        sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        received_at TIMESTAMP WITHOUT TIME ZONE,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id, sent_at),
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE,
+        FOREIGN KEY (from_contact_id) REFERENCES contacts (id),
+        FOREIGN KEY (to_contact_id) REFERENCES contacts (id)
+    ) PARTITION BY RANGE (sent_at)
+    """,
+    "ALTER SEQUENCE messages_id_seq OWNED BY messages.id",
+    "CREATE TABLE messages_default PARTITION OF messages DEFAULT",
+    f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned",
+    "DROP TABLE messages_unpartitioned",
+    "CREATE INDEX idx_messages_conversation_sent_at ON messages (conversation_id, sent_at)",
+    "CREATE INDEX idx_messages_provider_type_message_id"
+    " ON messages (provider_type, provider_message_id) WHERE provider_message_id IS NOT NULL",
+    "CREATE INDEX ix_messages_from_contact_id ON messages (from_contact_id)",
+    "CREATE INDEX ix_messages_id ON messages (id)",
+    "CREATE INDEX ix_messages_to_contact_id ON messages (to_contact_id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in DEDUPE_KEYS:
+        conn.exec_driver_sql(statement)
+    partitioned = conn.exec_driver_sql(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = 'messages'::regclass"
+    ).scalar()
+    if not partitioned:
+        for statement in REBUILD:
+            conn.exec_driver_sql(statement)
@@ -0,0 +1,17 @@
+"""
+messages.body_tsv: generated full-text search vector over body, with its
+GIN index. Adding the column computes it for every stored row.
+"""
+
+from sqlalchemy.engine import Connection
+
+STATEMENTS = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS body_tsv TSVECTOR GENERATED ALWAYS AS"
+    " (to_tsvector('english'::regconfig, coalesce(body, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS idx_messages_body_tsv ON messages USING gin (body_tsv)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
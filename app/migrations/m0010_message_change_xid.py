@@ -0,0 +1,20 @@
+"""
+messages.change_xid: the transaction that last wrote each row, for delta sync.
+
+Existing rows take this migration's transaction id, so a client syncing from
+scratch still sees every message once.
+"""
+
+from sqlalchemy.engine import Connection
+
+STATEMENTS = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL"
+    " DEFAULT (pg_current_xact_id()::text::bigint)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation_change"
+    " ON messages (conversation_id, change_xid, id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for statement in STATEMENTS:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,10 @@
+"""
+Drop idx_conversations_version: the list ETag is now built from the served
+page's (id, version) pairs instead of max(version).
+"""
+
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection) -> None:
+    conn.exec_driver_sql("DROP INDEX IF EXISTS idx_conversations_version")
@@ -0,0 +1,25 @@
+"""
+messages.customer_id: a copy of the thread's conversations.customer_id, so a
+customer's delta sync reads one index instead of probing every thread.
+
+The backfill is a plain UPDATE, so change_xid keeps its value and clients do
+not see old messages again.
+"""
+
+from sqlalchemy.engine import Connection
+
+from app.migrations import has_column
+
+STATEMENTS = [
+    "ALTER TABLE messages ADD COLUMN customer_id INTEGER REFERENCES contacts (id)",
+    "UPDATE messages SET customer_id = conversations.customer_id"
+    " FROM conversations WHERE conversations.id = messages.conversation_id",
+    "ALTER TABLE messages ALTER COLUMN customer_id SET NOT NULL",
+    "CREATE INDEX idx_messages_customer_change ON messages (customer_id, change_xid, id)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    if not has_column(conn, "messages", "customer_id"):
+        for statement in STATEMENTS:
+            conn.exec_driver_sql(statement)
@@ -2,8 +2,11 @@ from datetime import datetime, UTC
 from enum import Enum as PyEnum
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Computed,
+    DDL,
     DateTime,
     Enum,
     ForeignKey,
@@ -12,11 +15,29 @@ from sqlalchemy import (
     Text,
     JSON,
     Index,
+    Sequence,
+    event,
+    text,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, relationship
 
 Base = declarative_base()
 
+# Global change counter for conversations: every change to a thread takes the
+# next value as its version. A thread's ETag uses its version; values are
+# unique but not commit-ordered, so the list ETag hashes the page's
+# (id, version) pairs instead of taking max(version).
+conversation_version_seq = Sequence("conversation_version_seq", metadata=Base.metadata)
+
+# Text search configuration behind messages.body_tsv; queries must use the
+# same one to hit the GIN index. Changing it means rebuilding the column.
+SEARCH_CONFIG = "english"
+
+# Id of the current transaction as a bigint (xid8 is 64-bit, so it never wraps).
+# Stamped on messages as change_xid; see ConversationService.message_changes.
+CURRENT_XID_SQL = "pg_current_xact_id()::text::bigint"
+
 
 # Enums -------------------------------------------------------------------------
 
@@ -47,6 +68,20 @@ class ParticipantRole(str, PyEnum):
     CONTACT = "contact"
 
 
+class MessageStatus(str, PyEnum):
+    # Outbound delivery state; inbound messages leave it NULL
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboxStatus(str, PyEnum):
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    SENT = "sent"
+    DEAD = "dead"
+
+
 # Models ------------------------------------------------------------------------
 
 
@@ -87,12 +122,32 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(Text, nullable=True)
 
+    # Conversation key: one long-lived thread per (customer, contact) identity pair.
+    # Lets conversation resolution be a single upsert instead of a participant join.
+    customer_id = Column(Integer, ForeignKey("contacts.id"), nullable=False)
+    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False)
+
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC)
 )
     updated_at = Column(
         DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC)
     )
 
+    # Denormalized summary of the thread, maintained by ConversationService on
+    # every message insert so inbox views never have to scan messages.
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_direction = Column(Enum(MessageDirection), nullable=True)
+    last_message_preview = Column(Text, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped from conversation_version_seq whenever the thread or its summary
+    # changes; backs the ETags on the conversation endpoints
+    version = Column(
+        BigInteger,
+        nullable=False,
+        server_default=conversation_version_seq.next_value(),
+    )
+
     participants = relationship(
         "ConversationParticipant",
         back_populates="conversation",
@@ -104,6 +159,17 @@ class Conversation(Base):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (
+        Index(
+            "uq_conversations_customer_contact",
+            "customer_id",
+            "contact_id",
+            unique=True,
+        ),
+        # Keyset pagination for the conversation list (newest activity first)
+        Index("idx_conversations_updated_at", "updated_at", "id"),
+    )
+
 
 class ConversationParticipant(Base):
     __tablename__ = "conversation_participants"
@@ -130,15 +196,21 @@ class ConversationParticipant(Base):
     )
 
 
+# Range-partitioned by sent_at month (app/services/partitions.py creates the
+# monthly partitions and drops expired ones). The partition key has to be part
+# of every unique constraint, so the primary key is (id, sent_at) and provider
+# idempotency lives in MessageDedupeKey instead of a unique index here.
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     conversation_id = Column(
         Integer,
         ForeignKey("conversations.id", ondelete="CASCADE"),
         nullable=False,
     )
+    # Copy of conversations.customer_id, so a customer's delta sync reads one index
+    customer_id = Column(Integer, ForeignKey("contacts.id"), nullable=False)
 
     channel = Column(Enum(MessageChannel), nullable=False)
     message_type = Column(Enum(MessageType), nullable=False)
@@ -146,6 +218,7 @@ class Message(Base):
 
     provider_type = Column(String, nullable=True)
     provider_message_id = Column(String, nullable=True)
+    status = Column(Enum(MessageStatus), nullable=True)
 
     from_contact_id = Column(
         Integer, ForeignKey("contacts.id"), nullable=False, index=True
@@ -156,14 +229,29 @@ class Message(Base):
 
     body = Column(Text, nullable=True)
     attachments = Column(JSON, nullable=True)
+    # Full-text search vector, kept in step with body by Postgres itself.
+    # Deferred: only search queries need it.
+    body_tsv = deferred(
+        Column(
+            TSVECTOR,
+            Computed(f"to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(body, ''))", persisted=True),
+        )
+    )
 
-    sent_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, primary_key=True, nullable=False)
     received_at = Column(DateTime, nullable=True)
 
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
     updated_at = Column(
         DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC)
     )
+    # Transaction that last inserted or updated the row, for delta sync
+    change_xid = Column(
+        BigInteger,
+        nullable=False,
+        server_default=text(f"({CURRENT_XID_SQL})"),
+        onupdate=text(CURRENT_XID_SQL),
+    )
 
     conversation = relationship("Conversation", back_populates="messages")
     # From/To relationships are optional to navigate from Contact → Messages if needed
@@ -173,14 +261,94 @@ class Message(Base):
     __table_args__ = (
         # Fast query for "show me the thread"
         Index("idx_messages_conversation_sent_at", "conversation_id", "sent_at"),
-        # Idempotency for provider callbacks (webhooks)
+        # Delta sync: what changed in these threads since a watermark
+        Index("idx_messages_conversation_change", "conversation_id", "change_xid", "id"),
+        Index("idx_messages_customer_change", "customer_id", "change_xid", "id"),
+        # Lookups by provider id (uniqueness is enforced by message_dedupe_keys)
         Index(
-            "uq_messages_provider_type_message_id",
+            "idx_messages_provider_type_message_id",
             "provider_type",
             "provider_message_id",
-            unique=True,
             postgresql_where=(
                 provider_message_id.isnot(None)  # type: ignore[attr-defined]
             ),
         ),
+        # Full-text search (ConversationService.search_messages)
+        Index("idx_messages_body_tsv", "body_tsv", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (sent_at)"},
+    )
+
+
+# Rows whose sent_at has no monthly partition (yet) land here
+event.listen(
+    Message.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"),
+)
+
+
+# Idempotency for provider callbacks across all message partitions: one row
+# per (provider_type, provider_message_id) ever inserted, claimed in the same
+# transaction as the message. Rows are dropped with their message partition.
+class MessageDedupeKey(Base):
+    __tablename__ = "message_dedupe_keys"
+
+    provider_type = Column(String, primary_key=True)
+    provider_message_id = Column(String, primary_key=True)
+    sent_at = Column(DateTime, nullable=False, index=True)
+
+
+# A provider send for an outbound Message, written in the same transaction as
+# the pending Message and drained by app/services/outbox_dispatcher.py.
+class OutboxEntry(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: messages.id alone is not unique across partitions.
+    # Retention deletes outbox rows along with their message partition.
+    message_id = Column(Integer, nullable=False, unique=True)
+
+    # Provider routing: registry channel ("sms"/"email") plus the message type
+    channel = Column(String, nullable=False)
+    message_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    status = Column(Enum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(UTC))
+    updated_at = Column(
+        DateTime, nullable=False, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC)
+    )
+
+    message = relationship(
+        "Message", primaryjoin="foreign(OutboxEntry.message_id) == Message.id", viewonly=True
+    )
+
+    __table_args__ = (
+        # Dispatcher claim query: due work in next_attempt_at order
+        Index("idx_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+# Stored response for an Idempotency-Key on the send routes, written in the same
+# transaction as the messages it created. See app/utils/idempotency.py.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)  # route, e.g. "sms" or "email/batch"
+    key = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)  # hash of the request body
+    response = Column(JSON, nullable=True)
+
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("uq_idempotency_keys_scope_key", "scope", "key", unique=True),
+        Index("idx_idempotency_keys_expires_at", "expires_at"),
     )
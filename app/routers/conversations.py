@@ -1,37 +1,291 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import datetime, UTC
+from typing import Iterator, Optional
 
-from app.db import get_db
-from app.schemas import ConversationSummary, MessageDTO
-from app.services.conversations_service import ConversationService
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import get_read_db, open_read_session
+from app.schemas import ConversationSummary, MessageChanges, MessageDTO, MessageSearchResult
+from app.services.conversations_service import (
+    CHANGE_FIELDS,
+    CONVERSATION_FIELDS,
+    MESSAGE_FIELDS,
+    ConversationService,
+)
+from app.utils.etag import if_none_match, make_etag
+from app.utils.fast_json import JSONBytesResponse, dumps, rows_to_json
+from app.utils.pagination import decode_cursor, decode_watermark, encode_cursor, split_page
+from app.utils.replicas import wants_primary
 
 router = APIRouter()
 
 conversation_service = ConversationService()
 
 
+# Pagination: both endpoints return at most `limit` rows (default
+# PAGE_SIZE_DEFAULT, capped at PAGE_SIZE_MAX). When more rows exist the opaque
+# cursor for the next page is returned in the X-Next-Cursor header; pass it
+# back as `?cursor=`. The old unbounded listing is opt-in via `?all=true`.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Conditional GET: both endpoints send a strong ETag built from the query
+# string and a version token. For a thread that is conversation.version, so a
+# matching If-None-Match gets 304 after one indexed lookup without loading any
+# messages. For the list it is the (id, version) pairs of the page itself:
+# versions are taken from a sequence before commit, so a max() over them
+# could miss a change committed late with a lower number.
+
+
+def _conditional(
+    request: Request,
+    if_none_match_header: Optional[str],
+    *version,
+) -> tuple[str, Optional[Response]]:
+    etag = make_etag(request.url.path, *version, request.url.query)
+    if if_none_match(if_none_match_header, etag):
+        return etag, Response(status_code=304, headers=_cache_headers(etag))
+    return etag, None
+
+
+def _cache_headers(etag: str) -> dict:
+    # Clients may store the body but must revalidate before reuse
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def _page_params(
+    limit: Optional[int],
+    cursor: Optional[str],
+    include_all: bool,
+):
+    if include_all:
+        return None, None
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX), after
+
+
+# Both list endpoints encode projected row tuples straight to JSON bytes
+# (app/utils/fast_json.py) instead of building a Pydantic model per row;
+# response_model only documents the shape. Headers therefore go on the
+# returned response rather than the injected one.
+
+
 @router.get("/", response_model=list[ConversationSummary])
-def list_conversations(db: Session = Depends(get_db)):
-    rows = conversation_service.list_conversations(db)
-    return [
-        ConversationSummary(id=row["id"], last_updated=row["last_updated"])
-        for row in rows
-    ]
+async def list_conversations(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    include_all: bool = Query(False, alias="all"),
+    db: AsyncSession = Depends(get_read_db),
+    if_none_match_header: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    limit, after = _page_params(limit, cursor, include_all)
+    rows = await db.run_sync(
+        conversation_service.conversation_rows,
+        limit=limit + 1 if limit else None,
+        after=after,
+    )
+    # The look-ahead row is included, so a page gaining a next page changes too
+    etag, not_modified = _conditional(
+        request, if_none_match_header, [(r.id, r.version) for r in rows]
+    )
+    if not_modified:
+        return not_modified
+    headers = _cache_headers(etag)
+
+    rows, next_cursor = split_page(rows, limit, lambda r: (r.last_updated, r.id))
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return JSONBytesResponse(rows_to_json(CONVERSATION_FIELDS, rows), headers=headers)
 
 
 @router.get("/{conversation_id}/messages", response_model=list[MessageDTO])
-def get_conversation_messages(
+async def get_conversation_messages(
+    conversation_id: int,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    include_all: bool = Query(False, alias="all"),
+    db: AsyncSession = Depends(get_read_db),
+    if_none_match_header: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    limit, after = _page_params(limit, cursor, include_all)
+    version = await db.run_sync(conversation_service.conversation_version, conversation_id)
+    headers = {}
+    if version is not None:
+        etag, not_modified = _conditional(request, if_none_match_header, version)
+        if not_modified:
+            return not_modified
+        headers = _cache_headers(etag)
+
+    rows = await db.run_sync(
+        conversation_service.message_rows_for_conversation,
+        conversation_id,
+        limit=limit + 1 if limit else None,
+        after=after,
+    )
+    rows, next_cursor = split_page(rows, limit, lambda r: (r.sent_at, r.id))
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return JSONBytesResponse(rows_to_json(MESSAGE_FIELDS, rows), headers=headers)
+
+
+# Delta sync -------------------------------------------------------------------
+#
+# Clients keep the opaque watermark from their last poll and send it back as
+# `?since=`; the response holds only messages inserted or updated after it
+# (delivery status changes included), oldest change first, and the next
+# watermark. Omit `since` for a first full sync. With has_more=true, poll
+# again straight away. A message can be sent twice; clients upsert by id.
+
+
+def _change_params(since: Optional[str], limit: Optional[int]):
+    try:
+        watermark = decode_watermark(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+
+    return watermark, min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX)
+
+
+def _changes_response(rows, watermark: tuple[int, int], has_more: bool) -> JSONBytesResponse:
+    body = {
+        "messages": [dict(zip(CHANGE_FIELDS, row)) for row in rows],
+        "watermark": encode_cursor(watermark),
+        "has_more": has_more,
+    }
+    return JSONBytesResponse(dumps(body), headers={"Cache-Control": "no-store"})
+
+
+@router.get("/changes", response_model=MessageChanges)
+async def get_customer_changes(
+    customer: str = Query(..., min_length=1),
+    since: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Every thread of one customer address in a single query
+    watermark, limit = _change_params(since, limit)
+    rows, watermark, has_more = await db.run_sync(
+        conversation_service.message_changes, customer=customer, since=watermark, limit=limit
+    )
+    return _changes_response(rows, watermark, has_more)
+
+
+@router.get("/{conversation_id}/messages/changes", response_model=MessageChanges)
+async def get_conversation_changes(
+    conversation_id: int,
+    since: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+):
+    watermark, limit = _change_params(since, limit)
+    if await db.run_sync(conversation_service.conversation_version, conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    rows, watermark, has_more = await db.run_sync(
+        conversation_service.message_changes,
+        conversation_id=conversation_id,
+        since=watermark,
+        limit=limit,
+    )
+    return _changes_response(rows, watermark, has_more)
+
+
+@router.get("/search", response_model=list[MessageSearchResult])
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=500),
+    customer: Optional[str] = None,
+    contact: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Ranked, so there is no cursor: ask for a larger limit to see more
+    rows = await db.run_sync(
+        conversation_service.search_messages,
+        q,
+        customer=customer,
+        contact=contact,
+        limit=min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX),
+    )
+    return [MessageSearchResult(**row) for row in rows]
+
+
+# Exports ----------------------------------------------------------------------
+#
+# Newline-delimited JSON, one message per line, streamed from a server-side
+# cursor. The generator owns its own sync session (on a replica when one is
+# configured): it outlives the request dependency and Starlette iterates it in
+# the threadpool, batch by batch.
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # sent_at is stored as naive UTC
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
+
+
+def _ndjson(primary: bool, **filters) -> Iterator[bytes]:
+    db = open_read_session(primary)
+    try:
+        for batch in conversation_service.iter_messages_for_export(db, **filters):
+            yield b"".join(dumps(item) + b"\n" for item in batch)
+    finally:
+        db.close()
+
+
+def _export_response(request: Request, filename: str, **filters) -> StreamingResponse:
+    return StreamingResponse(
+        _ndjson(wants_primary(request.cookies, request.headers), **filters),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/export")
+async def export_all_messages(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    attachments: bool = False,
+):
+    # Every conversation, grouped by conversation then in sent order
+    return _export_response(
+        request,
+        "messages.ndjson",
+        since=_naive_utc(since),
+        until=_naive_utc(until),
+        include_attachments=attachments,
+    )
+
+
+@router.get("/{conversation_id}/messages/export")
+async def export_conversation_messages(
     conversation_id: int,
-    db: Session = Depends(get_db),
-):
-    rows = conversation_service.list_messages_for_conversation(db, conversation_id)
-    return [
-        MessageDTO(
-            id=row["id"],
-            direction=row["direction"],
-            channel=row["channel"],
-            body=row["body"],
-            sent_at=row["sent_at"],
-        )
-        for row in rows
-    ]
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    attachments: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
+    if await db.run_sync(conversation_service.conversation_version, conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return _export_response(
+        request,
+        f"conversation-{conversation_id}.ndjson",
+        conversation_id=conversation_id,
+        since=_naive_utc(since),
+        until=_naive_utc(until),
+        include_attachments=attachments,
+    )
@@ -1,130 +1,206 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-
-from app.db import get_db
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_write_db
+from app.utils.batching import check_batch_size
+from app.utils.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IDEMPOTENT_REPLAY_HEADER,
+    request_fingerprint,
+    send_idempotency,
+)
 from app.schemas import (
     SmsOrMmsSendRequest,
     EmailSendRequest,
     SendMessageResponse,
 )
 from app.services.conversations_service import ConversationService
-from app.services.providers import (
-    get_provider_for_sms_message,
-    get_provider_for_email,
-
-)
-from app.services.providers.types import ProviderStatus
+from app.services.outbox_service import OutboxService
 
-from app.models import MessageChannel, MessageType, MessageDirection
+from app.models import MessageChannel, MessageType, MessageDirection, MessageStatus
 
 router = APIRouter()
 
 conversation_service = ConversationService()
-
-
-@router.post("/sms", response_model=SendMessageResponse)
-def send_sms(
-    payload: SmsOrMmsSendRequest,
-    db: Session = Depends(get_db),
-):
-    # Outbound SMS/MMS from customer -> contact
-    customer_address = payload.from_
-    contact_address = payload.to
-    channel = MessageChannel.SMS
-    msg_type = MessageType(payload.type)  # "sms" or "mms"
-
-    conversation_id = conversation_service.get_or_create_conversation_id(
-        db=db,
-        customer_address=customer_address,
-        contact_address=contact_address,
+outbox_service = OutboxService()
+
+
+# Outbound sends are accepted, not sent: the route stores a pending Message
+# plus an outbox row in one transaction and returns straight away. Provider
+# calls, retries and dead-lettering happen in app/services/outbox_dispatcher.py.
+#
+# With an Idempotency-Key header, a retried request replays the stored
+# response instead of creating (and later sending) the messages again.
+
+
+async def _accept(
+    db: AsyncSession,
+    payloads: list,
+    channel: MessageChannel,
+    provider_channel: str,
+    message_types: list[MessageType],
+    idempotency_key: Optional[str] = None,
+    response: Optional[Response] = None,
+    scope: str = "",
+) -> list[dict]:
+    """
+    Persist pending messages and their outbox entries with a single commit.
+    """
+
+    async def create() -> list[dict]:
+        return await _create(db, payloads, channel, provider_channel, message_types)
+
+    if idempotency_key is None:
+        created = await create()
+        await db.commit()
+        return created
+
+    fingerprint = request_fingerprint(
+        [p.model_dump(mode="json", by_alias=True) for p in payloads]
     )
-
-    # Send via provider (mocked). ProviderResult.status lets us distinguish
-    # success, queued, throttled (429), and error conditions (e.g. 5xx)
-    provider = get_provider_for_sms_message(payload.type)
-    provider_result = provider.send(payload.dict(by_alias=True))
-
-    # Store message in DB
-    msg = conversation_service.create_message(
-        db=db,
-        conversation_id=conversation_id,
-        channel=channel,
-        message_type=msg_type,
-        direction=MessageDirection.OUTBOUND,
-        provider_type="sms",
-        provider_message_id=provider_result.provider_message_id,
-        from_address=customer_address,
-        to_address=contact_address,
-        body=payload.body,
-        attachments=payload.attachments,
-        sent_at=payload.timestamp,
+    created, replayed = await send_idempotency.run(
+        db, scope, idempotency_key, fingerprint, create
+    )
+    if replayed and response is not None:
+        response.headers[IDEMPOTENT_REPLAY_HEADER] = "true"
+    return created
+
+
+async def _create(
+    db: AsyncSession,
+    payloads: list,
+    channel: MessageChannel,
+    provider_channel: str,
+    message_types: list[MessageType],
+) -> list[dict]:
+    """
+    Add pending messages and their outbox entries; the caller commits.
+    """
+    created = await db.run_sync(
+        conversation_service.create_messages,
+        [
+            dict(
+                channel=channel,
+                message_type=msg_type,
+                direction=MessageDirection.OUTBOUND,
+                provider_type=provider_channel,
+                provider_message_id=None,
+                from_address=payload.from_,
+                to_address=payload.to,
+                body=payload.body,
+                attachments=payload.attachments,
+                sent_at=payload.timestamp,
+                status=MessageStatus.PENDING,
+            )
+            for payload, msg_type in zip(payloads, message_types)
+        ],
     )
 
-    db.commit()
+    await db.run_sync(
+        outbox_service.enqueue,
+        [
+            dict(
+                message_id=message_id,
+                channel=provider_channel,
+                message_type=msg_type.value,
+                payload=payload.model_dump(mode="json", by_alias=True),
+            )
+            for (message_id, _), payload, msg_type in zip(created, payloads, message_types)
+        ],
+    )
 
-    # For this take-home, providers are mocked and always return SUCCESS.
-    # In a real integration, non-SUCCESS states (TEMPORARY_FAILURE, RATE_LIMITED,
-    # PERMANENT_FAILURE) would drive retry/backoff or DLQ behavior.
-    if provider_result.status == ProviderStatus.SUCCESS:
-        status = "accepted"
-    else:
-        status = "error"
+    return [
+        SendMessageResponse(
+            message_id=str(message_id),
+            conversation_id=conversation_id,
+            status="accepted",
+        ).model_dump()
+        for message_id, conversation_id in created
+    ]
 
 
-    return SendMessageResponse(
-        message_id=str(msg.id),
-        provider_message_id=provider_result.provider_message_id,
-        conversation_id=conversation_id,
-        status=status,
+@router.post("/sms", response_model=SendMessageResponse)
+async def send_sms(
+    payload: SmsOrMmsSendRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_write_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+):
+    # Outbound SMS/MMS from customer -> contact
+    [created] = await _accept(
+        db,
+        [payload],
+        channel=MessageChannel.SMS,
+        provider_channel="sms",
+        message_types=[MessageType(payload.type)],  # "sms" or "mms"
+        idempotency_key=idempotency_key,
+        response=response,
+        scope="sms",
     )
+    return created
 
 
 @router.post("/email", response_model=SendMessageResponse)
-def send_email(
+async def send_email(
     payload: EmailSendRequest,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_write_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
 ):
     # Outbound Email from customer -> contact
-    customer_address = payload.from_
-    contact_address = payload.to
-    channel = MessageChannel.EMAIL
-    msg_type = MessageType.EMAIL
-
-    conversation_id = conversation_service.get_or_create_conversation_id(
-        db=db,
-        customer_address=customer_address,
-        contact_address=contact_address,
+    [created] = await _accept(
+        db,
+        [payload],
+        channel=MessageChannel.EMAIL,
+        provider_channel="email",
+        message_types=[MessageType.EMAIL],
+        idempotency_key=idempotency_key,
+        response=response,
+        scope="email",
     )
+    return created
 
-    provider = get_provider_for_email()
-    provider_result = provider.send(payload.dict(by_alias=True))
-
-    msg = conversation_service.create_message(
-        db=db,
-        conversation_id=conversation_id,
-        channel=channel,
-        message_type=msg_type,
-        direction=MessageDirection.OUTBOUND,
-        provider_type="email",
-        provider_message_id=provider_result.provider_message_id,
-        from_address=customer_address,
-        to_address=contact_address,
-        body=payload.body,
-        attachments=payload.attachments,
-        sent_at=payload.timestamp,
-    )
 
-    db.commit()
+# Batch sends ------------------------------------------------------------------
 
-    if provider_result.status == ProviderStatus.SUCCESS:
-        status = "accepted"
-    else:
-        status = "error"
+
+@router.post("/sms/batch", response_model=list[SendMessageResponse])
+async def send_sms_batch(
+    payloads: list[SmsOrMmsSendRequest],
+    response: Response,
+    db: AsyncSession = Depends(get_write_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+):
+    check_batch_size(payloads)
+    return await _accept(
+        db,
+        payloads,
+        channel=MessageChannel.SMS,
+        provider_channel="sms",
+        message_types=[MessageType(p.type) for p in payloads],
+        idempotency_key=idempotency_key,
+        response=response,
+        scope="sms/batch",
+    )
 
 
-    return SendMessageResponse(
-        message_id=str(msg.id),
-        provider_message_id=provider_result.provider_message_id,
-        conversation_id=conversation_id,
-        status=status,
-    )
\ No newline at end of file
+@router.post("/email/batch", response_model=list[SendMessageResponse])
+async def send_email_batch(
+    payloads: list[EmailSendRequest],
+    response: Response,
+    db: AsyncSession = Depends(get_write_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+):
+    check_batch_size(payloads)
+    return await _accept(
+        db,
+        payloads,
+        channel=MessageChannel.EMAIL,
+        provider_channel="email",
+        message_types=[MessageType.EMAIL for _ in payloads],
+        idempotency_key=idempotency_key,
+        response=response,
+        scope="email/batch",
+    )
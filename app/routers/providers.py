@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from app.services.providers import provider_stats
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_provider_stats():
+    # Breaker state, latency EWMA, result counts, rate limiter totals and the
+    # most recent routing decisions for every channel
+    return provider_stats()
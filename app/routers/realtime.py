@@ -0,0 +1,111 @@
+from typing import Sequence
+
+import anyio
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.services.realtime import broker, conversation_topic, customer_topic
+from app.utils.pubsub import SlowConsumer
+
+router = APIRouter()
+
+
+# Push of new messages instead of polling. Subscribe to one thread
+# (/{id}/stream, /{id}/ws) or to every thread of a customer address
+# (/stream?customer=, /ws?customer=); each event is one message in the shape
+# the delta sync endpoints use. Subscribing touches no database. A client
+# that reconnects, or is dropped for falling REALTIME_QUEUE_SIZE events
+# behind, catches up with /changes?since= after subscribing again.
+
+# WebSocket close code for a dropped slow consumer ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+# Server-Sent Events -------------------------------------------------------------
+
+
+async def _sse(topics: Sequence[str]):
+    subscription = broker.subscribe(topics)
+    try:
+        # Subscribed: safe to run the catch-up delta sync now
+        yield "event: ready\ndata: {}\n\n"
+        while True:
+            payload = None
+            with anyio.move_on_after(settings.REALTIME_KEEPALIVE_SECONDS):
+                payload = await subscription.get()
+            if payload is None:
+                # Keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: message\ndata: {payload}\n\n"
+    except SlowConsumer:
+        yield "event: overflow\ndata: {}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _sse_response(topics: Sequence[str]) -> StreamingResponse:
+    return StreamingResponse(
+        _sse(topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stream")
+async def stream_customer_messages(customer: str = Query(..., min_length=1)):
+    return _sse_response([customer_topic(customer)])
+
+
+@router.get("/{conversation_id}/stream")
+async def stream_conversation_messages(conversation_id: int):
+    return _sse_response([conversation_topic(conversation_id)])
+
+
+# WebSockets ---------------------------------------------------------------------
+#
+# One text frame per message. The client sends nothing; the connection is
+# subscribed once the handshake completes.
+
+
+async def _send_events(websocket: WebSocket, subscription) -> None:
+    try:
+        while True:
+            await websocket.send_text(await subscription.get())
+    except SlowConsumer:
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="slow consumer")
+    except WebSocketDisconnect:
+        pass
+
+
+async def _until_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _serve_socket(websocket: WebSocket, topics: Sequence[str]) -> None:
+    subscription = broker.subscribe(topics)
+    try:
+        await websocket.accept()
+        # Whichever side finishes first (dropped subscriber, client gone) ends both
+        async with anyio.create_task_group() as task_group:
+
+            async def run_then_stop(fn) -> None:
+                await fn()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(run_then_stop, lambda: _send_events(websocket, subscription))
+            await run_then_stop(lambda: _until_disconnect(websocket))
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.websocket("/ws")
+async def customer_messages_socket(websocket: WebSocket, customer: str = Query(..., min_length=1)):
+    await _serve_socket(websocket, [customer_topic(customer)])
+
+
+@router.websocket("/{conversation_id}/ws")
+async def conversation_messages_socket(websocket: WebSocket, conversation_id: int):
+    await _serve_socket(websocket, [conversation_topic(conversation_id)])
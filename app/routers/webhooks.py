@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_async_db
+from app.utils.batching import check_batch_size
+from app.utils.idempotency import WebhookDedupeFilter, webhook_dedupe
+from app.utils.metrics import webhook_duplicates
 from app.schemas import (
     SmsOrMmsWebhookPayload,
     EmailWebhookPayload,
     WebhookResponse,
+    BatchWebhookResponse,
 )
 from app.services.conversations_service import ConversationService
 from app.models import MessageChannel, MessageType, MessageDirection
@@ -15,97 +19,124 @@ router = APIRouter()
 conversation_service = ConversationService()
 
 
-@router.post("/sms", response_model=WebhookResponse)
-def sms_webhook(
-    payload: SmsOrMmsWebhookPayload,
-    db: Session = Depends(get_db),
-):
-    # Inbound SMS/MMS from contact -> customer
-    provider_type = "sms"
-    provider_message_id = payload.messaging_provider_id
+# Idempotency: each message's provider key is claimed in message_dedupe_keys
+# with ON CONFLICT DO NOTHING before it is inserted, so replays and concurrent
+# retries of the same callback are acknowledged without a SELECT-then-INSERT
+# race, whichever messages partition the original landed in.
+# webhook_dedupe short-circuits replays it already knows about before that.
 
-    # Idempotency check
-    if conversation_service.inbound_message_exists(
-        db=db,
-        provider_type=provider_type,
-        provider_message_id=provider_message_id,
-    ):
-        return WebhookResponse(status="ok")
 
+def _sms_message(payload: SmsOrMmsWebhookPayload) -> dict:
     # For inbound webhooks, `from` is contact, `to` is customer
-    customer_address = payload.to
-    contact_address = payload.from_
-    channel = MessageChannel.SMS
-    msg_type = MessageType(payload.type)
-
-    conversation_id = conversation_service.get_or_create_conversation_id(
-        db=db,
-        customer_address=customer_address,
-        contact_address=contact_address,
+    return dict(
+        channel=MessageChannel.SMS,
+        message_type=MessageType(payload.type),
+        direction=MessageDirection.INBOUND,
+        provider_type="sms",
+        provider_message_id=payload.messaging_provider_id,
+        from_address=payload.from_,
+        to_address=payload.to,
+        body=payload.body,
+        attachments=payload.attachments,
+        sent_at=payload.timestamp,
     )
 
-    conversation_service.create_message(
-        db=db,
-        conversation_id=conversation_id,
-        channel=channel,
-        message_type=msg_type,
+
+def _email_message(payload: EmailWebhookPayload) -> dict:
+    # Inbound email: from contact -> to customer
+    return dict(
+        channel=MessageChannel.EMAIL,
+        message_type=MessageType.EMAIL,
         direction=MessageDirection.INBOUND,
-        provider_type=provider_type,
-        provider_message_id=provider_message_id,
-        from_address=contact_address,
-        to_address=customer_address,
+        provider_type="email",
+        provider_message_id=payload.xillio_id,
+        from_address=payload.from_,
+        to_address=payload.to,
         body=payload.body,
         attachments=payload.attachments,
         sent_at=payload.timestamp,
     )
 
-    db.commit()
 
+async def _ingest(db: AsyncSession, messages: list[dict]) -> int:
+    keys = [
+        WebhookDedupeFilter.key(m["provider_type"], m["provider_message_id"])
+        for m in messages
+    ]
+    # Known replays are acknowledged without a DB round trip
+    pending = [
+        (message, key)
+        for message, key in zip(messages, keys)
+        if not webhook_dedupe.is_known_duplicate(key)
+    ]
+    channel = messages[0]["provider_type"] if messages else ""
+    if len(pending) < len(messages):
+        webhook_duplicates.inc(channel, "memory", amount=len(messages) - len(pending))
+    if not pending:
+        return 0
+
+    created = await db.run_sync(
+        conversation_service.create_messages,
+        [message for message, _ in pending],
+        skip_duplicates=True,
+    )
+    await db.commit()
+
+    webhook_dedupe.add(key for _, key in pending)
+    inserted = sum(1 for message_id, _ in created if message_id is not None)
+    if inserted < len(pending):
+        webhook_duplicates.inc(channel, "database", amount=len(pending) - inserted)
+    return inserted
+
+
+@router.get("/stats")
+async def dedupe_stats():
+    # Fast-path hit rate for this process
+    return webhook_dedupe.stats()
+
+
+@router.post("/sms", response_model=WebhookResponse)
+async def sms_webhook(
+    payload: SmsOrMmsWebhookPayload,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Inbound SMS/MMS from contact -> customer
+    await _ingest(db, [_sms_message(payload)])
     return WebhookResponse(status="ok")
 
 
 @router.post("/email", response_model=WebhookResponse)
-def email_webhook(
+async def email_webhook(
     payload: EmailWebhookPayload,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    provider_type = "email"
-    provider_message_id = payload.xillio_id
-
-    if conversation_service.inbound_message_exists(
-        db=db,
-        provider_type=provider_type,
-        provider_message_id=provider_message_id,
-    ):
-        return WebhookResponse(status="ok")
+    await _ingest(db, [_email_message(payload)])
+    return WebhookResponse(status="ok")
 
-    # Inbound email: from contact -> to customer
-    customer_address = payload.to
-    contact_address = payload.from_
-    channel = MessageChannel.EMAIL
-    msg_type = MessageType.EMAIL
-
-    conversation_id = conversation_service.get_or_create_conversation_id(
-        db=db,
-        customer_address=customer_address,
-        contact_address=contact_address,
-    )
 
-    conversation_service.create_message(
-        db=db,
-        conversation_id=conversation_id,
-        channel=channel,
-        message_type=msg_type,
-        direction=MessageDirection.INBOUND,
-        provider_type=provider_type,
-        provider_message_id=provider_message_id,
-        from_address=contact_address,
-        to_address=customer_address,
-        body=payload.body,
-        attachments=payload.attachments,
-        sent_at=payload.timestamp,
+@router.post("/sms/batch", response_model=BatchWebhookResponse)
+async def sms_webhook_batch(
+    payloads: list[SmsOrMmsWebhookPayload],
+    db: AsyncSession = Depends(get_async_db),
+):
+    check_batch_size(payloads)
+    inserted = await _ingest(db, [_sms_message(p) for p in payloads])
+    return BatchWebhookResponse(
+        received=len(payloads),
+        inserted=inserted,
+        duplicates=len(payloads) - inserted,
     )
 
-    db.commit()
 
-    return WebhookResponse(status="ok")
+@router.post("/email/batch", response_model=BatchWebhookResponse)
+async def email_webhook_batch(
+    payloads: list[EmailWebhookPayload],
+    db: AsyncSession = Depends(get_async_db),
+):
+    check_batch_size(payloads)
+    inserted = await _ingest(db, [_email_message(p) for p in payloads])
+    return BatchWebhookResponse(
+        received=len(payloads),
+        inserted=inserted,
+        duplicates=len(payloads) - inserted,
+    )
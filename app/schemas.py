@@ -56,11 +56,23 @@ class WebhookResponse(BaseModel):
     status: str = "ok"
 
 
+class BatchWebhookResponse(BaseModel):
+    status: str = "ok"
+    received: int
+    inserted: int
+    duplicates: int
+
+
 # Conversation DTOs
 
 class ConversationSummary(BaseModel):
     id: int
     last_updated: datetime
+    last_message_at: Optional[datetime] = None
+    last_message_id: Optional[int] = None
+    last_message_direction: Optional[str] = None
+    last_message_preview: Optional[str] = None
+    message_count: int = 0
 
 
 class MessageDTO(BaseModel):
@@ -69,3 +81,25 @@ class MessageDTO(BaseModel):
     channel: str
     body: str
     sent_at: datetime
+    status: Optional[str] = None  # outbound delivery state: pending/sent/failed
+
+
+class MessageSearchResult(BaseModel):
+    id: int
+    conversation_id: int
+    direction: str
+    channel: str
+    body: str
+    sent_at: datetime
+    rank: float
+    highlight: str  # matched fragments, HTML-escaped, terms wrapped in <b>...</b>
+
+
+class MessageChange(MessageDTO):
+    conversation_id: int
+
+
+class MessageChanges(BaseModel):
+    messages: List[MessageChange]
+    watermark: str  # opaque; send back as ?since= on the next poll
+    has_more: bool  # more changes are waiting: poll again right away
@@ -0,0 +1,546 @@
+"""
+Bulk historical import: NDJSON or CSV files in the webhook payload shapes,
+loaded with PostgreSQL COPY.
+
+Each record is an SMS/MMS webhook payload (from, to, type,
+messaging_provider_id, body, attachments, timestamp) or an email webhook
+payload (from, to, xillio_id, body, attachments, timestamp). An optional
+"direction" field ("inbound" by default, or "outbound") covers sent history.
+CSV files use the same column names, with attachments as a JSON array.
+
+    python -m app.services.bulk_import history.ndjson more.csv --chunk-size 50000
+    ./bin/import.sh history.ndjson
+
+Records are processed in chunks, one transaction each. Contacts and
+conversations are resolved in memory and only unseen ones go to the
+database: they are COPYed into temp staging tables and merged with
+INSERT ... SELECT ... ON CONFLICT, using the same keys and grouping rules as
+ConversationService. Participants for new conversations are COPYed straight
+into conversation_participants. Messages are COPYed into staging, their
+provider keys claimed in message_dedupe_keys with ON CONFLICT DO NOTHING, and
+only claimed messages inserted, so re-running an import, or importing over
+live webhook traffic, never duplicates a message.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from enum import Enum as PyEnum
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import Column, DateTime, MetaData, Table, and_, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import (
+    Contact,
+    Conversation,
+    ConversationParticipant,
+    Message,
+    MessageChannel,
+    MessageDedupeKey,
+    MessageDirection,
+    MessageStatus,
+    MessageType,
+    ParticipantRole,
+)
+from app.schemas import EmailWebhookPayload, SmsOrMmsWebhookPayload
+from app.services.conversations_service import (
+    ConversationService,
+    customer_and_contact,
+    infer_address_type,
+)
+from app.services.partitions import ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+# -----------------------------------------------------------------------------
+# Staging tables (per connection, emptied on commit)
+# -----------------------------------------------------------------------------
+
+_staging = MetaData()
+
+
+def _staging_table(name: str, source: Table, columns: list[str]) -> Table:
+    return Table(
+        name,
+        _staging,
+        *(Column(c, source.c[c].type) for c in columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DELETE ROWS",
+    )
+
+
+import_contacts = _staging_table(
+    "import_contacts", Contact.__table__, ["address", "address_type", "is_customer_owned"]
+)
+import_conversations = _staging_table(
+    "import_conversations", Conversation.__table__, ["customer_id", "contact_id"]
+)
+MESSAGE_COLUMNS = [
+    "conversation_id",
+    "customer_id",
+    "channel",
+    "message_type",
+    "direction",
+    "provider_type",
+    "provider_message_id",
+    "status",
+    "from_contact_id",
+    "to_contact_id",
+    "body",
+    "attachments",
+    "sent_at",
+    "received_at",
+    "created_at",
+    "updated_at",
+]
+import_messages = _staging_table("import_messages", Message.__table__, MESSAGE_COLUMNS)
+
+
+def _copy_value(value: Any) -> str:
+    # COPY text format: \N is NULL; backslash, tab and newlines are escaped
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, PyEnum):
+        text = value.name  # SQLAlchemy stores enum member names
+    elif isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (list, dict)):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(db: Session, table: Table, columns: list[str], rows: Iterable[tuple]) -> None:
+    """
+    COPY rows into `table` over the session's connection.
+    """
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buf)
+    finally:
+        cursor.close()
+
+
+# -----------------------------------------------------------------------------
+# Input
+# -----------------------------------------------------------------------------
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """
+    Raw records from an NDJSON (default) or .csv file.
+    """
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.suffix.lower() == ".csv":
+            for record in csv.DictReader(fh):
+                attachments = record.get("attachments")
+                record["attachments"] = json.loads(attachments) if attachments else None
+                yield record
+        else:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_record(record: dict) -> dict:
+    """
+    Validate a webhook-shaped record into create_messages() keyword arguments.
+
+    Raises ValueError (or pydantic's ValidationError) for bad records.
+    """
+    direction = MessageDirection(record.get("direction") or MessageDirection.INBOUND.value)
+    if record.get("xillio_id"):
+        payload = EmailWebhookPayload.model_validate(record)
+        channel, message_type = MessageChannel.EMAIL, MessageType.EMAIL
+        provider_type, provider_message_id = "email", payload.xillio_id
+    else:
+        payload = SmsOrMmsWebhookPayload.model_validate(record)
+        channel, message_type = MessageChannel.SMS, MessageType(payload.type)
+        provider_type, provider_message_id = "sms", payload.messaging_provider_id
+
+    sent_at = payload.timestamp
+    if sent_at.tzinfo is not None:
+        sent_at = sent_at.astimezone(UTC).replace(tzinfo=None)
+
+    return dict(
+        channel=channel,
+        message_type=message_type,
+        direction=direction,
+        provider_type=provider_type,
+        provider_message_id=provider_message_id,
+        from_address=str(payload.from_),
+        to_address=str(payload.to),
+        body=payload.body,
+        attachments=payload.attachments,
+        sent_at=sent_at,
+        # Historical outbound messages were delivered already
+        status=MessageStatus.SENT if direction == MessageDirection.OUTBOUND else None,
+    )
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------------------------------------------------------------
+# Import
+# -----------------------------------------------------------------------------
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    rejected: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    started_at: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "rejected": self.rejected,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "records_per_second": round(self.rate, 1),
+        }
+
+
+class BulkImporter:
+    """
+    Loads parsed messages chunk by chunk, keeping resolved contact and
+    conversation ids in memory for the whole run.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        service: Optional[ConversationService] = None,
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.service = service or ConversationService()
+        # (address, address_type) -> (contact_id, is_customer_owned)
+        self._contacts: dict[tuple[str, Any], tuple[int, bool]] = {}
+        # (customer_id, contact_id) -> conversation_id
+        self._conversations: dict[tuple[int, int], int] = {}
+
+    def import_records(self, records: Iterable[dict]) -> ImportStats:
+        """
+        Parse, validate and load raw records. Bad records are logged and skipped.
+        """
+        stats = ImportStats(started_at=time.monotonic())
+
+        def parsed() -> Iterator[dict]:
+            for number, record in enumerate(records, start=1):
+                stats.read += 1
+                try:
+                    yield parse_record(record)
+                except (ValidationError, ValueError, TypeError) as exc:
+                    stats.rejected += 1
+                    logger.warning("Skipping record %s: %s", number, exc)
+
+        for chunk in _chunks(parsed(), self.chunk_size):
+            self.ensure_partitions(chunk)
+            db = self.session_factory()
+            try:
+                inserted = self.load_chunk(db, chunk)
+                db.commit()
+            finally:
+                db.close()
+            stats.inserted += inserted
+            stats.duplicates += len(chunk) - inserted
+            logger.info(
+                "Imported %d records (%d inserted, %d duplicates, %d rejected) at %.0f records/s",
+                stats.read,
+                stats.inserted,
+                stats.duplicates,
+                stats.rejected,
+                stats.rate,
+            )
+        return stats
+
+    def ensure_partitions(self, messages: list[dict]) -> None:
+        """
+        Create the monthly partitions a chunk needs, so history does not land
+        in the default one. Committed on its own before the chunk is loaded:
+        creating a partition locks messages until commit, and that lock must
+        not be held through the chunk's COPY and inserts.
+        """
+        if not messages:
+            return
+        sent = [m["sent_at"] for m in messages]
+        with self.session_factory() as db:
+            ensure_partitions(db, min(sent), max(sent))
+            db.commit()
+
+    def load_chunk(self, db: Session, messages: list[dict]) -> int:
+        """
+        Load one chunk in the caller's transaction. Returns messages inserted.
+        Partitions are the caller's job (ensure_partitions()).
+        """
+        for table in (import_contacts, import_conversations, import_messages):
+            table.create(db.connection(), checkfirst=True)
+
+        contact_ids = self._resolve_contacts(db, messages)
+        pairs = []
+        for m in messages:
+            customer, contact = customer_and_contact(
+                m["direction"], m["from_address"], m["to_address"]
+            )
+            pairs.append((contact_ids[customer], contact_ids[contact]))
+        conversation_ids = self._resolve_conversations(db, set(pairs))
+
+        # First occurrence of each provider key within the chunk
+        seen = set()
+        now = datetime.now(UTC).replace(tzinfo=None)
+        rows = []
+        for m, pair in zip(messages, pairs):
+            key = (m["provider_type"], m["provider_message_id"])
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(
+                (
+                    conversation_ids[pair],
+                    pair[0],
+                    m["channel"],
+                    m["message_type"],
+                    m["direction"],
+                    m["provider_type"],
+                    m["provider_message_id"],
+                    m["status"],
+                    contact_ids[m["from_address"]],
+                    contact_ids[m["to_address"]],
+                    m["body"],
+                    m["attachments"],
+                    m["sent_at"],
+                    now,
+                    now,
+                    now,
+                )
+            )
+        copy_rows(db, import_messages, MESSAGE_COLUMNS, rows)
+
+        # Claim provider keys and insert only the claimed messages, in one statement
+        staged = import_messages.c
+        claimed = (
+            pg_insert(MessageDedupeKey)
+            .from_select(
+                ["provider_type", "provider_message_id", "sent_at"],
+                select(staged.provider_type, staged.provider_message_id, staged.sent_at),
+            )
+            .on_conflict_do_nothing()
+            .returning(MessageDedupeKey.provider_type, MessageDedupeKey.provider_message_id)
+            .cte("claimed")
+        )
+        inserted = db.execute(
+            pg_insert(Message)
+            .from_select(
+                MESSAGE_COLUMNS,
+                select(*(staged[c] for c in MESSAGE_COLUMNS))
+                .join(
+                    claimed,
+                    and_(
+                        claimed.c.provider_type == staged.provider_type,
+                        claimed.c.provider_message_id == staged.provider_message_id,
+                    ),
+                )
+                .order_by(staged.sent_at),
+            )
+            .returning(
+                Message.id,
+                Message.conversation_id,
+                Message.sent_at,
+                Message.direction,
+                Message.body,
+            )
+        ).all()
+
+        self.service.update_summaries(
+            db,
+            [row._asdict() for row in inserted],
+            [row.id for row in inserted],
+            now,
+        )
+        return len(inserted)
+
+    def _resolve_contacts(self, db: Session, messages: list[dict]) -> dict[str, int]:
+        wanted: dict[str, bool] = {}
+        for m in messages:
+            customer, contact = customer_and_contact(
+                m["direction"], m["from_address"], m["to_address"]
+            )
+            wanted[customer] = True
+            wanted.setdefault(contact, False)
+
+        missing = {}
+        for address, owned in wanted.items():
+            known = self._contacts.get((address, infer_address_type(address)))
+            if known is None or (owned and not known[1]):
+                missing[address] = owned
+
+        if missing:
+            copy_rows(
+                db,
+                import_contacts,
+                ["address", "address_type", "is_customer_owned"],
+                (
+                    (address, infer_address_type(address), owned)
+                    for address, owned in sorted(missing.items())
+                ),
+            )
+            staged = import_contacts.c
+            now = datetime.now(UTC).replace(tzinfo=None)
+            stmt = pg_insert(Contact).from_select(
+                ["address", "address_type", "is_customer_owned", "created_at", "updated_at"],
+                select(
+                    staged.address,
+                    staged.address_type,
+                    staged.is_customer_owned,
+                    literal(now, DateTime),
+                    literal(now, DateTime),
+                ).order_by(staged.address),
+            )
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Contact.address, Contact.address_type],
+                    set_={"is_customer_owned": True},
+                    # Only promotions write; existing contacts are read back below
+                    where=and_(stmt.excluded.is_customer_owned, ~Contact.is_customer_owned),
+                )
+            )
+            for row in db.execute(
+                select(Contact.id, Contact.address, Contact.address_type, Contact.is_customer_owned)
+                .join(
+                    import_contacts,
+                    and_(
+                        Contact.address == staged.address,
+                        Contact.address_type == staged.address_type,
+                    ),
+                )
+            ):
+                self._contacts[(row.address, row.address_type)] = (row.id, row.is_customer_owned)
+
+        return {
+            address: self._contacts[(address, infer_address_type(address))][0]
+            for address in wanted
+        }
+
+    def _resolve_conversations(
+        self,
+        db: Session,
+        pairs: set[tuple[int, int]],
+    ) -> dict[tuple[int, int], int]:
+        missing = sorted(pair for pair in pairs if pair not in self._conversations)
+        if missing:
+            copy_rows(db, import_conversations, ["customer_id", "contact_id"], missing)
+            staged = import_conversations.c
+            now = datetime.now(UTC).replace(tzinfo=None)
+            created = db.execute(
+                pg_insert(Conversation)
+                .from_select(
+                    ["customer_id", "contact_id", "created_at", "updated_at"],
+                    select(
+                        staged.customer_id,
+                        staged.contact_id,
+                        literal(now, DateTime),
+                        literal(now, DateTime),
+                    ).order_by(
+                        staged.customer_id, staged.contact_id
+                    ),
+                )
+                .on_conflict_do_nothing(
+                    index_elements=[Conversation.customer_id, Conversation.contact_id]
+                )
+                .returning(Conversation.id, Conversation.customer_id, Conversation.contact_id)
+            ).all()
+
+            # Participants only for conversations created here
+            copy_rows(
+                db,
+                ConversationParticipant.__table__,
+                ["conversation_id", "contact_id", "role", "created_at"],
+                (
+                    participant
+                    for row in created
+                    for participant in (
+                        (row.id, row.customer_id, ParticipantRole.CUSTOMER, now),
+                        (row.id, row.contact_id, ParticipantRole.CONTACT, now),
+                    )
+                ),
+            )
+
+            for row in db.execute(
+                select(Conversation.id, Conversation.customer_id, Conversation.contact_id)
+                .join(
+                    import_conversations,
+                    and_(
+                        Conversation.customer_id == staged.customer_id,
+                        Conversation.contact_id == staged.contact_id,
+                    ),
+                )
+            ):
+                self._conversations[(row.customer_id, row.contact_id)] = row.id
+
+        return {pair: self._conversations[pair] for pair in pairs}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-import historical messages with COPY.")
+    parser.add_argument("paths", nargs="+", type=Path, help="NDJSON or .csv files")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    importer = BulkImporter(chunk_size=args.chunk_size)
+    for path in args.paths:
+        logger.info("Importing %s", path)
+        stats = importer.import_records(read_records(path))
+        print(json.dumps({"file": str(path), **stats.as_dict()}))
+
+
+if __name__ == "__main__":
+    main()
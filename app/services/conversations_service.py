@@ -1,20 +1,100 @@
 from datetime import datetime,UTC
-from typing import Optional
+from typing import Iterator, Optional
 
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session, aliased
-from sqlalchemy import and_
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    case,
+    cast,
+    column,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 
+from app.config import settings
+from app.services.realtime import conversation_topic, customer_topic, publish_on_commit
+from app.utils.cache import LRUCache, cache_get, cache_put_on_commit
 from app.models import (
     Contact,
     Conversation,
     ConversationParticipant,
     Message,
+    MessageDedupeKey,
     ContactAddressType,
     ParticipantRole,
     MessageChannel,
     MessageType,
     MessageDirection,
+    MessageStatus,
+    SEARCH_CONFIG,
+    conversation_version_seq,
+)
+
+
+# Length of Conversation.last_message_preview
+PREVIEW_LENGTH = 140
+
+# Column order of conversation_rows() and message_rows_for_conversation(),
+# matching the ConversationSummary and MessageDTO fields
+CONVERSATION_FIELDS = (
+    "id",
+    "last_updated",
+    "last_message_at",
+    "last_message_id",
+    "last_message_direction",
+    "last_message_preview",
+    "message_count",
+)
+MESSAGE_FIELDS = ("id", "direction", "channel", "body", "sent_at", "status")
+# message_changes() rows: MESSAGE_FIELDS plus the thread, for multi-thread sync
+CHANGE_FIELDS = ("id", "conversation_id", "direction", "channel", "body", "sent_at", "status")
+# Applied to bodies before ts_headline, in order ("&" first)
+HTML_ESCAPES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;"))
+
+
+def infer_address_type(address: str) -> ContactAddressType:
+    if "@" in address:
+        return ContactAddressType.EMAIL
+    return ContactAddressType.PHONE
+
+
+def customer_and_contact(
+    direction: MessageDirection,
+    from_address: str,
+    to_address: str,
+) -> tuple[str, str]:
+    """
+    The (customer, contact) addresses a message belongs to: the customer is the
+    sender of outbound and the recipient of inbound messages.
+    """
+    if direction == MessageDirection.OUTBOUND:
+        return from_address, to_address
+    return to_address, from_address
+
+
+# Process-wide identity caches shared by every ConversationService instance:
+#   (address, ContactAddressType) -> (contact_id, is_customer_owned)
+#   (customer_id, contact_id)     -> conversation_id
+contact_cache = LRUCache(
+    max_size=settings.IDENTITY_CACHE_SIZE,
+    ttl_seconds=settings.IDENTITY_CACHE_TTL_SECONDS,
+)
+conversation_cache = LRUCache(
+    max_size=settings.IDENTITY_CACHE_SIZE,
+    ttl_seconds=settings.IDENTITY_CACHE_TTL_SECONDS,
 )
 
 
@@ -23,45 +103,95 @@ class ConversationService:
     Handles conversation lookup/creation and message retrieval.
     """
 
+    def __init__(
+        self,
+        contact_cache: LRUCache = contact_cache,
+        conversation_cache: LRUCache = conversation_cache,
+    ):
+        self.contact_cache = contact_cache
+        self.conversation_cache = conversation_cache
+
     # -------------------------------------------------------------------------
     # Contact helpers
     # -------------------------------------------------------------------------
 
     def _infer_address_type(self, address: str) -> ContactAddressType:
-        if "@" in address:
-            return ContactAddressType.EMAIL
-        return ContactAddressType.PHONE
+        return infer_address_type(address)
 
     def _get_or_create_contact(
         self,
         db: Session,
         address: str,
         is_customer_owned: bool,
-    ) -> Contact:
-        address_type = self._infer_address_type(address)
-
-        contact = (
-            db.query(Contact)
-            .filter(
-                Contact.address == address,
-                Contact.address_type == address_type,
+    ) -> int:
+        """
+        Return the contact id for an address, creating the contact if needed.
+        """
+        return self.get_or_create_contact_ids(db, {address: is_customer_owned})[address]
+
+    def get_or_create_contact_ids(
+        self,
+        db: Session,
+        addresses: dict[str, bool],
+    ) -> dict[str, int]:
+        """
+        Resolve many addresses to contact ids with a single upsert.
+
+        `addresses` maps address -> is_customer_owned. The INSERT ... ON
+        CONFLICT DO UPDATE on uq_contacts_address_type returns the id of both
+        new and existing rows, promotes contacts that are now customer-owned,
+        and is safe when concurrent requests create the same contact.
+
+        Addresses found in contact_cache skip the upsert entirely, unless the
+        cached contact still needs promoting to customer-owned.
+        """
+        contact_ids: dict[str, int] = {}
+        misses: dict[str, bool] = {}
+        for address, is_customer_owned in addresses.items():
+            cached = cache_get(
+                db, self.contact_cache, (address, self._infer_address_type(address))
             )
-            .first()
-        )
-        if contact:
-            # Optionally update is_customer_owned if needed
-            if is_customer_owned and not contact.is_customer_owned:
-                contact.is_customer_owned = True
-            return contact
+            if cached is not None and (cached[1] or not is_customer_owned):
+                contact_ids[address] = cached[0]
+            else:
+                misses[address] = is_customer_owned
+
+        if not misses:
+            return contact_ids
 
-        contact = Contact(
-            address=address,
-            address_type=address_type,
-            is_customer_owned=is_customer_owned,
+        stmt = pg_insert(Contact)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Contact.address, Contact.address_type],
+            set_={
+                "is_customer_owned": or_(
+                    Contact.is_customer_owned, stmt.excluded.is_customer_owned
+                ),
+            },
+        ).returning(
+            Contact.id, Contact.address, Contact.address_type, Contact.is_customer_owned
         )
-        db.add(contact)
-        db.flush()  # assign id
-        return contact
+
+        # Sorted so concurrent upserts lock rows in the same order
+        rows = db.execute(
+            stmt,
+            [
+                {
+                    "address": address,
+                    "address_type": self._infer_address_type(address),
+                    "is_customer_owned": misses[address],
+                }
+                for address in sorted(misses)
+            ],
+        ).all()
+        for row in rows:
+            contact_ids[row.address] = row.id
+            cache_put_on_commit(
+                db,
+                self.contact_cache,
+                (row.address, row.address_type),
+                (row.id, row.is_customer_owned),
+            )
+        return contact_ids
 
     # -------------------------------------------------------------------------
     # Conversation helpers
@@ -76,68 +206,111 @@ class ConversationService:
         Long-lived conversation keyed by (customer_identity, contact_identity),
         regardless of channel/provider.
         """
-
-        customer = self._get_or_create_contact(
-            db=db,
-            address=customer_address,
-            is_customer_owned=True,
+        contact_ids = self.get_or_create_contact_ids(
+            db,
+            {customer_address: True, contact_address: False},
         )
-        contact = self._get_or_create_contact(
-            db=db,
-            address=contact_address,
-            is_customer_owned=False,
+        pair = (contact_ids[customer_address], contact_ids[contact_address])
+        return self.get_or_create_conversation_ids(db, {pair})[pair]
+
+    def get_or_create_conversation_ids(
+        self,
+        db: Session,
+        pairs: set[tuple[int, int]],
+    ) -> dict[tuple[int, int], int]:
+        """
+        Resolve (customer_contact_id, contact_contact_id) pairs to conversation ids.
+
+        Conversations carry a unique (customer_id, contact_id) key: existing
+        threads are read with one SELECT, and the rest are created with one
+        INSERT ... ON CONFLICT DO NOTHING ... RETURNING. Existing rows are never
+        written, so resolving a busy thread takes no row lock and leaves no
+        dead tuple. A pair another transaction created first comes back empty
+        from the insert (which waited for that commit) and is read again.
+        Participant rows are only written for conversations this call actually
+        created. Pairs found in conversation_cache skip the database.
+        """
+        conversation_ids: dict[tuple[int, int], int] = {}
+        misses = set()
+        for pair in pairs:
+            cached = cache_get(db, self.conversation_cache, pair)
+            if cached is not None:
+                conversation_ids[pair] = cached
+            else:
+                misses.add(pair)
+
+        if not misses:
+            return conversation_ids
+
+        def existing(wanted: set[tuple[int, int]]) -> set[tuple[int, int]]:
+            found = db.execute(
+                select(Conversation.id, Conversation.customer_id, Conversation.contact_id).where(
+                    tuple_(Conversation.customer_id, Conversation.contact_id).in_(sorted(wanted))
+                )
+            ).all()
+            for row in found:
+                pair = (row.customer_id, row.contact_id)
+                conversation_ids[pair] = row.id
+                cache_put_on_commit(db, self.conversation_cache, pair, row.id)
+            return wanted - {(row.customer_id, row.contact_id) for row in found}
+
+        missing = existing(misses)
+        if not missing:
+            return conversation_ids
+
+        now = datetime.now(UTC)
+        stmt = (
+            pg_insert(Conversation)
+            .on_conflict_do_nothing(index_elements=[Conversation.customer_id, Conversation.contact_id])
+            .returning(Conversation.id, Conversation.customer_id, Conversation.contact_id)
         )
 
-        # Create two aliases for conversation_participants:
-        cp_customer = aliased(ConversationParticipant)
-        cp_contact = aliased(ConversationParticipant)
+        # Sorted so concurrent inserts wait on each other in the same order
+        rows = db.execute(
+            stmt,
+            [
+                {
+                    "customer_id": customer_id,
+                    "contact_id": contact_id,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for customer_id, contact_id in sorted(missing)
+            ],
+        ).all()
 
-        # Try to find an existing conversation with these exact participants
-        conv = (
-            db.query(Conversation)
-            .join(
-                cp_customer,
-                and_(
-                    cp_customer.conversation_id == Conversation.id,
-                    cp_customer.contact_id == customer.id,
-                    cp_customer.role == ParticipantRole.CUSTOMER,
-                ),
+        participants = []
+        for row in rows:
+            pair = (row.customer_id, row.contact_id)
+            conversation_ids[pair] = row.id
+            cache_put_on_commit(db, self.conversation_cache, pair, row.id)
+            participants.append(
+                {
+                    "conversation_id": row.id,
+                    "contact_id": row.customer_id,
+                    "role": ParticipantRole.CUSTOMER,
+                }
             )
-            .join(
-                cp_contact,
-                and_(
-                    cp_contact.conversation_id == Conversation.id,
-                    cp_contact.contact_id == contact.id,
-                    cp_contact.role == ParticipantRole.CONTACT,
-                ),
+            participants.append(
+                {
+                    "conversation_id": row.id,
+                    "contact_id": row.contact_id,
+                    "role": ParticipantRole.CONTACT,
+                }
             )
-            .first()
-        )
 
-        if conv:
-            return conv.id
+        if participants:
+            db.execute(
+                pg_insert(ConversationParticipant).on_conflict_do_nothing(),
+                participants,
+            )
 
-        # Create a new conversation
-        conv = Conversation()
-        db.add(conv)
-        db.flush()  # assign id
+        # Created concurrently by another transaction, committed by now
+        lost = missing - {(row.customer_id, row.contact_id) for row in rows}
+        if lost:
+            existing(lost)
 
-        db.add_all(
-            [
-                ConversationParticipant(
-                    conversation_id=conv.id,
-                    contact_id=customer.id,
-                    role=ParticipantRole.CUSTOMER,
-                ),
-                ConversationParticipant(
-                    conversation_id=conv.id,
-                    contact_id=contact.id,
-                    role=ParticipantRole.CONTACT,
-                ),
-            ]
-        )
-        db.flush()
-        return conv.id
+        return conversation_ids
 
 
     # -------------------------------------------------------------------------
@@ -159,80 +332,716 @@ class ConversationService:
         body: str,
         attachments: Optional[list[str]],
         sent_at: datetime,
+        status: Optional[MessageStatus] = None,
     ) -> Message:
         """
-        Insert a message row and bump conversation.updated_at.
+        Insert a message row and update the conversation summary.
         """
+        customer = customer_and_contact(direction, from_address, to_address)[0]
 
         # Resolve contacts again to attach proper FKs
-        from_contact = self._get_or_create_contact(
-            db=db,
-            address=from_address,
-            is_customer_owned=direction == MessageDirection.OUTBOUND,
-        )
-        to_contact = self._get_or_create_contact(
-            db=db,
-            address=to_address,
-            is_customer_owned=direction == MessageDirection.INBOUND,
+        contact_ids = self.get_or_create_contact_ids(
+            db,
+            {
+                from_address: direction == MessageDirection.OUTBOUND,
+                to_address: direction == MessageDirection.INBOUND,
+            },
         )
 
+        self._register_dedupe_keys(
+            db, [{"provider_type": provider_type, "provider_message_id": provider_message_id, "sent_at": sent_at}]
+        )
         msg = Message(
             conversation_id=conversation_id,
+            customer_id=contact_ids[customer],
             channel=channel,
             message_type=message_type,
             direction=direction,
             provider_type=provider_type,
             provider_message_id=provider_message_id,
-            from_contact_id=from_contact.id,
-            to_contact_id=to_contact.id,
+            from_contact_id=contact_ids[from_address],
+            to_contact_id=contact_ids[to_address],
             body=body,
             attachments=attachments,
             sent_at=sent_at,
-            received_at=datetime.now(UTC)
+            received_at=datetime.now(UTC),
+            status=status,
         )
         db.add(msg)
-
-        conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if conv:
-            conv.updated_at = datetime.now(UTC)
-
         db.flush()
+
+        self.update_summaries(
+            db,
+            [
+                {
+                    "conversation_id": conversation_id,
+                    "sent_at": sent_at,
+                    "direction": direction,
+                    "body": body,
+                }
+            ],
+            [msg.id],
+            msg.received_at,
+        )
+        self._push_on_commit(
+            db,
+            [
+                {
+                    "conversation_id": conversation_id,
+                    "direction": direction,
+                    "channel": channel,
+                    "body": body,
+                    "sent_at": sent_at,
+                    "status": status,
+                }
+            ],
+            [msg.id],
+            [customer],
+        )
         return msg
 
+    def create_messages(
+        self,
+        db: Session,
+        messages: list[dict],
+        *,
+        skip_duplicates: bool = False,
+    ) -> list[tuple[Optional[int], int]]:
+        """
+        Bulk variant of get_or_create_conversation_id + create_message.
+
+        Each item takes the same keyword arguments as create_message, minus
+        conversation_id, which is resolved here. Contacts, conversations and
+        messages are each handled with a few set-based statements, and every
+        conversation that received a message gets its summary updated by one
+        UPDATE for the whole batch.
+
+        With skip_duplicates, provider keys are claimed in message_dedupe_keys
+        with ON CONFLICT DO NOTHING and only claimed messages are inserted, so
+        provider retries (even concurrent ones, landing in any partition) are
+        ignored instead of raising IntegrityError. Every item must then carry a
+        provider_message_id.
+
+        Returns (message_id, conversation_id) per input item, in order.
+        message_id is None for items skipped as duplicates.
+        """
+        if not messages:
+            return []
+
+        addresses: dict[str, bool] = {}
+        for m in messages:
+            customer, contact = customer_and_contact(
+                m["direction"], m["from_address"], m["to_address"]
+            )
+            addresses[customer] = True
+            addresses.setdefault(contact, False)
+
+        contact_ids = self.get_or_create_contact_ids(db, addresses)
+
+        def pair_for(m: dict) -> tuple[int, int]:
+            customer, contact = customer_and_contact(
+                m["direction"], m["from_address"], m["to_address"]
+            )
+            return contact_ids[customer], contact_ids[contact]
+
+        pairs = [pair_for(m) for m in messages]
+        conversation_ids = self.get_or_create_conversation_ids(db, set(pairs))
+
+        now = datetime.now(UTC)
+        rows = [
+            {
+                "conversation_id": conversation_ids[pair],
+                "customer_id": pair[0],
+                "channel": m["channel"],
+                "message_type": m["message_type"],
+                "direction": m["direction"],
+                "provider_type": m["provider_type"],
+                "provider_message_id": m["provider_message_id"],
+                "from_contact_id": contact_ids[m["from_address"]],
+                "to_contact_id": contact_ids[m["to_address"]],
+                "body": m["body"],
+                "attachments": m["attachments"],
+                "sent_at": m["sent_at"],
+                "received_at": now,
+                "status": m.get("status"),
+            }
+            for m, pair in zip(messages, pairs)
+        ]
+
+        if skip_duplicates:
+            message_ids = self._insert_messages_ignoring_duplicates(db, rows)
+        else:
+            self._register_dedupe_keys(db, rows)
+            created = db.execute(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                rows,
+            ).all()
+            message_ids = [row.id for row in created]
+
+        self.update_summaries(db, rows, message_ids, now)
+        self._push_on_commit(
+            db,
+            rows,
+            message_ids,
+            [customer_and_contact(m["direction"], m["from_address"], m["to_address"])[0] for m in messages],
+        )
+
+        return [
+            (message_id, row["conversation_id"])
+            for message_id, row in zip(message_ids, rows)
+        ]
+
+    def _push_on_commit(
+        self,
+        db: Session,
+        rows: list[dict],
+        message_ids: list[Optional[int]],
+        customers: list[str],
+    ) -> None:
+        """
+        Queue a push event (CHANGE_FIELDS) per inserted message for its thread
+        and customer; app/services/realtime.py sends them once db commits.
+        """
+        publish_on_commit(
+            db,
+            [
+                (
+                    (conversation_topic(row["conversation_id"]), customer_topic(customer)),
+                    {
+                        "id": message_id,
+                        "conversation_id": row["conversation_id"],
+                        "direction": row["direction"],
+                        "channel": row["channel"],
+                        "body": row["body"] or "",
+                        # Naive UTC, as stored and as the read endpoints serve it
+                        "sent_at": row["sent_at"].astimezone(UTC).replace(tzinfo=None)
+                        if row["sent_at"].tzinfo
+                        else row["sent_at"],
+                        "status": row["status"],
+                    },
+                )
+                for row, message_id, customer in zip(rows, message_ids, customers)
+                if message_id is not None
+            ],
+        )
+
+    def update_summaries(
+        self,
+        db: Session,
+        rows: list[dict],
+        message_ids: list[Optional[int]],
+        now: datetime,
+    ) -> None:
+        """
+        Fold newly inserted messages into their conversations' summary columns.
+
+        One UPDATE ... FROM (VALUES ...) WHERE id covers every touched
+        conversation: message_count grows by the number of new rows, and the
+        last_message_* columns move only if the newest new message is at least
+        as recent as the current one, so late-delivered webhooks don't
+        overwrite the preview. rows need conversation_id, sent_at, direction
+        and body; message_ids of None (skipped duplicates) are ignored.
+        """
+        latest: dict[int, tuple[dict, int]] = {}
+        added: dict[int, int] = {}
+        for row, message_id in zip(rows, message_ids):
+            if message_id is None:
+                continue
+            conversation_id = row["conversation_id"]
+            added[conversation_id] = added.get(conversation_id, 0) + 1
+            current = latest.get(conversation_id)
+            if current is None or (row["sent_at"], message_id) >= (current[0]["sent_at"], current[1]):
+                latest[conversation_id] = (row, message_id)
+        if not added:
+            return
+
+        summary = values(
+            column("id", Integer),
+            column("added", Integer),
+            column("last_at", DateTime),
+            column("last_id", Integer),
+            column("last_direction", String),
+            column("preview", Text),
+            name="summary",
+        ).data(
+            [
+                (
+                    conversation_id,
+                    added[conversation_id],
+                    row["sent_at"],
+                    message_id,
+                    MessageDirection(row["direction"]).name,
+                    (row["body"] or "")[:PREVIEW_LENGTH],
+                )
+                for conversation_id, (row, message_id) in sorted(latest.items())
+            ]
+        )
+        newer = or_(
+            Conversation.last_message_at.is_(None),
+            summary.c.last_at >= Conversation.last_message_at,
+        )
+
+        def latest_or_current(new, current):
+            return case((newer, new), else_=current)
+
+        db.execute(
+            update(Conversation)
+            .where(Conversation.id == summary.c.id)
+            .values(
+                updated_at=now,
+                version=conversation_version_seq.next_value(),
+                message_count=Conversation.message_count + summary.c.added,
+                last_message_at=latest_or_current(summary.c.last_at, Conversation.last_message_at),
+                last_message_id=latest_or_current(summary.c.last_id, Conversation.last_message_id),
+                # VALUES columns arrive as text; the enum column stores member names
+                last_message_direction=latest_or_current(
+                    cast(summary.c.last_direction, Conversation.last_message_direction.type),
+                    Conversation.last_message_direction,
+                ),
+                last_message_preview=latest_or_current(
+                    summary.c.preview, Conversation.last_message_preview
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    def _register_dedupe_keys(self, db: Session, rows: list[dict]) -> None:
+        """
+        Claim provider keys for messages inserted without skip_duplicates.
+
+        A key that already exists raises IntegrityError, as a unique index on
+        messages would.
+        """
+        keys = [
+            {
+                "provider_type": row["provider_type"],
+                "provider_message_id": row["provider_message_id"],
+                "sent_at": row["sent_at"],
+            }
+            for row in rows
+            if row.get("provider_message_id") is not None
+        ]
+        if keys:
+            db.execute(insert(MessageDedupeKey), keys)
+
+    def _insert_messages_ignoring_duplicates(
+        self,
+        db: Session,
+        rows: list[dict],
+    ) -> list[Optional[int]]:
+        """
+        Claim (provider_type, provider_message_id) keys, then insert the winners.
+
+        The claim is an INSERT ... ON CONFLICT DO NOTHING into
+        message_dedupe_keys in the caller's transaction. Keys that already
+        exist (an earlier delivery, a concurrent retry that committed first)
+        are not returned by RETURNING, and repeats within the batch are
+        dropped up front; those rows get None.
+        """
+        keys = [(row["provider_type"], row["provider_message_id"]) for row in rows]
+        if any(provider_message_id is None for _, provider_message_id in keys):
+            raise ValueError("skip_duplicates requires a provider_message_id on every message")
+
+        # Only the first occurrence of a key within the batch is a candidate
+        first_index: dict[tuple[str, str], int] = {}
+        for i, key in enumerate(keys):
+            first_index.setdefault(key, i)
+        candidates = [rows[i] for i in first_index.values()]
+
+        claim = (
+            pg_insert(MessageDedupeKey)
+            .on_conflict_do_nothing()
+            .returning(MessageDedupeKey.provider_type, MessageDedupeKey.provider_message_id)
+        )
+        claimed = {
+            (row.provider_type, row.provider_message_id)
+            for row in db.execute(
+                claim,
+                [
+                    {
+                        "provider_type": row["provider_type"],
+                        "provider_message_id": row["provider_message_id"],
+                        "sent_at": row["sent_at"],
+                    }
+                    for row in candidates
+                ],
+            )
+        }
+
+        inserted: dict[tuple[str, str], int] = {}
+        winners = [
+            row
+            for row in candidates
+            if (row["provider_type"], row["provider_message_id"]) in claimed
+        ]
+        if winners:
+            created = db.execute(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                winners,
+            ).all()
+            inserted = {
+                (row["provider_type"], row["provider_message_id"]): result.id
+                for row, result in zip(winners, created)
+            }
+
+        return [
+            inserted.get(key) if first_index[key] == i else None
+            for i, key in enumerate(keys)
+        ]
+
     # -------------------------------------------------------------------------
     # Query helpers for API
     # -------------------------------------------------------------------------
 
-    def list_conversations(self, db: Session) -> list[dict]:
-        conversations = db.query(Conversation).order_by(Conversation.updated_at.desc()).all()
+    def conversation_rows(
+        self,
+        db: Session,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[Row]:
+        """
+        Conversations by most recent activity, newest first, as row tuples in
+        CONVERSATION_FIELDS order followed by the thread's version (which
+        feeds the list ETag and is not served).
+
+        Keyset-paginated on (updated_at, id): pass the key of the last row
+        served as `after` to continue. limit=None returns every conversation.
+        """
+        stmt = select(
+            Conversation.id,
+            func.coalesce(Conversation.updated_at, Conversation.created_at).label("last_updated"),
+            Conversation.last_message_at,
+            Conversation.last_message_id,
+            Conversation.last_message_direction,
+            Conversation.last_message_preview,
+            Conversation.message_count,
+            Conversation.version,
+        ).order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        if after is not None:
+            stmt = stmt.where(tuple_(Conversation.updated_at, Conversation.id) < after)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return db.execute(stmt).all()
+
+    def list_conversations(
+        self,
+        db: Session,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[dict]:
+        """
+        conversation_rows() as dicts with plain string enums.
+        """
         return [
             {
-                "id": c.id,
-                "last_updated": c.updated_at or c.created_at,
+                **row._asdict(),
+                "last_message_direction": row.last_message_direction.value
+                if row.last_message_direction
+                else None,
             }
-            for c in conversations
+            for row in self.conversation_rows(db, limit=limit, after=after)
         ]
 
-    def list_messages_for_conversation(self, db: Session, conversation_id: int) -> list[dict]:
-        messages = (
-            db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.sent_at.asc())
-            .all()
+    def conversation_version(self, db: Session, conversation_id: int) -> Optional[int]:
+        """
+        Current version of one thread, or None if it does not exist.
+        """
+        return db.execute(
+            select(Conversation.version).where(Conversation.id == conversation_id)
+        ).scalar_one_or_none()
+
+    def message_rows_for_conversation(
+        self,
+        db: Session,
+        conversation_id: int,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[Row]:
+        """
+        Messages in a thread, oldest first, as row tuples in MESSAGE_FIELDS
+        order.
+
+        Keyset-paginated on (sent_at, id) over idx_messages_conversation_sent_at.
+        limit=None returns the whole thread. Only the served columns are
+        selected (no attachments, no ORM identity map), so long threads cost
+        little more than the rows themselves.
+        """
+        stmt = (
+            select(
+                Message.id,
+                Message.direction,
+                Message.channel,
+                func.coalesce(Message.body, "").label("body"),
+                Message.sent_at,
+                Message.status,
+            )
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.sent_at.asc(), Message.id.asc())
         )
+        if after is not None:
+            stmt = stmt.where(tuple_(Message.sent_at, Message.id) > after)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return db.execute(stmt).all()
+
+    def list_messages_for_conversation(
+        self,
+        db: Session,
+        conversation_id: int,
+        limit: Optional[int] = None,
+        after: Optional[tuple[datetime, int]] = None,
+    ) -> list[dict]:
+        """
+        message_rows_for_conversation() as dicts with plain string enums.
+        """
         return [
             {
                 "id": m.id,
                 "direction": m.direction.value,
                 "channel": m.channel.value,
-                "body": m.body or "",
+                "body": m.body,
                 "sent_at": m.sent_at,
+                "status": m.status.value if m.status else None,
+            }
+            for m in self.message_rows_for_conversation(
+                db, conversation_id, limit=limit, after=after
+            )
+        ]
+
+    # -------------------------------------------------------------------------
+    # Delta sync
+    #
+    # Every message carries change_xid, the transaction that last inserted or
+    # updated it. Transaction ids are taken when a transaction first writes but
+    # become visible at commit, so "greater than the last id seen" would skip
+    # a slow transaction that commits after a later one. Deltas therefore only
+    # serve rows below the snapshot xmin, where every transaction has finished;
+    # anything newer is picked up by the next poll.
+    # -------------------------------------------------------------------------
+
+    def message_changes(
+        self,
+        db: Session,
+        conversation_id: Optional[int] = None,
+        customer: Optional[str] = None,
+        since: Optional[tuple[int, int]] = None,
+        limit: int = settings.PAGE_SIZE_DEFAULT,
+    ) -> tuple[list[Row], tuple[int, int], bool]:
+        """
+        Messages inserted or updated after the `since` watermark, oldest change
+        first, as row tuples starting with CHANGE_FIELDS; with the watermark to
+        send next time and whether more changes are already waiting.
+
+        Covers one thread (conversation_id) or every thread of a customer
+        address. The rows come from idx_messages_conversation_change or
+        idx_messages_customer_change starting at the watermark, so the work
+        follows what changed rather than the size of the history or the number
+        of threads. since=None starts from the beginning.
+        """
+        horizon = db.execute(
+            select(cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger))
+        ).scalar_one()
+
+        stmt = (
+            select(
+                Message.id,
+                Message.conversation_id,
+                Message.direction,
+                Message.channel,
+                func.coalesce(Message.body, "").label("body"),
+                Message.sent_at,
+                Message.status,
+                Message.change_xid,
+            )
+            .where(Message.change_xid < horizon)
+            .order_by(Message.change_xid, Message.id)
+            .limit(limit + 1)
+        )
+        if conversation_id is not None:
+            stmt = stmt.where(Message.conversation_id == conversation_id)
+        if since is not None:
+            # (change_xid, id) > since, spelled out: the planner estimates a row
+            # comparison at one row and would sort the whole batch after a bulk load
+            change_xid, row_id = since
+            stmt = stmt.where(
+                Message.change_xid >= change_xid,
+                or_(Message.change_xid > change_xid, Message.id > row_id),
+            )
+        if customer is not None:
+            # One contact id, so the rows come straight off idx_messages_customer_change
+            stmt = stmt.where(
+                Message.customer_id
+                == select(Contact.id)
+                .where(Contact.address == customer, Contact.address_type == infer_address_type(customer))
+                .scalar_subquery()
+            )
+
+        rows = db.execute(stmt).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, (rows[-1].change_xid, rows[-1].id), True
+        # Everything below the horizon has been served; never move backwards
+        # (a lagging replica can report an older horizon than the primary did)
+        return rows, max(since or (0, 0), (horizon, 0)), False
+
+    def iter_messages_for_export(
+        self,
+        db: Session,
+        conversation_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        include_attachments: bool = False,
+        batch_size: int = settings.EXPORT_BATCH_SIZE,
+    ) -> Iterator[list[dict]]:
+        """
+        Stream messages in batches of at most `batch_size` dicts.
+
+        One thread (or every thread when conversation_id is None) in
+        (conversation_id, sent_at, id) order, bounded by since <= sent_at <
+        until. Plain columns are fetched through a server-side cursor with
+        yield_per, so memory stays flat however large the export is.
+        """
+        from_contact = aliased(Contact)
+        to_contact = aliased(Contact)
+        columns = [
+            Message.id,
+            Message.conversation_id,
+            Message.direction,
+            Message.channel,
+            Message.message_type,
+            from_contact.address.label("from_address"),
+            to_contact.address.label("to_address"),
+            Message.body,
+            Message.sent_at,
+            Message.status,
+            Message.provider_message_id,
+        ]
+        if include_attachments:
+            columns.append(Message.attachments)
+
+        stmt = (
+            select(*columns)
+            .join(from_contact, from_contact.id == Message.from_contact_id)
+            .join(to_contact, to_contact.id == Message.to_contact_id)
+            .order_by(Message.conversation_id, Message.sent_at, Message.id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        if conversation_id is not None:
+            stmt = stmt.where(Message.conversation_id == conversation_id)
+        if since is not None:
+            stmt = stmt.where(Message.sent_at >= since)
+        if until is not None:
+            stmt = stmt.where(Message.sent_at < until)
+
+        for partition in db.execute(stmt).partitions():
+            batch = []
+            for row in partition:
+                item = {
+                    "id": row.id,
+                    "conversation_id": row.conversation_id,
+                    "direction": row.direction.value,
+                    "channel": row.channel.value,
+                    "type": row.message_type.value,
+                    "from": row.from_address,
+                    "to": row.to_address,
+                    "body": row.body or "",
+                    "sent_at": row.sent_at,
+                    "status": row.status.value if row.status else None,
+                    "provider_message_id": row.provider_message_id,
+                }
+                if include_attachments:
+                    item["attachments"] = row.attachments
+                batch.append(item)
+            yield batch
+
+    # -------------------------------------------------------------------------
+    # Full-text search
+    # -------------------------------------------------------------------------
+
+    def search_messages(
+        self,
+        db: Session,
+        query: str,
+        customer: Optional[str] = None,
+        contact: Optional[str] = None,
+        limit: int = settings.PAGE_SIZE_DEFAULT,
+    ) -> list[dict]:
+        """
+        Messages whose body matches `query`, best match first.
+
+        `query` uses web search syntax ("quoted phrase", or, -excluded). Matching
+        runs on the GIN index over messages.body_tsv and every match is ranked;
+        highlighting only touches the `limit` rows returned. customer / contact
+        restrict the search to threads with that address on the respective side.
+
+        `highlight` is HTML: the body is escaped first, so the only markup is
+        the <b>...</b> around matched terms.
+        """
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        tsquery = func.websearch_to_tsquery(config, query)
+        rank = func.ts_rank_cd(Message.body_tsv, tsquery)
+
+        matches = select(
+            Message.id,
+            Message.conversation_id,
+            Message.direction,
+            Message.channel,
+            Message.body,
+            Message.sent_at,
+            rank.label("rank"),
+        ).where(Message.body_tsv.op("@@")(tsquery))
+        for address, side in ((customer, Conversation.customer_id), (contact, Conversation.contact_id)):
+            if address is not None:
+                matches = matches.where(
+                    Message.conversation_id.in_(
+                        select(Conversation.id)
+                        .join(Contact, Contact.id == side)
+                        .where(
+                            Contact.address == address,
+                            Contact.address_type == infer_address_type(address),
+                        )
+                    )
+                )
+        top = (
+            matches.order_by(rank.desc(), Message.sent_at.desc(), Message.id.desc())
+            .limit(limit)
+            .subquery()
+        )
+
+        body = func.coalesce(top.c.body, "")
+        for char, entity in HTML_ESCAPES:
+            body = func.replace(body, char, entity)
+        highlight = func.ts_headline(
+            config,
+            body,
+            tsquery,
+            "MaxFragments=2, MaxWords=20, MinWords=5",
+        )
+        rows = db.execute(
+            select(top, highlight.label("highlight")).order_by(
+                top.c.rank.desc(), top.c.sent_at.desc(), top.c.id.desc()
+            )
+        )
+        return [
+            {
+                "id": r.id,
+                "conversation_id": r.conversation_id,
+                "direction": r.direction.value,
+                "channel": r.channel.value,
+                "body": r.body or "",
+                "sent_at": r.sent_at,
+                "rank": r.rank,
+                "highlight": r.highlight,
             }
-            for m in messages
+            for r in rows
         ]
 
     # -------------------------------------------------------------------------
     # Idempotency for inbound webhooks
+    #
+    # The webhook routes rely on create_messages(skip_duplicates=True) and
+    # message_dedupe_keys instead; this explicit check is kept for callers that
+    # need to know about a delivery without inserting it.
     # -------------------------------------------------------------------------
 
     def inbound_message_exists(
@@ -244,12 +1053,6 @@ class ConversationService:
         if not provider_message_id:
             return False
 
-        existing = (
-            db.query(Message)
-            .filter(
-                Message.provider_type == provider_type,
-                Message.provider_message_id == provider_message_id,
-            )
-            .first()
-        )
+        # A primary-key lookup rather than a scan of every message partition
+        existing = db.get(MessageDedupeKey, (provider_type, provider_message_id))
         return existing is not None
@@ -0,0 +1,162 @@
+"""
+Outbox dispatcher: drains the outbox table and calls the providers.
+
+Run standalone with bin/dispatcher.sh (any number of processes/hosts), or
+in-process via OUTBOX_INPROCESS_WORKERS, which app/main.py starts on startup.
+Workers coordinate purely through SELECT ... FOR UPDATE SKIP LOCKED, so they
+can be scaled out freely.
+
+    python -m app.services.outbox_dispatcher --workers 4 --processes 2
+"""
+
+import argparse
+import logging
+import multiprocessing
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.services.outbox_service import ClaimedEntry, OutboxService
+from app.services.providers import (
+    get_provider_for_email,
+    get_provider_for_sms_message,
+    provider_registry,
+)
+from app.services.providers.base import BaseProvider
+from app.services.providers.types import ProviderResult, ProviderStatus
+
+logger = logging.getLogger(__name__)
+
+
+def provider_for(entry: ClaimedEntry) -> BaseProvider:
+    if entry.channel == "email":
+        return get_provider_for_email()
+    return get_provider_for_sms_message(entry.message_type)
+
+
+def max_send_seconds() -> float:
+    return max(
+        (getattr(provider, "max_send_seconds", 0.0) for provider in provider_registry.values()),
+        default=0.0,
+    )
+
+
+class OutboxDispatcher:
+    """
+    Claims due outbox entries one at a time and sends each before claiming
+    the next, up to `batch_size` per dispatch_once().
+
+    A lease only has to cover a single send, and the slowest possible send
+    (max_send_seconds) must fit inside it: otherwise the lease could expire
+    mid-send and another worker would claim and send the entry again.
+
+    Each instance is one worker; run several (threads or processes) for
+    concurrency.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        outbox: Optional[OutboxService] = None,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        poll_interval_seconds: float = settings.OUTBOX_POLL_INTERVAL_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.outbox = outbox or OutboxService()
+        self.batch_size = batch_size
+        self.poll_interval_seconds = poll_interval_seconds
+        if max_send_seconds() >= self.outbox.lease_seconds:
+            raise ValueError(
+                f"OUTBOX_LEASE_SECONDS ({self.outbox.lease_seconds}) must exceed the longest "
+                f"provider send ({max_send_seconds()}s: routes x PROVIDER_SLOW_CALL_SECONDS)"
+            )
+
+    def dispatch_once(self) -> int:
+        """
+        Process up to batch_size entries. Returns the number handled.
+        """
+        db = self.session_factory()
+        try:
+            handled = 0
+            while handled < self.batch_size:
+                entries = self.outbox.claim(db, 1)
+                if not entries:
+                    break
+                result = self._send(entries[0])
+                self.outbox.record_result(db, entries[0], result)
+                handled += 1
+            return handled
+        finally:
+            db.close()
+
+    def _send(self, entry: ClaimedEntry) -> ProviderResult:
+        try:
+            return provider_for(entry).send(entry.payload)
+        except Exception as exc:
+            # Treat unexpected provider errors as transient so they are retried
+            logger.exception("Provider send failed for outbox entry %s", entry.id)
+            return ProviderResult(
+                status=ProviderStatus.TEMPORARY_FAILURE,
+                error_message=str(exc),
+            )
+
+    def run(self, stop: threading.Event) -> None:
+        """
+        Dispatch until `stop` is set, sleeping only when the outbox is idle.
+        """
+        while not stop.is_set():
+            try:
+                handled = self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                handled = 0
+            if handled < self.batch_size:
+                stop.wait(self.poll_interval_seconds)
+
+
+def start_worker_threads(count: int, stop: threading.Event) -> list[threading.Thread]:
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(
+            target=OutboxDispatcher().run,
+            args=(stop,),
+            name=f"outbox-dispatcher-{i}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _run_process(workers: int) -> None:
+    stop = threading.Event()
+    for thread in start_worker_threads(workers, stop):
+        thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dispatch pending outbound sends.")
+    parser.add_argument("--workers", type=int, default=4, help="threads per process")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.processes == 1:
+        _run_process(args.workers)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_run_process, args=(args.workers,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
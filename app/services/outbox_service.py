@@ -0,0 +1,243 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Any, Optional
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (
+    Conversation,
+    Message,
+    MessageStatus,
+    OutboxEntry,
+    OutboxStatus,
+    conversation_version_seq,
+)
+from app.services.providers.types import ProviderResult, ProviderStatus
+
+
+def _utcnow() -> datetime:
+    # Outbox timestamps are compared in SQL, so keep them naive UTC to match
+    # the TIMESTAMP WITHOUT TIME ZONE columns regardless of server TimeZone.
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+@dataclass
+class ClaimedEntry:
+    id: int
+    message_id: int
+    channel: str
+    message_type: str
+    payload: dict
+    attempts: int
+
+
+class OutboxService:
+    """
+    Transactional outbox for outbound provider sends.
+
+    The API writes a pending Message plus an OutboxEntry in one transaction.
+    Dispatchers claim due entries with SELECT ... FOR UPDATE SKIP LOCKED,
+    holding a time-limited lease instead of a long transaction. They then call
+    the provider and record the outcome, retrying with backoff and
+    dead-lettering on permanent failure or exhausted attempts.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = settings.OUTBOX_MAX_ATTEMPTS,
+        backoff_base_seconds: float = settings.OUTBOX_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = settings.OUTBOX_BACKOFF_MAX_SECONDS,
+        lease_seconds: float = settings.OUTBOX_LEASE_SECONDS,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lease_seconds = lease_seconds
+
+    # -------------------------------------------------------------------------
+    # Producer side
+    # -------------------------------------------------------------------------
+
+    def enqueue(self, db: Session, entries: list[dict[str, Any]]) -> None:
+        """
+        Add outbox rows for pending messages; the caller commits.
+
+        Each entry needs message_id, channel, message_type and payload (a
+        JSON-serializable provider payload).
+        """
+        if not entries:
+            return
+        now = _utcnow()
+        db.execute(
+            insert(OutboxEntry),
+            [
+                {
+                    "message_id": e["message_id"],
+                    "channel": e["channel"],
+                    "message_type": e["message_type"],
+                    "payload": e["payload"],
+                    "status": OutboxStatus.PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                }
+                for e in entries
+            ],
+        )
+
+    # -------------------------------------------------------------------------
+    # Dispatcher side
+    # -------------------------------------------------------------------------
+
+    def claim(self, db: Session, limit: int) -> list[ClaimedEntry]:
+        """
+        Lease up to `limit` due entries and commit the claim.
+
+        Due means pending with next_attempt_at in the past, or in flight with
+        an expired lease (the worker holding it died). SKIP LOCKED lets any
+        number of workers claim concurrently without blocking each other.
+        """
+        now = _utcnow()
+        due = (
+            select(OutboxEntry.id)
+            .where(
+                or_(
+                    and_(
+                        OutboxEntry.status == OutboxStatus.PENDING,
+                        OutboxEntry.next_attempt_at <= now,
+                    ),
+                    and_(
+                        OutboxEntry.status == OutboxStatus.IN_FLIGHT,
+                        OutboxEntry.locked_until < now,
+                    ),
+                )
+            )
+            .order_by(OutboxEntry.next_attempt_at, OutboxEntry.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = db.execute(
+            update(OutboxEntry)
+            .where(OutboxEntry.id.in_(due.scalar_subquery()))
+            .values(
+                status=OutboxStatus.IN_FLIGHT,
+                locked_until=now + timedelta(seconds=self.lease_seconds),
+                attempts=OutboxEntry.attempts + 1,
+            )
+            .returning(
+                OutboxEntry.id,
+                OutboxEntry.message_id,
+                OutboxEntry.channel,
+                OutboxEntry.message_type,
+                OutboxEntry.payload,
+                OutboxEntry.attempts,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        # UPDATE ... RETURNING has no defined order; hand entries out oldest first
+        return [ClaimedEntry(**row._asdict()) for row in sorted(rows, key=lambda r: r.id)]
+
+    def backoff_seconds(self, attempts: int, retry_after_seconds: Optional[int] = None) -> float:
+        """
+        Exponential backoff with full jitter, never sooner than retry_after.
+        """
+        cap = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempts - 1))
+        return max(float(retry_after_seconds or 0), random.uniform(0, cap))
+
+    def record_result(
+        self,
+        db: Session,
+        entry: ClaimedEntry,
+        result: ProviderResult,
+    ) -> Optional[OutboxStatus]:
+        """
+        Apply a provider outcome to the entry and its message, then commit.
+
+        SUCCESS marks both sent. TEMPORARY_FAILURE and RATE_LIMITED are
+        rescheduled until max_attempts (local throttling does not count as an
+        attempt), PERMANENT_FAILURE is dead-lettered straight away. Updates
+        are fenced on the claimed attempt number so a worker whose lease
+        expired cannot overwrite a newer claim; in that case nothing is
+        written and None is returned.
+        """
+        now = _utcnow()
+        fence = and_(
+            OutboxEntry.id == entry.id,
+            OutboxEntry.status == OutboxStatus.IN_FLIGHT,
+            OutboxEntry.attempts == entry.attempts,
+        )
+
+        if result.status == ProviderStatus.SUCCESS:
+            new_status = OutboxStatus.SENT
+            values = dict(status=new_status, locked_until=None, last_error=None)
+        elif result.throttled:
+            # Held back by our own rate limiter: reschedule without using up an attempt
+            new_status = OutboxStatus.PENDING
+            values = dict(
+                status=new_status,
+                locked_until=None,
+                attempts=entry.attempts - 1,
+                next_attempt_at=now + timedelta(seconds=result.retry_after_seconds or 0),
+            )
+        elif (
+            result.status == ProviderStatus.PERMANENT_FAILURE
+            or entry.attempts >= self.max_attempts
+        ):
+            new_status = OutboxStatus.DEAD
+            values = dict(status=new_status, locked_until=None, last_error=_describe(result))
+        else:
+            new_status = OutboxStatus.PENDING
+            delay = self.backoff_seconds(entry.attempts, result.retry_after_seconds)
+            values = dict(
+                status=new_status,
+                locked_until=None,
+                next_attempt_at=now + timedelta(seconds=delay),
+                last_error=_describe(result),
+            )
+
+        updated = db.execute(
+            update(OutboxEntry)
+            .where(fence)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.rollback()
+            return None
+
+        if new_status in (OutboxStatus.SENT, OutboxStatus.DEAD):
+            message_values: dict[str, Any] = {
+                "status": MessageStatus.SENT
+                if new_status == OutboxStatus.SENT
+                else MessageStatus.FAILED,
+            }
+            if result.provider_message_id:
+                message_values["provider_message_id"] = result.provider_message_id
+            db.execute(
+                update(Message)
+                .where(Message.id == entry.message_id)
+                .values(**message_values)
+                .execution_options(synchronize_session=False)
+            )
+            # The thread's content changed (delivery status), so move its ETag
+            db.execute(
+                update(Conversation)
+                .where(
+                    Conversation.id
+                    == select(Message.conversation_id)
+                    .where(Message.id == entry.message_id)
+                    .scalar_subquery()
+                )
+                .values(version=conversation_version_seq.next_value())
+                .execution_options(synchronize_session=False)
+            )
+
+        db.commit()
+        return new_status
+
+
+def _describe(result: ProviderResult) -> str:
+    return f"{result.status.value}: {result.error_message or ''}".rstrip(": ")
@@ -0,0 +1,321 @@
+"""
+Monthly range partitions of `messages` (by sent_at) and their retention.
+
+messages is declared PARTITION BY RANGE (sent_at) with a DEFAULT partition
+(see app/models.py). This module creates one partition per month,
+messages_yYYYYmMM, ahead of time; rows with no partition for their month
+fall into messages_default and are moved into a proper partition when it is
+created. Retention detaches partitions older than MESSAGES_RETENTION_MONTHS,
+archives them as gzipped CSV under MESSAGES_ARCHIVE_DIR and drops them
+together with their outbox rows and dedupe keys. A plain DETACH locks the
+parent table (CONCURRENTLY is not allowed next to a default partition), so
+it runs alone in a short transaction; the slow archive happens afterwards,
+on the detached table.
+
+    python -m app.services.partitions maintain     # split default, create ahead, retention
+    python -m app.services.partitions list
+    python -m app.services.partitions ensure 2023-01 2024-12
+    ./bin/partitions.sh maintain                   # e.g. daily from cron
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, UTC
+from pathlib import Path
+from typing import Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Message
+
+logger = logging.getLogger(__name__)
+
+PARENT = "messages"
+DEFAULT_PARTITION = "messages_default"
+# Serializes partition DDL across API processes, importers and cron runs
+_ADVISORY_LOCK_KEY = 0x6D736773
+
+_STORED_COLUMNS = [c.name for c in Message.__table__.columns if c.computed is None]
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    lower: Optional[datetime]  # None for the default partition
+    upper: Optional[datetime]
+
+
+def month_start(value: Union[date, datetime]) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_y{month.year}m{month.month:02d}"
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _lock(db: Session) -> None:
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+
+
+def is_partitioned(db: Session) -> bool:
+    """
+    False for a messages table created before partitioning (needs a rebuild).
+    """
+    return bool(
+        db.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table"
+                " WHERE partrelid = to_regclass(:parent))"
+            ),
+            {"parent": PARENT},
+        ).scalar()
+    )
+
+
+def list_partitions(db: Session) -> list[Partition]:
+    rows = db.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound"
+            " FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = to_regclass(:parent)"
+            " ORDER BY c.relname"
+        ),
+        {"parent": PARENT},
+    ).all()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUNDS.search(bound)
+        if match:
+            lower, upper = (datetime.fromisoformat(v) for v in match.groups())
+            partitions.append(Partition(name, lower, upper))
+        else:
+            partitions.append(Partition(name, None, None))
+    return partitions
+
+
+def create_partition(db: Session, month: datetime) -> bool:
+    """
+    Create the partition for one month unless it exists. The caller commits.
+
+    Rows already sitting in the default partition for that month are moved
+    into the new table before it is attached (ATTACH would otherwise fail).
+    """
+    name = partition_name(month)
+    if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+
+    lower, upper = month, add_months(month, 1)
+    bounds = f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+    in_range = {"lower": lower, "upper": upper}
+    stranded = db.execute(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION}"
+            " WHERE sent_at >= :lower AND sent_at < :upper)"
+        ),
+        in_range,
+    ).scalar()
+
+    if not stranded:
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} {bounds}"))
+    else:
+        db.execute(
+            text(
+                f"CREATE TABLE {name} (LIKE {PARENT}"
+                " INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+            )
+        )
+        # Generated columns (body_tsv) are recomputed on insert, not copied
+        columns = ", ".join(_STORED_COLUMNS)
+        db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION}"
+                f" WHERE sent_at >= :lower AND sent_at < :upper RETURNING {columns})"
+                f" INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+            ),
+            in_range,
+        )
+        db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} {bounds}"))
+    logger.info("Created partition %s%s", name, " (moved rows from default)" if stranded else "")
+    return True
+
+
+def ensure_partitions(db: Session, start: datetime, end: datetime) -> list[str]:
+    """
+    Make sure every month from start to end (inclusive) has a partition.
+    Returns the names created. The caller commits.
+    """
+    _lock(db)
+    created = []
+    month, last = month_start(start), month_start(end)
+    while month <= last:
+        if create_partition(db, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_future_partitions(
+    db: Session,
+    months_ahead: int = settings.MESSAGES_PARTITION_MONTHS_AHEAD,
+    now: Optional[datetime] = None,
+) -> list[str]:
+    current = month_start(now or _now())
+    return ensure_partitions(db, current, add_months(current, months_ahead))
+
+
+def split_default(db: Session) -> list[str]:
+    """
+    Give every month found in the default partition its own partition.
+    """
+    months = db.execute(
+        text(f"SELECT DISTINCT date_trunc('month', sent_at) FROM {DEFAULT_PARTITION}")
+    ).scalars().all()
+    created = []
+    for month in sorted(months):
+        created.extend(ensure_partitions(db, month, month))
+    return created
+
+
+def archive_partition(db: Session, name: str, archive_dir: Path) -> tuple[Path, int]:
+    """
+    Write a partition to <archive_dir>/<name>.csv.gz. Returns (path, rows).
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.csv.gz"
+    partial = path.with_suffix(".gz.partial")
+    cursor = db.connection().connection.cursor()
+    try:
+        with gzip.open(partial, "wb") as fh:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+        rows = cursor.rowcount
+    finally:
+        cursor.close()
+    os.replace(partial, path)
+    return path, rows
+
+
+def detached_partitions(db: Session) -> list[str]:
+    """
+    Monthly partition tables no longer attached to messages, i.e. detached by
+    a retention run that stopped before dropping them.
+    """
+    return list(
+        db.execute(
+            text(
+                "SELECT relname FROM pg_class"
+                " WHERE relkind = 'r' AND NOT relispartition AND relname ~ :pattern"
+                " ORDER BY relname"
+            ),
+            {"pattern": f"^{PARENT}_y[0-9]{{4}}m[0-9]{{2}}$"},
+        ).scalars()
+    )
+
+
+def _partition_month(name: str) -> datetime:
+    year, month = name[len(PARENT) + 2 :].split("m")
+    return datetime(int(year), int(month), 1)
+
+
+def apply_retention(
+    db: Session,
+    keep_months: int = settings.MESSAGES_RETENTION_MONTHS,
+    archive_dir: Path = Path(settings.MESSAGES_ARCHIVE_DIR),
+    now: Optional[datetime] = None,
+) -> list[dict]:
+    """
+    Archive and drop partitions that end before the retention window.
+
+    Keeps the current month plus `keep_months` full months before it;
+    keep_months=0 disables retention. Each expired partition is first
+    detached in a transaction of its own, the only step that locks messages.
+    The detached table no longer changes, so it is then archived, its outbox
+    rows and dedupe keys deleted, and dropped without touching the parent.
+    Tables left detached by an interrupted run are finished the same way.
+    """
+    if keep_months <= 0:
+        return []
+    cutoff = add_months(month_start(now or _now()), -keep_months)
+    for partition in list_partitions(db):
+        if partition.upper is None or partition.upper > cutoff:
+            continue
+        _lock(db)
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}"))
+        db.commit()
+
+    dropped = []
+    for name in detached_partitions(db):
+        lower = _partition_month(name)
+        upper = add_months(lower, 1)
+        if upper > cutoff:
+            continue
+        path, rows = archive_partition(db, name, archive_dir)
+        db.commit()
+
+        db.execute(text(f"DELETE FROM outbox WHERE message_id IN (SELECT id FROM {name})"))
+        db.execute(
+            text("DELETE FROM message_dedupe_keys WHERE sent_at >= :lower AND sent_at < :upper"),
+            {"lower": lower, "upper": upper},
+        )
+        db.execute(text(f"DROP TABLE {name}"))
+        db.commit()
+        logger.info("Archived %d rows of %s to %s and dropped it", rows, name, path)
+        dropped.append({"partition": name, "rows": rows, "archive": str(path)})
+    return dropped
+
+
+def maintain(db: Session) -> dict:
+    """
+    Split the default partition, create partitions ahead, apply retention.
+    """
+    created = split_default(db)
+    created += ensure_future_partitions(db)
+    db.commit()
+    return {"created": created, "dropped": apply_retention(db)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the messages table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("maintain", help="split default, create partitions ahead, apply retention")
+    commands.add_parser("list", help="show partitions and their bounds")
+    ensure = commands.add_parser("ensure", help="create partitions for a range of months")
+    ensure.add_argument("start", type=lambda v: datetime.strptime(v, "%Y-%m"), help="YYYY-MM")
+    ensure.add_argument("end", type=lambda v: datetime.strptime(v, "%Y-%m"), help="YYYY-MM")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with SessionLocal() as db:
+        if not is_partitioned(db):
+            raise SystemExit(f"{PARENT} is not a partitioned table; recreate it to enable partitioning")
+        if args.command == "maintain":
+            print(json.dumps(maintain(db)))
+        elif args.command == "ensure":
+            print(json.dumps({"created": ensure_partitions(db, args.start, args.end)}))
+            db.commit()
+        else:
+            for p in list_partitions(db):
+                bounds = f"{p.lower:%Y-%m-%d} .. {p.upper:%Y-%m-%d}" if p.lower else "DEFAULT"
+                print(f"{p.name:<24} {bounds}")
+
+
+if __name__ == "__main__":
+    main()
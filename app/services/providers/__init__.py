@@ -1,15 +1,72 @@
 from typing import Dict
 
+from app.config import settings
 from app.services.providers.base import BaseProvider
+from app.services.providers.rate_limiter import RateLimitedProvider
+from app.services.providers.routing import CircuitBreaker, ProviderRoute, ProviderRouter
 from app.services.providers.sms_provider import SmsProvider
 from app.services.providers.email_provider import EmailProvider
 
 
-# Simple provider registry keyed by "channel"
-# In the future you could support multiple providers per channel.
+def _sms_limited(provider: BaseProvider) -> RateLimitedProvider:
+    return RateLimitedProvider(
+        provider,
+        rate=settings.RATE_LIMIT_SMS_PER_SECOND,
+        burst=settings.RATE_LIMIT_SMS_BURST,
+        per_sender_rate=settings.RATE_LIMIT_SMS_PER_SENDER_PER_SECOND,
+        per_sender_burst=settings.RATE_LIMIT_SMS_PER_SENDER_BURST,
+        block=settings.RATE_LIMIT_BLOCK,
+        max_wait_seconds=settings.RATE_LIMIT_MAX_WAIT_SECONDS,
+        max_senders=settings.RATE_LIMIT_SENDER_BUCKETS,
+        sender_idle_seconds=settings.RATE_LIMIT_SENDER_IDLE_SECONDS,
+    )
+
+
+def _email_limited(provider: BaseProvider) -> RateLimitedProvider:
+    return RateLimitedProvider(
+        provider,
+        rate=settings.RATE_LIMIT_EMAIL_PER_SECOND,
+        burst=settings.RATE_LIMIT_EMAIL_BURST,
+        per_sender_rate=settings.RATE_LIMIT_EMAIL_PER_SENDER_PER_SECOND,
+        per_sender_burst=settings.RATE_LIMIT_EMAIL_PER_SENDER_BURST,
+        block=settings.RATE_LIMIT_BLOCK,
+        max_wait_seconds=settings.RATE_LIMIT_MAX_WAIT_SECONDS,
+        max_senders=settings.RATE_LIMIT_SENDER_BUCKETS,
+        sender_idle_seconds=settings.RATE_LIMIT_SENDER_IDLE_SECONDS,
+    )
+
+
+def _route(name: str, provider: BaseProvider, weight: float) -> ProviderRoute:
+    return ProviderRoute(
+        name,
+        provider,
+        weight=weight,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.PROVIDER_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout_seconds=settings.PROVIDER_BREAKER_RESET_SECONDS,
+        ),
+    )
+
+
+# Provider registry keyed by "channel". Each channel is a ProviderRouter over
+# a primary and a backup provider (weight 0 = standby, failover only), each
+# behind its own circuit breaker and RateLimitedProvider. The mocks stand in
+# for real vendors: swap in e.g. TwilioProvider() / SendGridProvider() here.
 provider_registry: Dict[str, BaseProvider] = {
-    "sms": SmsProvider(),
-    "email": EmailProvider(),
+    "sms": ProviderRouter(
+        [
+            _route("sms-primary", _sms_limited(SmsProvider()), settings.PROVIDER_PRIMARY_WEIGHT),
+            _route("sms-backup", _sms_limited(SmsProvider()), settings.PROVIDER_BACKUP_WEIGHT),
+        ],
+        slow_call_seconds=settings.PROVIDER_SLOW_CALL_SECONDS,
+    ),
+    "email": ProviderRouter(
+        [
+            _route("email-primary", _email_limited(EmailProvider()), settings.PROVIDER_PRIMARY_WEIGHT),
+            _route("email-backup", _email_limited(EmailProvider()), settings.PROVIDER_BACKUP_WEIGHT),
+        ],
+        slow_call_seconds=settings.PROVIDER_SLOW_CALL_SECONDS,
+    ),
 }
 
 
@@ -20,3 +77,14 @@ def get_provider_for_sms_message(message_type: str) -> BaseProvider:
 
 def get_provider_for_email() -> BaseProvider:
     return provider_registry["email"]
+
+
+def provider_stats() -> dict:
+    """
+    Per-channel routing stats: breaker state, latency, results, recent decisions.
+    """
+    return {
+        channel: provider.stats()
+        for channel, provider in provider_registry.items()
+        if hasattr(provider, "stats")
+    }
@@ -0,0 +1,208 @@
+import math
+import threading
+import time
+from dataclasses import replace
+from typing import Callable, Optional
+
+from app.utils.cache import LRUCache
+
+from .base import BaseProvider
+from .types import ProviderResult, ProviderStatus
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with AIMD rate adaptation.
+
+    `rate` tokens per second refill up to `capacity`. A rate of 0 means
+    unlimited. penalize() halves the current rate (down to `min_rate`) and
+    pauses the bucket for the provider's retry-after; reward() grows the rate
+    back towards the configured maximum one step per successful send.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        increase_fraction: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.decrease_factor = decrease_factor
+        self.increase_step = rate * increase_fraction
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def take(self, max_wait: float) -> Optional[float]:
+        """
+        Reserve one token.
+
+        Returns how long the caller must wait before using it (0 if it is
+        available now), or None without reserving if that would exceed
+        `max_wait`.
+        """
+        if self.max_rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            wait = max(0.0, (1 - self._tokens) / self.rate, self._paused_until - now)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def refund(self) -> None:
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def penalize(self, retry_after_seconds: Optional[float] = None) -> None:
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after_seconds:
+                self._paused_until = max(self._paused_until, now + retry_after_seconds)
+
+    def reward(self) -> None:
+        if self.max_rate <= 0 or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "tokens": self._tokens,
+            "paused_for": max(0.0, self._paused_until - self._clock()),
+        }
+
+
+class RateLimitedProvider(BaseProvider):
+    """
+    Provider wrapper enforcing a per-provider and a per-sender token bucket.
+
+    The sender is the payload's "from" address, since carriers cap throughput
+    per long code. With block=True a send waits up to `max_wait_seconds` for
+    tokens; otherwise, or if the wait would be longer, the provider is not
+    called and a RATE_LIMITED result with throttled=True and a retry_after
+    hint is returned instead. A RATE_LIMITED answer from the provider itself
+    shrinks both buckets' rates and pauses them for its retry_after.
+
+    Per-sender buckets are kept in an LRU of `max_senders`, and one unused for
+    `sender_idle_seconds` is dropped: by then it has refilled, so a new bucket
+    for that sender starts in the same state.
+    """
+
+    def __init__(
+        self,
+        provider: BaseProvider,
+        rate: float,
+        burst: Optional[float] = None,
+        per_sender_rate: float = 0,
+        per_sender_burst: Optional[float] = None,
+        block: bool = True,
+        max_wait_seconds: float = 5.0,
+        max_senders: int = 10000,
+        sender_idle_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.per_sender_rate = per_sender_rate
+        self.per_sender_burst = per_sender_burst
+        self.block = block
+        self.max_wait_seconds = max_wait_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._sender_buckets = LRUCache(max_senders, sender_idle_seconds, clock=clock)
+        self._lock = threading.Lock()
+
+    def _sender_bucket(self, sender: Optional[str]) -> Optional[TokenBucket]:
+        if not sender or self.per_sender_rate <= 0:
+            return None
+        with self._lock:
+            bucket = self._sender_buckets.get(sender)
+            if bucket is None:
+                bucket = TokenBucket(
+                    self.per_sender_rate, self.per_sender_burst, clock=self._clock
+                )
+            # Put back on every use so the TTL measures idle time, not age
+            self._sender_buckets.put(sender, bucket)
+            return bucket
+
+    def _acquire(self, payload: dict, block: Optional[bool]) -> tuple[Optional[float], list[TokenBucket]]:
+        """
+        Reserve a token from every applicable bucket.
+
+        Returns (wait_seconds, buckets), or (None, buckets) if throttled, in
+        which case any partial reservation has been refunded.
+        """
+        max_wait = self.max_wait_seconds if (self.block if block is None else block) else 0.0
+        buckets = [self.bucket]
+        sender_bucket = self._sender_bucket(payload.get("from"))
+        if sender_bucket is not None:
+            buckets.append(sender_bucket)
+
+        wait = 0.0
+        reserved = []
+        for bucket in buckets:
+            needed = bucket.take(max_wait)
+            if needed is None:
+                for b in reserved:
+                    b.refund()
+                return None, buckets
+            reserved.append(bucket)
+            wait = max(wait, needed)
+        return wait, buckets
+
+    def _throttled(self, buckets: list[TokenBucket]) -> ProviderResult:
+        retry_after = max(
+            (1 / b.rate if b.rate else 0) + b.stats()["paused_for"] for b in buckets
+        )
+        return ProviderResult(
+            status=ProviderStatus.RATE_LIMITED,
+            retry_after_seconds=max(1, math.ceil(retry_after)),
+            error_message="throttled by local rate limiter",
+            throttled=True,
+        )
+
+    def _observe(self, result: ProviderResult, buckets: list[TokenBucket]) -> ProviderResult:
+        for bucket in buckets:
+            if result.status == ProviderStatus.RATE_LIMITED:
+                bucket.penalize(result.retry_after_seconds)
+            elif result.status == ProviderStatus.SUCCESS:
+                bucket.reward()
+        return result
+
+    def send(self, payload: dict, block: Optional[bool] = None) -> ProviderResult:
+        wait, buckets = self._acquire(payload, block)
+        if wait is None:
+            return self._throttled(buckets)
+        if wait > 0:
+            self._sleep(wait)
+        return replace(self._observe(self.provider.send(payload), buckets), waited_seconds=wait)
+
+    def stats(self) -> dict:
+        return {"provider": self.bucket.stats(), "senders": self._sender_buckets.stats()}
@@ -0,0 +1,311 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Optional
+
+from app.utils.metrics import provider_send_duration
+
+from .base import BaseProvider
+from .types import ProviderResult, ProviderStatus
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout_seconds`, then lets up to `half_open_max_calls` probes
+    through. A successful probe closes it again; a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = BreakerState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> BreakerState:
+        if (
+            self._state == BreakerState.OPEN
+            and self._clock() - self._opened_at >= self.reset_timeout_seconds
+        ):
+            self._state = BreakerState.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == BreakerState.CLOSED:
+                return True
+            if state == BreakerState.HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._current_state() != BreakerState.OPEN:
+                return 0.0
+            return self.reset_timeout_seconds - (self._clock() - self._opened_at)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probes_in_flight = 0
+            self._state = BreakerState.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if (
+                self._state == BreakerState.HALF_OPEN
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = BreakerState.OPEN
+                self._opened_at = self._clock()
+                self._probes_in_flight = 0
+
+    def release(self) -> None:
+        # A half-open probe that ended without a verdict (e.g. rate limited)
+        with self._lock:
+            if self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+
+class ProviderRoute:
+    """
+    One provider behind a ProviderRouter, with its breaker and live stats.
+
+    weight > 0 takes a share of normal traffic; weight 0 is a standby that
+    only receives failover traffic.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        provider: BaseProvider,
+        weight: float = 1.0,
+        breaker: Optional[CircuitBreaker] = None,
+        latency_alpha: float = 0.2,
+    ):
+        self.name = name
+        self.provider = provider
+        self.weight = weight
+        self.breaker = breaker or CircuitBreaker()
+        self.latency_alpha = latency_alpha
+        self.latency_ewma: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+        self.results: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, result: Optional[ProviderResult], latency: float, failed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            key = result.status.value if result else "exception"
+            self.results[key] = self.results.get(key, 0) + 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += self.latency_alpha * (latency - self.latency_ewma)
+
+    def stats(self) -> dict:
+        stats = {
+            "weight": self.weight,
+            "breaker": self.breaker.state.value,
+            "latency_ewma_ms": self.latency_ewma * 1000 if self.latency_ewma is not None else None,
+            "calls": self.calls,
+            "failures": self.failures,
+            "results": dict(self.results),
+        }
+        if hasattr(self.provider, "stats"):
+            stats["rate_limiter"] = self.provider.stats()
+        return stats
+
+
+class ProviderRouter(BaseProvider):
+    """
+    Routes each send across several providers for one channel.
+
+    The first choice is a weighted random pick among healthy routes, with each
+    weight scaled by how fast the route has been recently (EWMA latency), so
+    a degrading provider sheds traffic before its breaker even trips.
+
+    A send fails over to the remaining healthy routes, standbys included, in
+    latency order only when the provider certainly did not take the message:
+    TEMPORARY_FAILURE or its own RATE_LIMITED. A call that raises or outlasts
+    `slow_call_seconds` may still be delivered, so it is answered with
+    TEMPORARY_FAILURE and left to the outbox retry rather than sent twice. A
+    local rate limiter throttle (throttled=True) is returned as-is, since the
+    next route's limiter would let the same sender through again, and so is
+    PERMANENT_FAILURE, which another provider would reject too. Failures,
+    exceptions and slow calls count against a route's breaker; latency is
+    measured around the provider call, not the rate limiter wait.
+
+    No call is waited on for longer than `slow_call_seconds`: send() runs the
+    provider on a worker thread. The call is abandoned rather than cancelled,
+    so providers should also set their HTTP client timeout below it.
+    """
+
+    def __init__(
+        self,
+        routes: list[ProviderRoute],
+        slow_call_seconds: float = 10.0,
+        decision_log_size: int = 100,
+        max_workers: int = 32,
+        clock: Callable[[], float] = time.perf_counter,
+        rng: Optional[random.Random] = None,
+    ):
+        self.routes = routes
+        self.slow_call_seconds = slow_call_seconds
+        self.decisions: deque = deque(maxlen=decision_log_size)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="provider-send")
+
+    @property
+    def max_send_seconds(self) -> float:
+        """
+        Longest a send() can take: every route tried, each for slow_call_seconds
+        (which covers any rate limiter wait inside the route).
+        """
+        return len(self.routes) * self.slow_call_seconds
+
+    def _plan(self) -> list[ProviderRoute]:
+        healthy = [r for r in self.routes if r.breaker.state != BreakerState.OPEN]
+        if not healthy:
+            return []
+
+        observed = [r.latency_ewma for r in healthy if r.latency_ewma]
+        fastest = min(observed) if observed else None
+
+        def score(route: ProviderRoute) -> float:
+            if not route.latency_ewma or fastest is None:
+                return route.weight
+            return route.weight * fastest / route.latency_ewma
+
+        weighted = [r for r in healthy if r.weight > 0]
+        first = None
+        if weighted:
+            first = self._rng.choices(weighted, weights=[score(r) for r in weighted])[0]
+
+        rest = sorted(
+            (r for r in healthy if r is not first),
+            key=lambda r: r.latency_ewma if r.latency_ewma is not None else 0.0,
+        )
+        return ([first] if first else []) + rest
+
+    def _unavailable(self) -> ProviderResult:
+        wait = min((r.breaker.retry_after() for r in self.routes), default=0.0)
+        return ProviderResult(
+            status=ProviderStatus.TEMPORARY_FAILURE,
+            retry_after_seconds=max(1, int(wait) + 1),
+            error_message="all providers unavailable (circuit open)",
+        )
+
+    def _record(self, route: ProviderRoute, result: Optional[ProviderResult], latency: float) -> bool:
+        """
+        Update breaker and stats for one attempt. Returns True to fail over.
+        """
+        failed = (
+            result is None
+            or result.status == ProviderStatus.TEMPORARY_FAILURE
+            or latency > self.slow_call_seconds
+        )
+        route.observe(result, latency, failed)
+        provider_send_duration.observe(
+            latency, route.name, result.status.value if result else "exception"
+        )
+        if failed:
+            route.breaker.record_failure()
+        elif result.status == ProviderStatus.RATE_LIMITED:
+            route.breaker.release()
+        else:
+            route.breaker.record_success()
+        if result is None:
+            return False
+        return result.status == ProviderStatus.TEMPORARY_FAILURE or (
+            result.status == ProviderStatus.RATE_LIMITED and not result.throttled
+        )
+
+    def _log(self, attempts: list[tuple[str, str, float]], result: ProviderResult) -> None:
+        decision = {
+            "at": time.time(),
+            "attempts": [
+                {"provider": name, "status": status, "latency_ms": latency * 1000}
+                for name, status, latency in attempts
+            ],
+            "status": result.status.value,
+        }
+        self.decisions.append(decision)
+        if len(attempts) > 1:
+            logger.info("Provider failover: %s", decision)
+
+    def send(self, payload: dict) -> ProviderResult:
+        attempts: list[tuple[str, str, float]] = []
+        result: Optional[ProviderResult] = None
+        for route in self._plan():
+            if not route.breaker.allow():
+                continue
+            started = self._clock()
+            error = None
+            try:
+                result = self._executor.submit(route.provider.send, payload).result(
+                    timeout=self.slow_call_seconds
+                )
+            except TimeoutError:
+                result, error = None, f"no answer within {self.slow_call_seconds:g}s"
+            except Exception as exc:
+                result, error = None, str(exc) or type(exc).__name__
+            if error:
+                logger.warning("Provider %s: %s", route.name, error)
+            latency = self._clock() - started - (result.waited_seconds if result else 0.0)
+            attempts.append((route.name, result.status.value if result else "exception", latency))
+            fail_over = self._record(route, result, latency)
+            if result is None:
+                result = ProviderResult(
+                    status=ProviderStatus.TEMPORARY_FAILURE,
+                    error_message=f"{route.name}: {error}",
+                )
+            if not fail_over:
+                break
+
+        result = result or self._unavailable()
+        self._log(attempts, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "routes": {r.name: r.stats() for r in self.routes},
+            "recent_decisions": list(self.decisions)[-10:],
+        }
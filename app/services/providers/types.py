@@ -16,3 +16,5 @@ class ProviderResult:
     provider_message_id: Optional[str] = None
     retry_after_seconds: Optional[int] = None  # for 429 cases
     error_message: Optional[str] = None
+    throttled: bool = False  # RATE_LIMITED locally; the provider was never called
+    waited_seconds: float = 0.0  # spent waiting for a local rate limiter token
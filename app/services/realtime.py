@@ -0,0 +1,190 @@
+"""
+Push of newly committed messages to WebSocket and SSE subscribers.
+
+ConversationService queues one event per inserted message with
+publish_on_commit(); nothing is pushed unless the transaction commits. Each
+event goes out on two topics, its thread and its customer address, through
+the process-wide `broker` (app/utils/pubsub.py).
+
+With REALTIME_NOTIFY the events travel through Postgres instead, so that
+every API process sees every other process's writes: they are sent with
+pg_notify inside the committing transaction (Postgres delivers them on
+commit, never on rollback), and each process runs a NotifyListener that
+publishes what arrives to its own broker, its own writes included.
+Notifications sent while a listener is reconnecting are lost; clients catch
+up through the delta sync endpoints.
+"""
+
+import json
+import logging
+import select
+import threading
+from datetime import datetime
+from typing import Callable, Sequence
+
+from sqlalchemy import event, func, select as sql_select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Message
+from app.utils.fast_json import dumps
+from app.utils.metrics import realtime_subscribers
+from app.utils.pubsub import Broker
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "message_events"
+# pg_notify refuses payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+broker = Broker(settings.REALTIME_QUEUE_SIZE, lambda item: dumps(item).decode())
+realtime_subscribers.add_source(lambda: [((), len(broker))])
+
+
+def conversation_topic(conversation_id: int) -> str:
+    return f"conversation:{conversation_id}"
+
+
+def customer_topic(address: str) -> str:
+    return f"customer:{address}"
+
+
+# -----------------------------------------------------------------------------
+# Transaction-aware publishing
+#
+# Same shape as the identity cache (app/utils/cache.py): events wait in
+# session.info and are published after_commit, or dropped with a rollback.
+# -----------------------------------------------------------------------------
+
+_PENDING_KEY = "realtime_pending"
+
+
+def publish_on_commit(db: Session, events: list[tuple[Sequence[str], dict]]) -> None:
+    if events:
+        db.info.setdefault(_PENDING_KEY, []).extend(events)
+
+
+def _notify_payload(topics: Sequence[str], item: dict) -> str:
+    payload = dumps({"topics": list(topics), "event": item})
+    if len(payload) < NOTIFY_PAYLOAD_LIMIT:
+        return payload.decode()
+    # Too long to carry the body; the listeners load it by primary key
+    return dumps({"topics": list(topics), "event": {**item, "body": None}, "load_body": True}).decode()
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_pending(session: Session) -> None:
+    if not settings.REALTIME_NOTIFY:
+        return
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": NOTIFY_CHANNEL, "payloads": [_notify_payload(*p) for p in pending]},
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        broker.publish(pending)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+# -----------------------------------------------------------------------------
+# LISTEN/NOTIFY bridge
+# -----------------------------------------------------------------------------
+
+
+class NotifyListener:
+    """
+    LISTENs on NOTIFY_CHANNEL over a dedicated connection and publishes every
+    notification to the local broker. Reconnects after errors.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        session_factory: Callable[[], Session],
+        poll_seconds: float = 1.0,
+        reconnect_seconds: float = 1.0,
+    ):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self.listening = threading.Event()
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                self._listen(stop)
+            except Exception:
+                logger.exception("LISTEN %s failed; reconnecting", NOTIFY_CHANNEL)
+                stop.wait(self.reconnect_seconds)
+
+    def _listen(self, stop: threading.Event) -> None:
+        # Held for the life of the process, so kept out of the pool
+        connection = self.engine.raw_connection()
+        connection.detach()
+        try:
+            dbapi = connection.dbapi_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            self.listening.set()
+            while not stop.is_set():
+                if not select.select([dbapi], [], [], self.poll_seconds)[0]:
+                    continue
+                dbapi.poll()
+                payloads = []
+                while dbapi.notifies:
+                    payloads.append(dbapi.notifies.pop(0).payload)
+                if payloads:
+                    self.dispatch(payloads)
+        finally:
+            self.listening.clear()
+            connection.close()
+
+    def dispatch(self, payloads: list[str]) -> None:
+        events = []
+        without_body = []
+        for payload in payloads:
+            notification = json.loads(payload)
+            events.append((notification["topics"], notification["event"]))
+            if notification.get("load_body"):
+                without_body.append(notification["event"])
+        if without_body:
+            self._load_bodies(without_body)
+        broker.publish(events)
+
+    def _load_bodies(self, items: list[dict]) -> None:
+        # sent_at lets the planner skip every other partition
+        with self.session_factory() as db:
+            bodies = dict(
+                db.execute(
+                    sql_select(Message.id, func.coalesce(Message.body, "")).where(
+                        Message.id.in_([item["id"] for item in items]),
+                        Message.sent_at.in_([datetime.fromisoformat(item["sent_at"]) for item in items]),
+                    )
+                ).all()
+            )
+        for item in items:
+            item["body"] = bodies.get(item["id"], "")
+
+
+def start_listener(
+    engine: Engine, session_factory: Callable[[], Session], stop: threading.Event
+) -> NotifyListener:
+    listener = NotifyListener(engine, session_factory)
+    threading.Thread(
+        target=listener.run, args=(stop,), name="realtime-listener", daemon=True
+    ).start()
+    return listener
@@ -0,0 +1,14 @@
+from fastapi import HTTPException
+
+from app.config import settings
+
+
+def check_batch_size(payloads: list) -> None:
+    """
+    Reject /batch requests above settings.BATCH_MAX_ITEMS with a 413.
+    """
+    if len(payloads) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items",
+        )
@@ -0,0 +1,25 @@
+import hashlib
+from typing import Any, Optional
+
+
+# Strong ETags for polled GET endpoints. The tag is derived from a version
+# token (see ConversationService.conversation_version, or a page's row
+# versions) plus the request's query string, since limit/cursor change the
+# body for the same version.
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """
+    True if an If-None-Match header value matches `etag`.
+
+    If-None-Match uses weak comparison, so W/"x" matches "x".
+    """
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
@@ -0,0 +1,46 @@
+"""
+JSON bytes for the hot read endpoints, without per-row Pydantic models.
+
+Rows come straight from column-projected queries and are encoded in one
+call: orjson when it is installed (datetimes and str enums natively, in
+Rust), the stdlib encoder otherwise. Both produce what the equivalent
+response_model would: ISO 8601 datetimes and enum values.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Sequence
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def rows_to_json(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """
+    Encode row tuples as a JSON array of objects keyed by `fields`.
+    """
+    return dumps([dict(zip(fields, row)) for row in rows])
+
+
+class JSONBytesResponse(Response):
+    """
+    A response whose body is already-encoded JSON (see rows_to_json).
+    """
+
+    media_type = "application/json"
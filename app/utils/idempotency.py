@@ -1,3 +1,305 @@
-# Helpers for dedupe will come in Commit 4.
-def is_duplicate(provider_type: str, provider_message_id: str):
-    return False
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, UTC
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import IdempotencyKey, Message, MessageDirection
+from app.utils.cache import LRUCache
+
+
+class WebhookDedupeFilter:
+    """
+    In-process fast path for webhook idempotency on
+    (provider_type, provider_message_id).
+
+    A bounded LRU set of recent keys, only ever fed keys already committed to
+    `messages`: a hit is a known duplicate and can be acknowledged without
+    touching the database. Anything else goes through the dedupe-key claim,
+    which remains the source of truth, so a stale or cold set only costs a DB
+    round trip, never a lost or duplicated message. (A miss cannot prove a key
+    new: another process, or this one before a restart, may have stored it.)
+    """
+
+    def __init__(self, recent_size: int = settings.WEBHOOK_DEDUPE_RECENT_SIZE):
+        self.recent_size = recent_size
+        self._recent: OrderedDict[Hashable, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.clear()
+
+    @staticmethod
+    def key(provider_type: Optional[str], provider_message_id: Optional[str]) -> Optional[str]:
+        if not provider_type or not provider_message_id:
+            return None
+        return f"{provider_type}:{provider_message_id}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self.lookups = 0
+            self.known_duplicates = 0
+
+    # -------------------------------------------------------------------------
+    # Lookup
+    # -------------------------------------------------------------------------
+
+    def is_known_duplicate(self, key: Optional[str]) -> bool:
+        """
+        True only if `key` is certainly already stored.
+        """
+        if key is None:
+            return False
+        with self._lock:
+            self.lookups += 1
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                self.known_duplicates += 1
+                return True
+            return False
+
+    # -------------------------------------------------------------------------
+    # Population
+    # -------------------------------------------------------------------------
+
+    def add(self, keys: Iterable[Optional[str]]) -> None:
+        """
+        Remember keys that are committed to the database.
+        """
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                if self.recent_size > 0:
+                    self._recent[key] = None
+                    self._recent.move_to_end(key)
+                    while len(self._recent) > self.recent_size:
+                        self._recent.popitem(last=False)
+
+    def warm(self, db: Session, limit: int = settings.WEBHOOK_DEDUPE_WARM_ROWS) -> int:
+        """
+        Load the keys of the most recent inbound messages. Returns how many.
+        """
+        if limit <= 0:
+            return 0
+        rows = db.execute(
+            select(Message.provider_type, Message.provider_message_id)
+            .where(
+                Message.direction == MessageDirection.INBOUND,
+                Message.provider_message_id.is_not(None),
+            )
+            .order_by(Message.id.desc())
+            .limit(limit)
+        ).all()
+        # Oldest first so the newest keys end up most recent in the LRU set
+        self.add(self.key(r.provider_type, r.provider_message_id) for r in reversed(rows))
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "recent_size": len(self._recent),
+            "recent_max_size": self.recent_size,
+            "lookups": self.lookups,
+            "known_duplicates": self.known_duplicates,
+            "hit_rate": self.known_duplicates / self.lookups if self.lookups else 0.0,
+        }
+
+
+# Shared by all webhook routes in this process
+webhook_dedupe = WebhookDedupeFilter()
+
+
+def is_duplicate(provider_type: str, provider_message_id: str) -> bool:
+    """
+    True if this callback is certainly a replay of one already stored.
+    """
+    return webhook_dedupe.is_known_duplicate(
+        WebhookDedupeFilter.key(provider_type, provider_message_id)
+    )
+
+
+# -----------------------------------------------------------------------------
+# Idempotency-Key for the send routes
+# -----------------------------------------------------------------------------
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def request_fingerprint(body: Any) -> str:
+    """
+    Stable hash of a JSON-serializable request body.
+    """
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Stores the response of each (scope, Idempotency-Key) so client retries
+    replay it instead of creating (and sending) the messages again.
+
+    Three layers, cheapest first:
+
+    - a bounded in-memory LRU of completed responses;
+    - in-process coalescing: concurrent requests with the same key wait on
+      the first one's future instead of doing the work themselves;
+    - the idempotency_keys table, claimed with INSERT ... ON CONFLICT in the
+      same transaction as the work. A concurrent request in another process
+      blocks on the uncommitted row and then reads the committed response;
+      if the first transaction rolls back, the waiter claims the key itself.
+
+    Rows expire after `ttl_seconds`; an expired key is reclaimed on reuse and
+    purge_expired() deletes the rest. Reusing a key with a different body is
+    rejected with 422.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+        cache: Optional[LRUCache] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache or LRUCache(settings.IDEMPOTENCY_CACHE_SIZE, ttl_seconds)
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.replays = 0
+        self.coalesced = 0
+
+    async def run(
+        self,
+        db: AsyncSession,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        work: Callable[[], Awaitable[Any]],
+    ) -> tuple[Any, bool]:
+        """
+        Return (response, replayed) for this key, calling `work` at most once.
+
+        `work` must leave its changes uncommitted and return a JSON-serializable
+        response; it is committed together with the stored key.
+        """
+        cache_key = (scope, key)
+        while True:
+            stored = self.cache.get(cache_key)
+            if stored is not None:
+                self.replays += 1
+                return self._check(stored, fingerprint), True
+
+            pending = self._inflight.get(cache_key)
+            if pending is None:
+                break
+            self.coalesced += 1
+            stored = await asyncio.shield(pending)
+            if stored is not None:
+                self.replays += 1
+                return self._check(stored, fingerprint), True
+            # The first request failed; retry from the top
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        stored = None
+        try:
+            stored, replayed = await self._execute(db, scope, key, fingerprint, work)
+            self.cache.put(cache_key, stored)
+        finally:
+            self._inflight.pop(cache_key, None)
+            future.set_result(stored)
+
+        if replayed:
+            self.replays += 1
+        return self._check(stored, fingerprint), replayed
+
+    async def _execute(self, db, scope, key, fingerprint, work) -> tuple[dict, bool]:
+        existing = await db.run_sync(self._claim, scope, key, fingerprint)
+        if existing is not None:
+            await db.rollback()
+            return existing, True
+
+        response = await work()
+        await db.run_sync(self._complete, scope, key, response)
+        await db.commit()
+        return {"fingerprint": fingerprint, "response": response}, False
+
+    def _claim(self, db: Session, scope: str, key: str, fingerprint: str) -> Optional[dict]:
+        """
+        Claim the key for this transaction, or return the stored response.
+        """
+        now = _utcnow()
+        stmt = pg_insert(IdempotencyKey).values(
+            scope=scope,
+            key=key,
+            fingerprint=fingerprint,
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl_seconds),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "response": None,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            # Only take over keys whose stored response has expired
+            where=IdempotencyKey.expires_at <= now,
+        )
+        if db.execute(stmt.returning(IdempotencyKey.id)).first() is not None:
+            return None
+
+        row = db.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.response).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key
+            )
+        ).one()
+        return {"fingerprint": row.fingerprint, "response": row.response}
+
+    def _complete(self, db: Session, scope: str, key: str, response: Any) -> None:
+        db.execute(
+            IdempotencyKey.__table__.update()
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .values(response=response)
+        )
+
+    @staticmethod
+    def _check(stored: dict, fingerprint: str) -> Any:
+        if stored["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{IDEMPOTENCY_KEY_HEADER} was already used with a different request body",
+            )
+        return stored["response"]
+
+    def purge_expired(self, db: Session) -> int:
+        """
+        Delete expired keys and commit. Returns how many were removed.
+        """
+        deleted = db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _utcnow())
+        ).rowcount
+        db.commit()
+        return deleted
+
+    def stats(self) -> dict:
+        return {
+            "replays": self.replays,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "cache": self.cache.stats(),
+        }
+
+
+# Shared by the send routes in this process
+send_idempotency = IdempotencyStore()
@@ -0,0 +1,394 @@
+"""
+Prometheus text-format metrics for GET /metrics.
+
+Counters and histograms accumulate into per-thread shards (a plain dict owned
+by the writing thread), so the hot path is a dict lookup and an add with no
+lock; shards are summed when /metrics is scraped. Gauges are read from a
+callback at scrape time. There is no client library dependency.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> list[str]:
+        raise NotImplementedError
+
+
+class _ShardedMetric(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            # First write from this thread; the only time a lock is taken
+            values: dict = {}
+            with self._shards_lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def _snapshots(self) -> list[list]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # items() is copied in one step under the GIL, so a writer adding a
+        # label set concurrently cannot break the iteration
+        return [list(shard.items()) for shard in shards]
+
+    def clear(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        totals: dict[tuple, float] = {}
+        for items in self._snapshots():
+            for labelvalues, value in items:
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return totals
+
+    def collect(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, lv)} {_number(value)}"
+            for lv, value in sorted(self.values().items())
+        ]
+
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        shard = self._shard()
+        # One slot per bucket, one for +Inf, then the running sum
+        counts = shard.get(labelvalues)
+        if counts is None:
+            counts = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def values(self) -> dict[tuple, list]:
+        totals: dict[tuple, list] = {}
+        for items in self._snapshots():
+            for labelvalues, counts in items:
+                total = totals.get(labelvalues)
+                if total is None:
+                    totals[labelvalues] = list(counts)
+                else:
+                    for i, c in enumerate(counts):
+                        total[i] += c
+        return totals
+
+    def collect(self) -> list[str]:
+        lines = []
+        for lv, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _labels(self.labelnames, lv, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, lv)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, lv)} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """
+    Gauge whose samples come from `fn() -> [(labelvalues, value), ...]` at scrape time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._sources: list[Callable[[], Iterable[tuple[tuple, float]]]] = []
+
+    def add_source(self, fn: Callable[[], Iterable[tuple[tuple, float]]]) -> None:
+        self._sources.append(fn)
+
+    def collect(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, lv)} {_number(value)}"
+            for fn in self._sources
+            for lv, value in fn()
+        ]
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------------------------------------------------------
+# Metric definitions
+# -----------------------------------------------------------------------------
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ("method", "route"),
+)
+http_requests = Counter(
+    "http_requests_total",
+    "Responses by route template and status code",
+    ("method", "route", "status"),
+)
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed while serving one request",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent executing SQL while serving one request",
+    ("route",),
+)
+db_pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ("engine",),
+)
+db_pool_timeouts = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Connection checkouts that gave up after pool_timeout",
+    ("engine",),
+)
+db_pool_checked_out = CallbackGauge(
+    "db_pool_checked_out_connections", "Connections currently checked out", ("engine",)
+)
+db_pool_overflow = CallbackGauge(
+    "db_pool_overflow_connections", "Overflow connections in use beyond pool_size", ("engine",)
+)
+db_pool_size = CallbackGauge("db_pool_size", "Configured pool_size", ("engine",))
+db_replica_available = CallbackGauge(
+    "db_replica_available", "1 while a read replica is in rotation, 0 while ejected", ("replica",)
+)
+provider_send_duration = Histogram(
+    "provider_send_duration_seconds",
+    "Provider send latency by route and result",
+    ("provider", "status"),
+)
+webhook_duplicates = Counter(
+    "webhook_duplicates_total",
+    "Inbound webhook replays by channel and where they were caught",
+    ("channel", "caught_by"),
+)
+realtime_subscribers = CallbackGauge(
+    "realtime_subscribers", "Open push subscriptions (WebSocket and SSE)"
+)
+realtime_events_queued = Counter(
+    "realtime_events_queued_total", "Push events queued for a subscriber"
+)
+realtime_slow_consumers = Counter(
+    "realtime_slow_consumers_total", "Push subscribers dropped because their queue was full"
+)
+
+
+# -----------------------------------------------------------------------------
+# Database instrumentation
+# -----------------------------------------------------------------------------
+
+# [statements, seconds] for the request being served; set by MetricsMiddleware
+# and visible to threadpool and run_sync calls, which run in a copy of the
+# request's context
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+
+def timed_pool_class(pool_class: type, label: str) -> type:
+    """
+    Subclass a SQLAlchemy pool class to record how long checkouts wait.
+    """
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                db_pool_timeouts.inc(label)
+                raise
+            finally:
+                db_pool_wait.observe(time.perf_counter() - started, label)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+# Called with (statement, seconds) after every statement on an instrumented
+# engine, so other consumers (the SQL profiler) share this one timing hook
+_statement_observers: list[Callable[[str, float], None]] = []
+
+
+def add_statement_observer(observer: Callable[[str, float], None]) -> None:
+    _statement_observers.append(observer)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._metrics_started
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+    for observer in _statement_observers:
+        observer(statement, seconds)
+
+
+def instrument_engine(engine, label: str) -> None:
+    """
+    Time every statement (per-request totals, statement observers) and
+    expose the engine's pool as gauges.
+
+    `engine` is a sync Engine (pass async_engine.sync_engine for async mode).
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        db_pool_checked_out.add_source(lambda: [((label,), pool.checkedout())])
+        db_pool_overflow.add_source(lambda: [((label,), max(0, pool.overflow()))])
+        db_pool_size.add_source(lambda: [((label,), pool.size())])
+
+
+# -----------------------------------------------------------------------------
+# ASGI middleware
+# -----------------------------------------------------------------------------
+
+
+def _route_template(scope) -> str:
+    """
+    Full path template of the matched route, e.g. /api/conversations/{conversation_id}/messages.
+
+    scope["route"] may be relative to an included router's prefix, so the
+    prefix is recovered from the request path it was matched against.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError):
+        return template
+    if rendered and path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and DB usage per route template.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses are not
+    buffered and the overhead is a couple of perf_counter calls per request.
+    Unmatched paths share one "unmatched" label to keep cardinality bounded.
+    Event streams (text/event-stream) are counted but left out of the latency
+    histogram: they stay open for as long as the client listens.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            path = _route_template(scope)
+            method = scope["method"]
+            if not streaming:
+                http_request_duration.observe(elapsed, method, path)
+            http_requests.inc(method, path, str(status))
+            db_queries_per_request.observe(stats[0], path)
+            db_time_per_request.observe(stats[1], path)
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence
+
+
+# Keyset cursors are opaque to clients: a url-safe base64 of the JSON-encoded
+# sort key of the last row served, e.g. (updated_at, id).
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a (timestamp, id) cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        timestamp, row_id = _decode(cursor)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def decode_watermark(watermark: str) -> tuple[int, int]:
+    """
+    Decode a (change_xid, id) sync watermark. Raises ValueError if it is malformed.
+    """
+    try:
+        change_xid, row_id = _decode(watermark)
+        return int(change_xid), int(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid watermark") from exc
+
+
+def split_page(
+    rows: list,
+    limit: Optional[int],
+    key: Callable[[Any], Sequence[Any]],
+) -> tuple[list, Optional[str]]:
+    """
+    Given up to limit + 1 rows, return the page and the cursor for the next one.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
@@ -0,0 +1,134 @@
+"""
+In-process publish/subscribe for push endpoints (WebSocket and SSE).
+
+Subscribers live on an event loop and each owns a bounded asyncio.Queue.
+Publishers may be on any thread (request threadpool, run_sync, outbox
+workers, the LISTEN/NOTIFY bridge): publish() finds the subscribers of each
+event's topics under a lock, encodes the event once if anyone is listening,
+and hands each loop its whole batch with a single call_soon_threadsafe.
+
+A subscriber whose queue is full is dropped rather than allowed to slow the
+publisher or grow without bound: its next get() raises SlowConsumer, and the
+client reconnects and catches up through the delta sync endpoints.
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Iterable, Sequence
+
+from app.utils.metrics import realtime_events_queued, realtime_slow_consumers
+
+
+class SlowConsumer(Exception):
+    """
+    The subscriber fell behind and was dropped; it will receive nothing more.
+    """
+
+
+class Subscription:
+    """
+    One subscriber: its topics, its loop and a bounded queue of encoded events.
+    """
+
+    def __init__(self, topics: Sequence[str], maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.topics = tuple(topics)
+        self.loop = loop
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _offer(self, payload: str) -> bool:
+        # Runs on self.loop
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+        return True
+
+    async def get(self) -> str:
+        """
+        Next encoded event. Raises SlowConsumer once the subscriber is dropped.
+        """
+        if self.overflowed:
+            raise SlowConsumer
+        return await self.queue.get()
+
+
+class Broker:
+    """
+    Topic fan-out to Subscriptions, safe to publish to from any thread.
+    """
+
+    def __init__(self, queue_size: int, encode: Callable[[Any], str]):
+        self.queue_size = queue_size
+        self.encode = encode
+        self._lock = threading.Lock()
+        self._topics: dict[str, set[Subscription]] = {}
+        self._subscriptions: set[Subscription] = set()
+
+    def subscribe(self, topics: Sequence[str]) -> Subscription:
+        """
+        Register a subscription on the running event loop.
+        """
+        subscription = Subscription(topics, self.queue_size, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, events: Iterable[tuple[Sequence[str], Any]]) -> None:
+        """
+        Deliver (topics, event) pairs. A subscriber on several of an event's
+        topics gets it once; events nobody subscribed to are not encoded.
+        """
+        if not self._topics:
+            return
+        matched = []
+        with self._lock:
+            for topics, event in events:
+                subscribers = set()
+                for topic in topics:
+                    subscribers.update(self._topics.get(topic, ()))
+                if subscribers:
+                    matched.append((subscribers, event))
+
+        batches: dict[asyncio.AbstractEventLoop, list[tuple[Subscription, str]]] = {}
+        for subscribers, event in matched:
+            payload = self.encode(event)
+            for subscription in subscribers:
+                batches.setdefault(subscription.loop, []).append((subscription, payload))
+
+        for loop, batch in batches.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, batch)
+            except RuntimeError:
+                # The loop has closed; its subscribers went with it
+                for subscription, _ in batch:
+                    self.unsubscribe(subscription)
+
+    def _deliver(self, batch: list[tuple[Subscription, str]]) -> None:
+        delivered = 0
+        for subscription, payload in batch:
+            if subscription._offer(payload):
+                delivered += 1
+            elif subscription in self._subscriptions:
+                self.unsubscribe(subscription)
+                realtime_slow_consumers.inc()
+        if delivered:
+            realtime_events_queued.inc(amount=delivered)
@@ -0,0 +1,140 @@
+"""
+Read replicas for the conversation read endpoints (DATABASE_REPLICA_URLS).
+
+A ReplicaSet holds one Replica per URL and hands out candidates in
+preference order: round-robin, or fewest checked-out connections first
+(least_loaded). Each replica sits behind a one-strike CircuitBreaker: a
+failed connect or a dropped connection ejects it for REPLICA_EJECT_SECONDS,
+after which a single request probes it again. Readers fall back to the
+primary when no replica is available.
+
+Read-your-writes: a client's own write sets a short-lived cookie
+(READ_YOUR_WRITES_SECONDS) and its reads go to the primary until it expires.
+A request can also ask for the primary explicitly with X-Read-Consistency:
+primary.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from sqlalchemy import event
+
+from app.services.providers.routing import BreakerState, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+
+
+class Replica:
+    """
+    One replica server: its sync sessionmaker, async sessionmaker (DB_ASYNC=1
+    only) and the breaker shared by both.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session_factory: Callable[[], Any],
+        async_session_factory: Optional[Callable[[], Any]] = None,
+        eject_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.breaker = CircuitBreaker(
+            failure_threshold=1, reset_timeout_seconds=eject_seconds, clock=clock
+        )
+        self.engines: list = []
+
+    def watch(self, engine) -> None:
+        """
+        Eject the replica when `engine` (a sync Engine, or async_engine.sync_engine)
+        loses a connection mid-request.
+        """
+        self.engines.append(engine)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect:
+            self.eject()
+
+    def load(self) -> int:
+        return sum(engine.pool.checkedout() for engine in self.engines)
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state != BreakerState.OPEN
+
+    def eject(self) -> None:
+        if self.available:
+            logger.warning("Ejecting read replica %s", self.name)
+        self.breaker.record_failure()
+
+    def restore(self) -> None:
+        if self.breaker.state != BreakerState.CLOSED:
+            logger.info("Read replica %s is back", self.name)
+        self.breaker.record_success()
+
+
+class ReplicaSet:
+    def __init__(self, replicas: list[Replica], strategy: str = ROUND_ROBIN):
+        if strategy not in (ROUND_ROBIN, LEAST_LOADED):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.replicas = replicas
+        self.strategy = strategy
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def candidates(self) -> Iterator[Replica]:
+        """
+        Replicas to try for one read, best first; stop iterating once one
+        works. Ejected replicas are skipped, and one whose ejection has run
+        out is offered to a single request as a probe.
+        """
+        if not self.replicas:
+            return
+        if self.strategy == LEAST_LOADED:
+            ordered = sorted(self.replicas, key=lambda replica: replica.load())
+        else:
+            with self._lock:
+                start = next(self._turn) % len(self.replicas)
+            ordered = self.replicas[start:] + self.replicas[:start]
+        for replica in ordered:
+            # Checked lazily so only the replica actually tried takes the probe
+            if replica.breaker.allow():
+                yield replica
+
+    def status(self) -> list[dict]:
+        return [
+            {"name": r.name, "state": r.breaker.state.value, "checked_out": r.load()}
+            for r in self.replicas
+        ]
+
+
+def wants_primary(
+    cookies: dict[str, str],
+    headers,
+    now: Callable[[], float] = time.time,
+) -> bool:
+    """
+    True if this request has to read from the primary (recent own write, or
+    asked for it).
+    """
+    if headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary":
+        return True
+    try:
+        return float(cookies.get(READ_PRIMARY_COOKIE, 0)) > now()
+    except ValueError:
+        return False
@@ -0,0 +1,216 @@
+"""
+Per-request SQL profiling (opt-in with SQL_PROFILER_ENABLED=1).
+
+Every statement a request issues is recorded, with its timing (taken by the
+engine hook in app/utils/metrics.py) and normalized text (literals and bind
+parameters replaced by ?, multi-row VALUES and IN lists collapsed). A
+statement repeated at least SQL_PROFILER_REPEAT_THRESHOLD times within one
+request is flagged as an N+1 candidate. Results go into X-SQL-* response headers and the recent-request
+ring buffer behind GET /debug/sql.
+
+capture_queries() and assert_query_budget() record every statement in the
+process instead, for tests and scripts that drive the app directly.
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.utils.metrics import add_statement_observer
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))*")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Reduce a statement to its shape, so repeats with other values compare equal.
+    """
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _LIST.sub("(...)", sql)
+
+
+class QueryProfile:
+    """
+    Statements issued while the profile was active, in order.
+    """
+
+    def __init__(self, repeat_threshold: int = settings.SQL_PROFILER_REPEAT_THRESHOLD):
+        self.repeat_threshold = repeat_threshold
+        self.statements: list[tuple[str, float]] = []
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.statements.append((normalize_sql(statement), seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def grouped(self) -> dict[str, dict]:
+        groups: dict[str, dict] = {}
+        for sql, seconds in self.statements:
+            group = groups.setdefault(sql, {"calls": 0, "seconds": 0.0})
+            group["calls"] += 1
+            group["seconds"] += seconds
+        return groups
+
+    def repeated(self) -> dict[str, int]:
+        """
+        N+1 candidates: normalized statement -> times issued.
+        """
+        return {
+            sql: group["calls"]
+            for sql, group in self.grouped().items()
+            if group["calls"] >= self.repeat_threshold
+        }
+
+    def summary(self) -> dict:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.total_seconds * 1000, 3),
+            "statements": [
+                {"sql": sql, "calls": group["calls"], "ms": round(group["seconds"] * 1000, 3)}
+                for sql, group in self.grouped().items()
+            ],
+            "n_plus_one": self.repeated(),
+        }
+
+    def describe(self) -> str:
+        return "\n".join(f"  {i + 1}. {sql}" for i, (sql, _) in enumerate(self.statements))
+
+
+# Profile for the request being served (SqlProfilerMiddleware), plus any
+# process-wide captures opened by capture_queries()
+_request_profile: ContextVar[Optional[QueryProfile]] = ContextVar("request_profile", default=None)
+_captures: list[QueryProfile] = []
+_captures_lock = threading.Lock()
+
+
+def _record_statement(statement: str, seconds: float) -> None:
+    profile = _request_profile.get()
+    if profile is not None:
+        profile.record(statement, seconds)
+    for capture in list(_captures):
+        capture.record(statement, seconds)
+
+
+# Timed by the engine hook in app/utils/metrics.py, shared with the metrics
+add_statement_observer(_record_statement)
+
+
+@contextmanager
+def capture_queries(
+    repeat_threshold: int = settings.SQL_PROFILER_REPEAT_THRESHOLD,
+) -> Iterator[QueryProfile]:
+    """
+    Record every statement executed in this process while the block runs.
+    """
+    profile = QueryProfile(repeat_threshold)
+    with _captures_lock:
+        _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        with _captures_lock:
+            _captures.remove(profile)
+
+
+@contextmanager
+def assert_query_budget(
+    max_queries: int,
+    allow_repeats: bool = False,
+    repeat_threshold: int = settings.SQL_PROFILER_REPEAT_THRESHOLD,
+) -> Iterator[QueryProfile]:
+    """
+    Fail if the block issues more than `max_queries` statements, or (unless
+    allow_repeats) any N+1 candidate.
+    """
+    with capture_queries(repeat_threshold) as profile:
+        yield profile
+    if profile.count > max_queries:
+        raise AssertionError(
+            f"Query budget exceeded: {profile.count} statements > {max_queries}\n{profile.describe()}"
+        )
+    if not allow_repeats and profile.repeated():
+        raise AssertionError(f"N+1 candidates: {profile.repeated()}\n{profile.describe()}")
+
+
+# -----------------------------------------------------------------------------
+# Middleware and debug history
+# -----------------------------------------------------------------------------
+
+profile_history: deque = deque(maxlen=settings.SQL_PROFILER_HISTORY)
+
+
+def recent_profiles(limit: int = 20) -> list[dict]:
+    """
+    Most recent request profiles, newest first.
+    """
+    return list(profile_history)[::-1][:limit]
+
+
+class SqlProfilerMiddleware:
+    """
+    Profiles each HTTP request and reports it in response headers:
+
+        X-SQL-Queries: 4
+        X-SQL-Time-Ms: 1.82
+        X-SQL-Repeated: 0       (distinct statements flagged as N+1 candidates)
+
+    Statements issued after the response has started (streamed bodies) are
+    kept in the /debug/sql history but miss the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _request_profile.set(profile)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-sql-queries", str(profile.count).encode()),
+                    (b"x-sql-time-ms", f"{profile.total_seconds * 1000:.2f}".encode()),
+                    (b"x-sql-repeated", str(len(profile.repeated())).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _request_profile.reset(token)
+            summary = profile.summary()
+            if summary["n_plus_one"]:
+                logger.warning(
+                    "Possible N+1 in %s %s: %s", scope["method"], scope["path"], summary["n_plus_one"]
+                )
+            profile_history.append(
+                {"method": scope["method"], "path": scope["path"], "status": status, **summary}
+            )
+
@@ -0,0 +1,119 @@
+"""
+Sync vs async request-path benchmark.
+
+Starts the app under uvicorn once per mode (DB_ASYNC=0, then DB_ASYNC=1),
+drives it with a fixed number of concurrent clients for a fixed duration and
+reports sustained req/s plus p50/p95/p99 latency per mode.
+
+The default mix is webhook-heavy (the burst case that exhausts the threadpool
+and pool) with some outbound sends and thread reads.
+
+Usage:
+    python -m bench.async_vs_sync --concurrency 64 --duration 20
+    python -m bench.async_vs_sync --modes async --json results.json
+
+Requires a reachable DATABASE_URL (see README) and httpx.
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import uuid
+
+import httpx
+
+from bench.common import print_table, summarize, uvicorn_server, write_results
+
+
+MODES = {"sync": "0", "async": "1"}
+
+
+def _request_mix(seq: itertools.count):
+    """
+    Yields (method, path, json) tuples: 70% webhooks, 20% sends, 10% reads.
+    """
+    for i in seq:
+        contact = f"+1804{i % 5000:07d}"
+        slot = i % 10
+        if slot < 7:
+            yield "POST", "/api/webhooks/sms", {
+                "from": contact,
+                "to": "+12016661234",
+                "type": "sms",
+                "messaging_provider_id": f"bench-{uuid.uuid4()}",
+                "body": "inbound benchmark message",
+                "attachments": None,
+                "timestamp": "2024-11-01T14:00:00Z",
+            }
+        elif slot < 9:
+            yield "POST", "/api/messages/sms", {
+                "from": "+12016661234",
+                "to": contact,
+                "type": "sms",
+                "body": "outbound benchmark message",
+                "attachments": None,
+                "timestamp": "2024-11-01T14:00:00Z",
+            }
+        else:
+            yield "GET", "/api/conversations/", None
+
+
+async def _drive(base_url: str, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    mix = _request_mix(itertools.count())
+    deadline = time.perf_counter() + duration
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                method, path, body = next(mix)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors)
+
+
+def run_mode(mode: str, port: int, concurrency: int, duration: float, warmup: float) -> dict:
+    with uvicorn_server(port, {"DB_ASYNC": MODES[mode]}) as base_url:
+        if warmup:
+            asyncio.run(_drive(base_url, concurrency, warmup))
+        return asyncio.run(_drive(base_url, concurrency, duration))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["sync", "async"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15, help="seconds per mode")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds per mode")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = run_mode(mode, args.port, args.concurrency, args.duration, args.warmup)
+
+    print_table(results, "mode")
+
+    if args.json_path:
+        write_results(args.json_path, "async_vs_sync", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files (bench.load, bench.micro, bench.async_vs_sync).
+
+Prints req/s and p50/p99 for every series present in both, with the relative
+change, and exits non-zero if any p99 regressed by more than --threshold.
+
+    python -m bench.compare baseline.json current.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+
+
+def _load(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _change(old: float, new: float) -> float:
+    return (new - old) / old if old else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="max tolerated relative p99 increase"
+    )
+    args = parser.parse_args()
+
+    baseline, current = _load(args.baseline), _load(args.current)
+    print(f"{baseline.get('revision')} -> {current.get('revision')} ({current['benchmark']})")
+    print(f"{'series':<24} {'req/s':>18} {'p50 ms':>18} {'p99 ms':>18}")
+
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        cells = []
+        for metric in ("req_per_s", "p50_ms", "p99_ms"):
+            cells.append(f"{new[metric]:>9.1f} ({_change(old[metric], new[metric]):+6.1%})")
+        print(f"{name:<24} " + " ".join(cells))
+        if _change(old["p99_ms"], new["p99_ms"]) > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"p99 regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Push fan-out: publish-to-delivery latency through the in-process broker.
+
+A publisher thread (standing in for request threads committing messages)
+publishes --events events to one topic, in batches of --batch; --subscribers
+subscribers on an event loop are split between that topic and others. Every
+delivery is timed from publish() to the subscriber's get(). No database.
+
+Usage:
+    python -m bench.fanout --subscribers 1000 --events 2000
+    python -m bench.fanout --json fanout.json
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+from app.utils.fast_json import dumps
+from app.utils.pubsub import Broker
+from bench.common import print_table, summarize, write_results
+
+
+async def _run(subscribers: int, events: int, batch: int) -> dict:
+    broker = Broker(queue_size=events, encode=lambda item: dumps(item).decode())
+    # Every other subscriber listens to the hot topic
+    subscriptions = [
+        broker.subscribe(["hot" if i % 2 == 0 else f"cold:{i}"]) for i in range(subscribers)
+    ]
+    listening = subscriptions[::2]
+    latencies: list[float] = []
+
+    # Publish time per event; each subscriber sees events in publish order
+    sent_at = [0.0] * events
+
+    async def consume(subscription) -> None:
+        for seq in range(events):
+            await subscription.get()
+            latencies.append(time.perf_counter() - sent_at[seq])
+
+    def publish() -> None:
+        for start in range(0, events, batch):
+            now = time.perf_counter()
+            sent_at[start:start + batch] = [now] * batch
+            broker.publish([(("hot",), {"seq": n, "body": "x" * 80}) for n in range(start, start + batch)])
+            time.sleep(0.001)
+
+    consumers = [asyncio.create_task(consume(s)) for s in listening]
+    started = time.perf_counter()
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+    publisher.join()
+    return summarize(latencies, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=10, help="events per publish() call")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {
+        f"{n} subscribers": asyncio.run(_run(n, args.events, args.batch)) for n in args.subscribers
+    }
+    # "req/s" here is deliveries per second
+    print_table(results, "fan-out")
+
+    if args.json_path:
+        write_results(args.json_path, "fanout", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Per-route load test for the HTTP API.
+
+Runs the app in-process (httpx over ASGI, no sockets) or under uvicorn,
+optionally seeds a message history first (see bench.seed), then drives a
+weighted mix of requests from concurrent clients for a fixed duration and
+reports req/s and p50/p95/p99 per request kind.
+
+Request kinds for --mix (name=weight, comma separated):
+    send      POST /api/messages/sms
+    webhook   POST /api/webhooks/sms with a new provider id
+    replay    POST /api/webhooks/sms re-delivering an earlier provider id
+    list      GET  /api/conversations/
+    thread    GET  /api/conversations/{id}/messages
+    poll      GET  /api/conversations/{id}/messages with If-None-Match
+
+Usage:
+    python -m bench.load --seed-messages 100000 --duration 30 --json load.json
+    python -m bench.load --server uvicorn --mix webhook=6,replay=2,thread=2
+
+Requires a reachable DATABASE_URL (see README). Compare two result files
+with `python -m bench.compare old.json new.json`.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+import httpx
+from sqlalchemy import select
+
+from bench.common import print_table, summarize, uvicorn_server, write_results
+from bench.seed import contact_address, customer_address, seed
+
+DEFAULT_MIX = "send=2,webhook=4,replay=1,list=1,thread=1,poll=1"
+CUSTOMER = customer_address(0)
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in KINDS:
+            raise SystemExit(f"Unknown request kind {name!r}; choose from {sorted(KINDS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    """
+    Builds requests for each kind from shared state (known conversations,
+    delivered provider ids, ETags seen).
+    """
+
+    def __init__(self, conversation_ids: list[int], contacts: int, rng: random.Random):
+        self.conversation_ids = conversation_ids or [0]
+        self.contacts = contacts
+        self.rng = rng
+        self.delivered: deque[str] = deque(maxlen=10_000)
+        self.etags: dict[int, str] = {}
+
+    def _contact(self) -> str:
+        return contact_address(self.rng.randrange(self.contacts))
+
+    def _sms_webhook(self, provider_id: str) -> dict:
+        return {
+            "from": self._contact(),
+            "to": CUSTOMER,
+            "type": "sms",
+            "messaging_provider_id": provider_id,
+            "body": "benchmark inbound",
+            "attachments": None,
+            "timestamp": "2024-11-01T14:00:00Z",
+        }
+
+    def send(self) -> tuple:
+        return "POST", "/api/messages/sms", {
+            "from": CUSTOMER,
+            "to": self._contact(),
+            "type": "sms",
+            "body": "benchmark outbound",
+            "attachments": None,
+            "timestamp": "2024-11-01T14:00:00Z",
+        }, None
+
+    def webhook(self) -> tuple:
+        provider_id = f"bench-{uuid.uuid4()}"
+        self.delivered.append(provider_id)
+        return "POST", "/api/webhooks/sms", self._sms_webhook(provider_id), None
+
+    def replay(self) -> tuple:
+        if not self.delivered:
+            return self.webhook()
+        provider_id = self.rng.choice(self.delivered)
+        return "POST", "/api/webhooks/sms", self._sms_webhook(provider_id), None
+
+    def list(self) -> tuple:
+        return "GET", "/api/conversations/", None, None
+
+    def thread(self) -> tuple:
+        conversation_id = self.rng.choice(self.conversation_ids)
+        return "GET", f"/api/conversations/{conversation_id}/messages", None, None
+
+    def poll(self) -> tuple:
+        conversation_id = self.rng.choice(self.conversation_ids)
+        etag = self.etags.get(conversation_id)
+        headers = {"If-None-Match": etag} if etag else None
+        return "GET", f"/api/conversations/{conversation_id}/messages", None, headers
+
+
+KINDS = {"send", "webhook", "replay", "list", "thread", "poll"}
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+) -> dict:
+    kinds, weights = list(mix), list(mix.values())
+    latencies: dict[str, list[float]] = {kind: [] for kind in kinds}
+    errors: dict[str, int] = {kind: 0 for kind in kinds}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            kind = workload.rng.choices(kinds, weights)[0]
+            method, path, body, headers = getattr(workload, kind)()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                if response.status_code >= 400:
+                    errors[kind] += 1
+                elif kind == "poll" and "etag" in response.headers:
+                    workload.etags[int(path.split("/")[3])] = response.headers["etag"]
+            except httpx.HTTPError:
+                errors[kind] += 1
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {kind: summarize(latencies[kind], elapsed, errors[kind]) for kind in kinds}
+    everything = [latency for samples in latencies.values() for latency in samples]
+    results["total"] = summarize(everything, elapsed, sum(errors.values()))
+    return results
+
+
+def _conversation_ids(limit: int = 1000) -> list[int]:
+    from app.db import SessionLocal
+    from app.models import Conversation
+
+    with SessionLocal() as db:
+        return list(
+            db.execute(
+                select(Conversation.id).order_by(Conversation.updated_at.desc()).limit(limit)
+            ).scalars()
+        )
+
+
+async def run(
+    base_url: Optional[str],
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    contacts: int,
+    rng_seed: int,
+) -> dict:
+    workload = Workload(_conversation_ids(), contacts, random.Random(rng_seed))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if base_url is None:
+        from app.main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60
+        )
+    else:
+        client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60)
+
+    async with client:
+        if warmup:
+            await drive(client, workload, mix, concurrency, warmup)
+        return await drive(client, workload, mix, concurrency, duration)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"default: {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds")
+    parser.add_argument("--seed-messages", type=int, default=0, help="load this much history first")
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--rng-seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    params = dict(vars(args), mix=mix)
+    if args.seed_messages:
+        params["seeded"] = seed(args.seed_messages, args.contacts)
+
+    run_args = (mix, args.concurrency, args.duration, args.warmup, args.contacts, args.rng_seed)
+    if args.server == "uvicorn":
+        with uvicorn_server(args.port) as base_url:
+            results = asyncio.run(run(base_url, *run_args))
+    else:
+        results = asyncio.run(run(None, *run_args))
+
+    print_table(results, "kind")
+    if args.json_path:
+        write_results(args.json_path, "load", params, results)
+
+
+if __name__ == "__main__":
+    main()
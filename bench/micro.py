@@ -0,0 +1,165 @@
+"""
+Micro-benchmarks for ConversationService methods, without HTTP in the way.
+
+Each case runs for a fixed number of iterations against the configured
+database (optionally seeded first, see bench.seed) and reports ops/s and
+p50/p95/p99 per call. Write paths run inside a transaction that is rolled
+back after every call, so the dataset stays the same between cases and runs.
+Cases ending in "_cold" clear the identity caches before each call.
+
+Usage:
+    python -m bench.micro --seed-messages 100000 --iterations 500 --json micro.json
+    python -m bench.micro --cases create_messages_100 list_messages_page
+"""
+
+import argparse
+import itertools
+import time
+from datetime import datetime, UTC
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Conversation, MessageChannel, MessageDirection, MessageType
+from app.services import conversations_service
+from app.services.conversations_service import ConversationService
+from bench.common import print_table, summarize, write_results
+from bench.seed import contact_address, customer_address, seed
+
+service = ConversationService()
+counter = itertools.count()
+
+
+def _inbound(contact: int) -> dict:
+    return dict(
+        channel=MessageChannel.SMS,
+        message_type=MessageType.SMS,
+        direction=MessageDirection.INBOUND,
+        provider_type="sms",
+        provider_message_id=f"micro-{next(counter)}",
+        from_address=contact_address(contact),
+        to_address=customer_address(0),
+        body="micro benchmark",
+        attachments=None,
+        sent_at=datetime.now(UTC),
+    )
+
+
+def _clear_caches() -> None:
+    conversations_service.contact_cache.clear()
+    conversations_service.conversation_cache.clear()
+
+
+def _cases(conversation_id: int, contacts: int) -> dict[str, tuple[Callable[[Session, int], object], bool]]:
+    """
+    name -> (call(db, i), writes). Writing cases are rolled back after each call.
+    """
+
+    def contact_ids(db, i):
+        return service.get_or_create_contact_ids(
+            db, {customer_address(0): True, contact_address(i % contacts): False}
+        )
+
+    def conversation_id_for(db, i):
+        return service.get_or_create_conversation_id(
+            db, customer_address=customer_address(0), contact_address=contact_address(i % contacts)
+        )
+
+    def create_messages(n):
+        def call(db, i):
+            return service.create_messages(
+                db, [_inbound((i * n + j) % contacts) for j in range(n)], skip_duplicates=True
+            )
+        return call
+
+    return {
+        "contact_ids_warm": (contact_ids, True),
+        "contact_ids_cold": (contact_ids, True),
+        "conversation_id_warm": (conversation_id_for, True),
+        "conversation_id_cold": (conversation_id_for, True),
+        "create_messages_1": (create_messages(1), True),
+        "create_messages_100": (create_messages(100), True),
+        "list_conversations_page": (lambda db, i: service.list_conversations(db, limit=50), False),
+        "list_messages_page": (
+            lambda db, i: service.list_messages_for_conversation(db, conversation_id, limit=50),
+            False,
+        ),
+        "conversation_version": (
+            lambda db, i: service.conversation_version(db, conversation_id),
+            False,
+        ),
+        "export_thread": (
+            lambda db, i: sum(
+                len(batch)
+                for batch in service.iter_messages_for_export(db, conversation_id=conversation_id)
+            ),
+            False,
+        ),
+    }
+
+
+def run_case(name: str, call: Callable, writes: bool, iterations: int) -> dict:
+    latencies = []
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for i in range(iterations):
+            if name.endswith("_cold"):
+                _clear_caches()
+            t0 = time.perf_counter()
+            call(db, i)
+            if writes:
+                db.rollback()
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.rollback()
+        db.close()
+    return summarize(latencies, elapsed)
+
+
+def _busiest_conversation() -> int:
+    with SessionLocal() as db:
+        conversation_id = db.execute(
+            select(Conversation.id).order_by(Conversation.message_count.desc()).limit(1)
+        ).scalar()
+    if conversation_id is None:
+        raise SystemExit("No conversations to read; run with --seed-messages N first")
+    return conversation_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed-messages", type=int, default=0, help="load this much history first")
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--cases", nargs="*", help="subset of cases to run")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    params = dict(vars(args))
+    if args.seed_messages:
+        params["seeded"] = seed(args.seed_messages, args.contacts)
+
+    cases = _cases(_busiest_conversation(), args.contacts)
+    selected = args.cases or list(cases)
+    unknown = set(selected) - set(cases)
+    if unknown:
+        raise SystemExit(f"Unknown cases {sorted(unknown)}; choose from {sorted(cases)}")
+
+    results = {}
+    for name in selected:
+        call, writes = cases[name]
+        # Warm caches and connections once before measuring
+        run_case(name, call, writes, 1)
+        results[name] = run_case(name, call, writes, args.iterations)
+
+    print_table(results, "case")
+    if args.json_path:
+        write_results(args.json_path, "micro", params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Thread read path: ORM entities vs Pydantic DTOs vs projected rows to JSON bytes.
+
+Seeds one conversation with --messages messages (10,000 by default, kept
+between runs) and times producing the JSON body of the whole thread:
+
+    orm_entities  full Message entities -> dicts -> MessageDTO -> JSON
+    dicts_dto     projected columns -> dicts -> MessageDTO -> JSON (previous route)
+    rows_json     projected row tuples -> JSON bytes (current route)
+    http          GET /api/conversations/{id}/messages?all=true, in-process ASGI
+
+Usage:
+    python -m bench.read_path --messages 10000 --iterations 30
+    python -m bench.read_path --json read_path.json
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app.db import SessionLocal, init_db
+from app.models import Contact, Conversation, Message
+from app.schemas import MessageDTO
+from app.services.bulk_import import BulkImporter
+from app.services.conversations_service import MESSAGE_FIELDS, ConversationService
+from app.utils.fast_json import rows_to_json
+from bench.common import print_table, summarize, write_results
+
+CUSTOMER = "+12016669999"
+CONTACT = "+18049999999"
+
+service = ConversationService()
+adapter = TypeAdapter(list[MessageDTO])
+
+
+def _seed_thread(messages: int) -> int:
+    """
+    Make sure the benchmark thread holds `messages` messages; returns its id.
+    """
+    start = datetime(2024, 6, 1)
+    records = (
+        {
+            "from": CONTACT if i % 5 else CUSTOMER,
+            "to": CUSTOMER if i % 5 else CONTACT,
+            "type": "sms",
+            "messaging_provider_id": f"read-path-{i}",
+            "body": f"Thread message {i} " + "lorem ipsum " * (i % 8),
+            "attachments": None,
+            "timestamp": (start + timedelta(seconds=i * 13)).isoformat() + "Z",
+            "direction": "outbound" if i % 5 == 0 else "inbound",
+        }
+        for i in range(messages)
+    )
+    BulkImporter().import_records(records)
+    with SessionLocal() as db:
+        customer = select(Contact.id).where(Contact.address == CUSTOMER).scalar_subquery()
+        contact = select(Contact.id).where(Contact.address == CONTACT).scalar_subquery()
+        return db.execute(
+            select(Conversation.id).where(
+                Conversation.customer_id == customer, Conversation.contact_id == contact
+            )
+        ).scalar_one()
+
+
+def _orm_entities(db, conversation_id: int) -> bytes:
+    # The original implementation: whole entities, then two more conversions
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.sent_at, Message.id)
+        .all()
+    )
+    rows = [
+        {
+            "id": m.id,
+            "direction": m.direction.value,
+            "channel": m.channel.value,
+            "body": m.body or "",
+            "sent_at": m.sent_at,
+            "status": m.status.value if m.status else None,
+        }
+        for m in messages
+    ]
+    return adapter.dump_json([MessageDTO(**row) for row in rows])
+
+
+def _dicts_dto(db, conversation_id: int) -> bytes:
+    rows = service.list_messages_for_conversation(db, conversation_id)
+    return adapter.dump_json([MessageDTO(**row) for row in rows])
+
+
+def _rows_json(db, conversation_id: int) -> bytes:
+    return rows_to_json(MESSAGE_FIELDS, service.message_rows_for_conversation(db, conversation_id))
+
+
+def _time_pipeline(fn, conversation_id: int, iterations: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            fn(db, conversation_id)
+            latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def _time_http(conversation_id: int, iterations: int) -> dict:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        url = f"/api/conversations/{conversation_id}/messages"
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            response = await client.get(url, params={"all": "true"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+PIPELINES = {"orm_entities": _orm_entities, "dicts_dto": _dicts_dto, "rows_json": _rows_json}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    init_db()
+    conversation_id = _seed_thread(args.messages)
+    with SessionLocal() as db:
+        size = len(_rows_json(db, conversation_id))
+    print(f"Thread {conversation_id}: {args.messages} messages, {size / 1024:.0f} KiB of JSON")
+
+    results = {}
+    for name, fn in PIPELINES.items():
+        with SessionLocal() as db:
+            fn(db, conversation_id)  # warm-up
+        results[name] = _time_pipeline(fn, conversation_id, args.iterations)
+    results["http"] = asyncio.run(_time_http(conversation_id, args.iterations))
+
+    print_table(results, "pipeline")
+    baseline = results["dicts_dto"]["p50_ms"]
+    for name, r in results.items():
+        print(f"{name}: {baseline / r['p50_ms']:.2f}x the p50 speed of dicts_dto")
+
+    if args.json_path:
+        write_results(args.json_path, "read_path", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
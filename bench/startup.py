@@ -0,0 +1,151 @@
+"""
+Worker start-up benchmark: how long a fresh process takes to serve.
+
+Each run is a new interpreter that times, in order:
+
+    framework   import fastapi, sqlalchemy and pydantic
+    app         import app.main (our modules plus building the FastAPI app)
+    startup     the lifespan start-up (schema check, dedupe warm-up, partitions)
+    first:/...  the first request to each path, then a second one for contrast
+
+With --uvicorn it also times `uvicorn app.main:app` from spawn to the first
+200 from /healthz, which adds interpreter start and server bind.
+
+Usage:
+    python -m bench.startup --runs 10
+    python -m bench.startup --runs 5 --uvicorn --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench.common import write_results
+
+PATHS = ("/healthz", "/api/conversations/")
+
+
+def _child() -> None:
+    started = time.perf_counter()
+    import fastapi  # noqa: F401
+    import pydantic  # noqa: F401
+    import sqlalchemy  # noqa: F401
+
+    phases = {"framework": time.perf_counter() - started}
+
+    mark = time.perf_counter()
+    from app.main import app
+
+    phases["app"] = time.perf_counter() - mark
+
+    import asyncio
+
+    # Outside the timed phases: only the benchmark needs it
+    import httpx as client_lib
+
+    async def serve() -> None:
+        async with app.router.lifespan_context(app):
+            phases["startup"] = time.perf_counter() - mark_startup
+            transport = client_lib.ASGITransport(app=app)
+            async with client_lib.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for path in PATHS:
+                    for label in ("first", "second"):
+                        t0 = time.perf_counter()
+                        response = await client.get(path)
+                        phases[f"{label}:{path}"] = time.perf_counter() - t0
+                        response.raise_for_status()
+
+    mark_startup = time.perf_counter()
+    asyncio.run(serve())
+    print(json.dumps({name: seconds * 1000 for name, seconds in phases.items()}))
+
+
+def _run_child() -> dict[str, float]:
+    t0 = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child"],
+        capture_output=True,
+        text=True,
+        check=True,
+        # No in-process dispatchers: their first poll would compete with the timed requests
+        env=dict(os.environ, OUTBOX_INPROCESS_WORKERS="0"),
+    )
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    phases["process_total"] = (time.perf_counter() - t0) * 1000
+    return phases
+
+
+def _uvicorn_ready(port: int) -> float:
+    """
+    Milliseconds from spawning uvicorn to its first 200 from /healthz.
+    """
+    t0 = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        env=dict(os.environ, OUTBOX_INPROCESS_WORKERS="0"),
+    )
+    try:
+        deadline = t0 + 60
+        while time.perf_counter() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/healthz", timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - t0) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("uvicorn did not become ready")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def _summarize(runs: list[dict[str, float]]) -> dict[str, dict]:
+    return {
+        name: {
+            "median_ms": statistics.median(r[name] for r in runs),
+            "min_ms": min(r[name] for r in runs),
+            "max_ms": max(r[name] for r in runs),
+        }
+        for name in runs[0]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--uvicorn", action="store_true", help="also time uvicorn spawn to ready")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return
+
+    runs = [_run_child() for _ in range(args.runs)]
+    if args.uvicorn:
+        for run in runs:
+            run["uvicorn_ready"] = _uvicorn_ready(args.port)
+    results = _summarize(runs)
+
+    width = max(len(name) for name in results)
+    print(f"{'phase':<{width}} {'median ms':>10} {'min ms':>9} {'max ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<{width}} {r['median_ms']:>10.1f} {r['min_ms']:>9.1f} {r['max_ms']:>9.1f}")
+
+    if args.json_path:
+        write_results(args.json_path, "startup", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
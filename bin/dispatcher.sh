@@ -0,0 +1,8 @@
+#!/bin/bash
+set -euo pipefail
+
+echo "Starting outbox dispatcher..."
+echo "Environment: ${ENV:-development}"
+
+# Extra arguments are passed through, e.g. ./bin/dispatcher.sh --workers 8 --processes 2
+python -m app.services.outbox_dispatcher "$@"
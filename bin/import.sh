@@ -0,0 +1,8 @@
+#!/bin/bash
+set -euo pipefail
+
+echo "Starting bulk import..."
+echo "Environment: ${ENV:-development}"
+
+# Files and options are passed through, e.g. ./bin/import.sh history.ndjson --chunk-size 100000
+python -m app.services.bulk_import "$@"
@@ -0,0 +1,8 @@
+#!/bin/bash
+set -euo pipefail
+
+echo "Running schema migrations..."
+echo "Environment: ${ENV:-development}"
+
+# Subcommands are passed through, e.g. ./bin/migrate.sh upgrade (run before starting workers)
+python -m app.migrations "$@"
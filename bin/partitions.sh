@@ -0,0 +1,8 @@
+#!/bin/bash
+set -euo pipefail
+
+echo "Managing message partitions..."
+echo "Environment: ${ENV:-development}"
+
+# Subcommands are passed through, e.g. ./bin/partitions.sh maintain (run daily from cron)
+python -m app.services.partitions "$@"
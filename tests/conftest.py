@@ -2,13 +2,15 @@ import pytest
 
 from app.db import SessionLocal, init_db
 from app import models
+from app.services import conversations_service
+from app.utils.idempotency import send_idempotency, webhook_dedupe
 
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
     """
     Ensure tables exist before any tests run.
-    In production you'd use Alembic; here we reuse init_db().
+    Applies any pending migrations (app/migrations) via init_db().
     """
     init_db()
     yield
@@ -30,6 +32,13 @@ def db_session():
         db.execute(table.delete())
     db.commit()
 
+    # Cached contact/conversation ids would point at the rows just deleted
+    conversations_service.contact_cache.clear()
+    conversations_service.conversation_cache.clear()
+    # ...and so would remembered webhook keys
+    webhook_dedupe.clear()
+    send_idempotency.cache.clear()
+
     try:
         yield db
     finally:
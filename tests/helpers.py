@@ -0,0 +1,31 @@
+"""
+Test doubles shared across test modules.
+"""
+
+from app.services.providers.types import ProviderResult, ProviderStatus
+
+
+class FakeClock:
+    """Manually advanced stand-in for time.monotonic (and time.sleep)."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class StubProvider:
+    """Answers every send with the same result and counts the calls."""
+
+    def __init__(self, status: ProviderStatus = ProviderStatus.SUCCESS, retry_after: int = None):
+        self.status = status
+        self.retry_after = retry_after
+        self.calls = 0
+
+    def send(self, payload: dict) -> ProviderResult:
+        self.calls += 1
+        return ProviderResult(status=self.status, retry_after_seconds=self.retry_after)
@@ -0,0 +1,96 @@
+import json
+
+from sqlalchemy import func, select
+
+from app.models import Conversation, ConversationParticipant, Message, MessageDirection
+from app.services.bulk_import import BulkImporter, read_records
+from app.services.conversations_service import ConversationService
+
+
+def _sms(provider_id: str, contact: str, body: str, timestamp: str, **extra) -> dict:
+    return {
+        "from": contact,
+        "to": "+12016661234",
+        "type": "sms",
+        "messaging_provider_id": provider_id,
+        "body": body,
+        "attachments": None,
+        "timestamp": timestamp,
+        **extra,
+    }
+
+
+def _count(db_session, model) -> int:
+    return db_session.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_import_groups_like_the_api_and_dedupes(db_session, tmp_path):
+    path = tmp_path / "history.ndjson"
+    records = [
+        _sms("h-1", "+18045550001", "first\twith tab", "2024-01-01T10:00:00Z"),
+        _sms("h-2", "+18045550002", "other contact", "2024-01-01T11:00:00Z"),
+        # Outbound reply: same conversation as h-1
+        dict(
+            _sms("h-3", "+12016661234", "reply", "2024-01-01T12:00:00Z", direction="outbound"),
+            to="+18045550001",
+        ),
+        _sms("h-1", "+18045550001", "replayed in file", "2024-01-01T10:00:00Z"),
+        {"from": "+1", "body": "missing fields"},
+        {
+            "from": "contact@gmail.com",
+            "to": "user@usehatchapp.com",
+            "xillio_id": "x-1",
+            "body": "line one\nline two",
+            "attachments": ["https://example.com/a.pdf"],
+            "timestamp": "2024-01-02T09:00:00Z",
+        },
+    ]
+    path.write_text("\n".join(json.dumps(r) for r in records))
+
+    stats = BulkImporter(chunk_size=2).import_records(read_records(path))
+
+    assert (stats.read, stats.rejected, stats.inserted, stats.duplicates) == (6, 1, 4, 1)
+    assert _count(db_session, Message) == 4
+    assert _count(db_session, Conversation) == 3
+    assert _count(db_session, ConversationParticipant) == 6
+
+    # Same conversation the API would pick for this pair, with its summary kept up
+    conversation_id = ConversationService().get_or_create_conversation_id(
+        db_session, customer_address="+12016661234", contact_address="+18045550001"
+    )
+    db_session.commit()  # release the upsert's row locks before importing again
+    conversation = db_session.get(Conversation, conversation_id)
+    assert conversation.message_count == 2
+    assert conversation.last_message_direction == MessageDirection.OUTBOUND
+    assert conversation.last_message_preview == "reply"
+    # Each message carries its thread's customer, for customer delta sync
+    assert db_session.execute(
+        select(func.count())
+        .select_from(Message)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Message.customer_id != Conversation.customer_id)
+    ).scalar_one() == 0
+
+    email = db_session.execute(select(Message).where(Message.provider_message_id == "x-1")).scalar_one()
+    assert email.body == "line one\nline two"
+    assert email.attachments == ["https://example.com/a.pdf"]
+
+    # Re-running the same file inserts nothing
+    again = BulkImporter().import_records(read_records(path))
+    assert (again.inserted, again.duplicates) == (0, 5)
+    assert _count(db_session, Message) == 4
+
+
+def test_import_reads_csv(db_session, tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(
+        "from,to,type,messaging_provider_id,body,attachments,timestamp\n"
+        '+18045550001,+12016661234,mms,c-1,"hello, world","[""https://example.com/x.png""]",2024-01-01T10:00:00Z\n'
+    )
+
+    stats = BulkImporter().import_records(read_records(path))
+
+    assert stats.inserted == 1
+    message = db_session.execute(select(Message)).scalar_one()
+    assert message.body == "hello, world"
+    assert message.attachments == ["https://example.com/x.png"]
@@ -1,10 +1,15 @@
 from datetime import datetime,UTC
 
+from sqlalchemy import select, text
+
+from app.services import conversations_service
 from app.services.conversations_service import ConversationService
 from app.models import (
+    ConversationParticipant,
     MessageChannel,
     MessageType,
     MessageDirection,
+    ParticipantRole,
 )
 
 
@@ -107,3 +112,189 @@ def test_inbound_idempotency_on_provider_message_id(db_session):
         provider_type=provider_type,
         provider_message_id="provider-OTHER",
     )
+
+
+def test_create_messages_bulk_matches_single_path_grouping(db_session):
+    """
+    Bulk creation should group messages into the same conversations that
+    get_or_create_conversation_id would pick, across directions.
+    """
+    svc = ConversationService()
+
+    customer = "+15551234567"
+    contact_a = "+15557654321"
+    contact_b = "+15559876543"
+
+    existing_id = svc.get_or_create_conversation_id(
+        db=db_session,
+        customer_address=customer,
+        contact_address=contact_a,
+    )
+
+    def message(from_address, to_address, direction):
+        return dict(
+            channel=MessageChannel.SMS,
+            message_type=MessageType.SMS,
+            direction=direction,
+            provider_type="sms",
+            provider_message_id=None,
+            from_address=from_address,
+            to_address=to_address,
+            body="bulk",
+            attachments=None,
+            sent_at=datetime.now(UTC),
+        )
+
+    created = svc.create_messages(
+        db_session,
+        [
+            message(customer, contact_a, MessageDirection.OUTBOUND),
+            message(contact_a, customer, MessageDirection.INBOUND),
+            message(customer, contact_b, MessageDirection.OUTBOUND),
+            message(customer, contact_b, MessageDirection.OUTBOUND),
+        ],
+    )
+    db_session.commit()
+
+    conversation_ids = [conversation_id for _, conversation_id in created]
+    assert conversation_ids[0] == conversation_ids[1] == existing_id
+    assert conversation_ids[2] == conversation_ids[3] != existing_id
+    assert len({message_id for message_id, _ in created}) == 4
+
+    assert conversation_ids[2] == svc.get_or_create_conversation_id(
+        db=db_session,
+        customer_address=customer,
+        contact_address=contact_b,
+    )
+
+
+def test_concurrent_resolution_of_new_pair_creates_one_conversation(db_session):
+    """
+    Two sessions racing to resolve a brand-new pair must converge on the same
+    conversation and contacts instead of duplicating them or failing on the
+    unique indexes.
+    """
+    import threading
+
+    from sqlalchemy import func, select
+
+    from app.db import SessionLocal
+    from app.models import Contact, Conversation, ConversationParticipant
+
+    svc = ConversationService()
+    barrier = threading.Barrier(2)
+    results: list[int] = []
+    errors: list[Exception] = []
+
+    def resolve():
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            results.append(
+                svc.get_or_create_conversation_id(
+                    db=db,
+                    customer_address="+15550000001",
+                    contact_address="+15550000002",
+                )
+            )
+            db.commit()
+        except Exception as exc:  # pragma: no cover - surfaced by the assert below
+            errors.append(exc)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=resolve) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert results[0] == results[1]
+
+    def count(model):
+        return db_session.execute(select(func.count()).select_from(model)).scalar_one()
+
+    assert count(Conversation) == 1
+    assert count(Contact) == 2
+    assert count(ConversationParticipant) == 2
+
+
+def test_conversation_summary_is_maintained_on_insert(db_session):
+    from app.models import Conversation
+
+    svc = ConversationService()
+
+    def inbound(provider_id: str, body: str, sent_at: datetime) -> dict:
+        return dict(
+            channel=MessageChannel.SMS,
+            message_type=MessageType.SMS,
+            direction=MessageDirection.INBOUND,
+            provider_type="sms",
+            provider_message_id=provider_id,
+            from_address="+15557654321",
+            to_address="+15551234567",
+            body=body,
+            attachments=None,
+            sent_at=sent_at,
+        )
+
+    created = svc.create_messages(
+        db_session,
+        [
+            inbound("s-1", "first", datetime(2024, 11, 1, 14, 0)),
+            inbound("s-2", "latest " + "x" * 200, datetime(2024, 11, 1, 15, 0)),
+            inbound("s-1", "replayed", datetime(2024, 11, 1, 16, 0)),
+        ],
+        skip_duplicates=True,
+    )
+    # A late delivery counts but does not replace the preview
+    svc.create_messages(
+        db_session,
+        [inbound("s-0", "older", datetime(2024, 11, 1, 13, 0))],
+        skip_duplicates=True,
+    )
+    db_session.commit()
+
+    conv = db_session.get(Conversation, created[0][1])
+    assert conv.message_count == 3
+    assert conv.last_message_id == created[1][0]
+    assert conv.last_message_at == datetime(2024, 11, 1, 15, 0)
+    assert conv.last_message_direction == MessageDirection.INBOUND
+    assert conv.last_message_preview.startswith("latest ")
+    assert len(conv.last_message_preview) == 140
+
+
+def test_participants_written_for_new_conversations_on_non_utc_server(db_session):
+    """
+    Telling created from existing conversations must not depend on the
+    session time zone.
+    """
+    svc = ConversationService()
+    db_session.execute(text("SET LOCAL TIME ZONE 'America/New_York'"))
+
+    conv_id = svc.get_or_create_conversation_id(
+        db=db_session,
+        customer_address="+15551234567",
+        contact_address="+15557654321",
+    )
+
+    roles = db_session.execute(
+        select(ConversationParticipant.role).where(ConversationParticipant.conversation_id == conv_id)
+    ).scalars()
+    assert sorted(roles) == [ParticipantRole.CONTACT, ParticipantRole.CUSTOMER]
+
+
+def test_resolving_an_existing_conversation_does_not_write_it(db_session):
+    svc = ConversationService()
+    pair = ("+15551234567", "+15557654321")
+    conv_id = svc.get_or_create_conversation_id(db_session, *pair)
+    db_session.commit()
+    row_version = text("SELECT xmin::text FROM conversations WHERE id = :id")
+    before = db_session.execute(row_version, {"id": conv_id}).scalar_one()
+
+    conversations_service.conversation_cache.clear()
+    assert svc.get_or_create_conversation_id(db_session, *pair) == conv_id
+    db_session.commit()
+
+    assert db_session.execute(row_version, {"id": conv_id}).scalar_one() == before
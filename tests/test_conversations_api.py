@@ -0,0 +1,347 @@
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text, update
+
+from app.db import engine
+from app.main import app
+from app.models import (
+    Contact,
+    ContactAddressType,
+    Conversation,
+    Message,
+    MessageChannel,
+    MessageDirection,
+    MessageType,
+)
+from app.services.outbox_dispatcher import OutboxDispatcher
+from app.services.providers import provider_registry
+from app.services.providers.types import ProviderResult, ProviderStatus
+
+
+client = TestClient(app)
+
+
+def _walk(url: str, limit: int) -> list[list[dict]]:
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        params = {"limit": limit, "cursor": cursor}
+
+
+def _send(to: str, body: str, timestamp: str) -> dict:
+    response = client.post(
+        "/api/messages/sms",
+        json={
+            "from": "+12016661234",
+            "to": to,
+            "type": "sms",
+            "body": body,
+            "timestamp": timestamp,
+        },
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_messages_are_keyset_paginated_in_sent_order(db_session):
+    # Two messages share a sent_at so the id tie-breaker is exercised
+    timestamps = [
+        "2024-11-01T14:00:00Z",
+        "2024-11-01T14:01:00Z",
+        "2024-11-01T14:01:00Z",
+        "2024-11-01T14:02:00Z",
+        "2024-11-01T14:03:00Z",
+    ]
+    sent = [_send("+18045551234", f"m{i}", ts) for i, ts in enumerate(timestamps)]
+    conversation_id = sent[0]["conversation_id"]
+    url = f"/api/conversations/{conversation_id}/messages"
+
+    pages = _walk(url, limit=2)
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert [m["body"] for page in pages for m in page] == [f"m{i}" for i in range(5)]
+
+    everything = client.get(url, params={"all": "true"})
+    assert "X-Next-Cursor" not in everything.headers
+    assert len(everything.json()) == 5
+
+
+def test_conversations_are_keyset_paginated_newest_first(db_session):
+    for i in range(3):
+        _send(f"+1804555000{i}", "hello", "2024-11-01T14:00:00Z")
+
+    pages = _walk("/api/conversations/", limit=2)
+    assert [len(p) for p in pages] == [2, 1]
+
+    listed = [c for page in pages for c in page]
+    assert len({c["id"] for c in listed}) == 3
+    assert [c["last_updated"] for c in listed] == sorted(
+        (c["last_updated"] for c in listed), reverse=True
+    )
+    assert all(c["message_count"] == 1 for c in listed)
+    assert all(c["last_message_preview"] == "hello" for c in listed)
+    assert all(c["last_message_direction"] == "outbound" for c in listed)
+
+
+def test_invalid_cursor_is_rejected(db_session):
+    response = client.get("/api/conversations/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_unchanged_thread_and_list_answer_304(db_session):
+    conversation_id = _send("+18045550001", "hello", "2024-11-01T14:00:00Z")["conversation_id"]
+    url = f"/api/conversations/{conversation_id}/messages"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+    # A different page of the same version is a different representation
+    assert client.get(url, params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+
+    listing = client.get("/api/conversations/")
+    list_etag = listing.headers["ETag"]
+    assert client.get("/api/conversations/", headers={"If-None-Match": list_etag}).status_code == 304
+
+    # A new message moves both versions
+    _send("+18045550001", "again", "2024-11-01T15:00:00Z")
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/conversations/", headers={"If-None-Match": list_etag}).status_code == 200
+
+
+def test_export_streams_ndjson_with_bounds_and_attachments(db_session):
+    conversation_id = _send("+18045550001", "one", "2024-11-01T14:00:00Z")["conversation_id"]
+    _send("+18045550001", "two", "2024-11-02T14:00:00Z")
+    _send("+18045550001", "three", "2024-11-03T14:00:00Z")
+    _send("+18045550002", "other thread", "2024-11-02T14:00:00Z")
+
+    response = client.get(
+        f"/api/conversations/{conversation_id}/messages/export",
+        params={"since": "2024-11-02T00:00:00Z", "until": "2024-11-03T00:00:00Z"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [m["body"] for m in lines] == ["two"]
+    assert lines[0]["from"] == "+12016661234"
+    assert "attachments" not in lines[0]
+
+    everything = client.get("/api/conversations/export", params={"attachments": "true"})
+    lines = [json.loads(line) for line in everything.text.splitlines()]
+    assert len(lines) == 4
+    assert all("attachments" in m for m in lines)
+
+    assert client.get("/api/conversations/999999/messages/export").status_code == 404
+
+
+def _changes(url: str, **params) -> dict:
+    response = client.get(url, params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_delta_sync_returns_only_changes_since_the_watermark(db_session, monkeypatch):
+    first = [_send("+18045551234", f"m{i}", "2024-11-01T14:00:00Z") for i in range(3)]
+    other = _send("+18045550000", "other thread", "2024-11-01T14:00:00Z")
+    url = f"/api/conversations/{first[0]['conversation_id']}/messages/changes"
+
+    # First sync from nothing, two at a time
+    page = _changes(url, limit=2)
+    assert page["has_more"] is True
+    page2 = _changes(url, since=page["watermark"], limit=2)
+    assert page2["has_more"] is False
+    synced = page["messages"] + page2["messages"]
+    assert [m["body"] for m in synced] == ["m0", "m1", "m2"]
+    assert {m["status"] for m in synced} == {"pending"}
+
+    # Nothing new: an empty delta
+    idle = _changes(url, since=page2["watermark"])
+    assert idle["messages"] == []
+
+    # A new message and a delivery status change both show up, nothing else does
+    _send("+18045551234", "m3", "2024-11-01T15:00:00Z")
+    delta = _changes(url, since=idle["watermark"])
+    assert [m["body"] for m in delta["messages"]] == ["m3"]
+
+    class Accepting:
+        def send(self, payload: dict) -> ProviderResult:
+            return ProviderResult(status=ProviderStatus.SUCCESS, provider_message_id=payload["body"])
+
+    monkeypatch.setitem(provider_registry, "sms", Accepting())
+    assert OutboxDispatcher().dispatch_once() == 5
+    delta = _changes(url, since=delta["watermark"])
+    assert sorted(m["body"] for m in delta["messages"]) == ["m0", "m1", "m2", "m3"]
+    assert {m["status"] for m in delta["messages"]} == {"sent"}
+
+    # Every thread of the customer in one call
+    everything = _changes("/api/conversations/changes", customer="+12016661234")
+    assert len(everything["messages"]) == 5
+    assert {m["conversation_id"] for m in everything["messages"]} == {
+        first[0]["conversation_id"],
+        other["conversation_id"],
+    }
+    assert _changes("/api/conversations/changes", customer="+19995550000")["messages"] == []
+
+
+def test_delta_sync_does_not_skip_a_transaction_that_commits_late(db_session):
+    first = _send("+18045551234", "first", "2024-11-01T14:00:00Z")
+    url = f"/api/conversations/{first['conversation_id']}/messages/changes"
+    watermark = _changes(url)["watermark"]
+
+    with engine.connect() as slow:
+        # Takes its transaction id before the next send does, commits after it
+        slow.execute(text("SELECT pg_current_xact_id()"))
+        _send("+18045551234", "fast", "2024-11-01T14:01:00Z")
+        assert _changes(url, since=watermark)["messages"] == []
+
+        slow.execute(update(Message).where(Message.id == int(first["message_id"])).values(body="slow"))
+        slow.commit()
+
+    delta = _changes(url, since=watermark)
+    assert [m["body"] for m in delta["messages"]] == ["slow", "fast"]
+
+
+def test_delta_sync_rejects_bad_watermarks_and_unknown_threads(db_session):
+    response = client.get("/api/conversations/changes", params={"customer": "+1", "since": "nope"})
+    assert response.status_code == 400
+    assert client.get("/api/conversations/999999/messages/changes").status_code == 404
+
+
+def test_search_ranks_matches_and_scopes_by_contact(db_session):
+    first = _send("+18045550001", "Your invoice is ready", "2024-11-01T14:00:00Z")
+    _send("+18045550001", "Invoice 42: the invoice was paid", "2024-11-02T14:00:00Z")
+    _send("+18045550002", "Invoices go out on Fridays", "2024-11-03T14:00:00Z")
+    _send("+18045550002", "Nothing to see here", "2024-11-04T14:00:00Z")
+
+    response = client.get("/api/conversations/search", params={"q": "invoice"})
+    assert response.status_code == 200
+    results = response.json()
+    # Stemming matches "Invoices"; the body mentioning it twice ranks first
+    assert len(results) == 3
+    assert results[0]["body"] == "Invoice 42: the invoice was paid"
+    assert "<b>invoice</b>" in results[0]["highlight"]
+
+    scoped = client.get(
+        "/api/conversations/search", params={"q": "invoice -paid", "contact": "+18045550001"}
+    ).json()
+    assert [(m["body"], m["conversation_id"]) for m in scoped] == [
+        ("Your invoice is ready", first["conversation_id"])
+    ]
+
+    assert client.get("/api/conversations/search", params={"q": "invoice", "limit": 1}).json()[0][
+        "body"
+    ] == results[0]["body"]
+    assert client.get("/api/conversations/search", params={"q": ""}).status_code == 422
+
+
+def test_read_endpoints_serialize_like_their_response_models(db_session, monkeypatch):
+    from pydantic import TypeAdapter
+
+    from app.schemas import ConversationSummary, MessageDTO
+    from app.services.conversations_service import ConversationService
+    from app.utils import fast_json
+
+    conversation_id = _send("+18045550001", "sent", "2024-11-01T14:00:00.123456Z")["conversation_id"]
+    client.post(
+        "/api/webhooks/sms",
+        json={
+            "from": "+18045550001",
+            "to": "+12016661234",
+            "type": "sms",
+            "messaging_provider_id": "parity-1",
+            "body": "received",
+            "attachments": None,
+            "timestamp": "2024-11-01T14:05:00Z",
+        },
+    )
+    # What the routes produced when they built and serialized models
+    service = ConversationService()
+    messages_adapter = TypeAdapter(list[MessageDTO])
+    conversations_adapter = TypeAdapter(list[ConversationSummary])
+    expected_messages = messages_adapter.dump_json(
+        messages_adapter.validate_python(
+            service.list_messages_for_conversation(db_session, conversation_id)
+        )
+    )
+    expected_conversations = conversations_adapter.dump_json(
+        conversations_adapter.validate_python(service.list_conversations(db_session))
+    )
+
+    for encoder in (fast_json.orjson, None):
+        monkeypatch.setattr(fast_json, "orjson", encoder)
+        messages = client.get(f"/api/conversations/{conversation_id}/messages")
+        assert messages.headers["content-type"] == "application/json"
+        assert messages.json() == json.loads(expected_messages)
+        assert client.get("/api/conversations/").json() == json.loads(expected_conversations)
+
+
+def test_search_highlight_escapes_message_markup(db_session):
+    _send("+18045550001", '<img src=x onerror="alert(1)"> invoice & co', "2024-11-01T14:00:00Z")
+
+    [result] = client.get("/api/conversations/search", params={"q": "invoice"}).json()
+
+    highlight = result["highlight"]
+    assert "<b>invoice</b>" in highlight
+    # The <b> markers are the only markup left
+    assert "<" not in highlight.replace("<b>", "").replace("</b>", "")
+    assert "&quot;alert(1)&quot;&gt;" in highlight
+
+
+def test_search_scope_matches_the_address_type_too(db_session):
+    phone = _send("+18045550001", "phone invoice", "2024-11-01T14:00:00Z")
+    # Same string stored as an email contact with its own thread
+    customer_id = db_session.execute(
+        text("SELECT id FROM contacts WHERE address = '+12016661234'")
+    ).scalar_one()
+    other = Contact(address="+18045550001", address_type=ContactAddressType.EMAIL, is_customer_owned=False)
+    db_session.add(other)
+    db_session.flush()
+    thread = Conversation(customer_id=customer_id, contact_id=other.id)
+    db_session.add(thread)
+    db_session.flush()
+    db_session.add(
+        Message(
+            conversation_id=thread.id,
+            customer_id=customer_id,
+            channel=MessageChannel.EMAIL,
+            message_type=MessageType.EMAIL,
+            direction=MessageDirection.INBOUND,
+            from_contact_id=other.id,
+            to_contact_id=customer_id,
+            body="email invoice",
+            sent_at=datetime(2024, 11, 2),
+        )
+    )
+    db_session.commit()
+
+    scoped = client.get(
+        "/api/conversations/search", params={"q": "invoice", "contact": "+18045550001"}
+    ).json()
+    assert [(m["body"], m["conversation_id"]) for m in scoped] == [
+        ("phone invoice", phone["conversation_id"])
+    ]
+
+
+def test_list_etag_sees_a_change_committed_with_a_lower_version(db_session):
+    first = _send("+18045550001", "one", "2024-11-01T14:00:00Z")["conversation_id"]
+    with engine.connect() as late:
+        # A writer takes its version number, then commits after a later one
+        version = late.execute(text("SELECT nextval('conversation_version_seq')")).scalar_one()
+        _send("+18045550002", "two", "2024-11-01T15:00:00Z")
+        list_etag = client.get("/api/conversations/").headers["ETag"]
+        late.execute(
+            text("UPDATE conversations SET version = :version WHERE id = :id"),
+            {"version": version, "id": first},
+        )
+        late.commit()
+
+    assert client.get("/api/conversations/", headers={"If-None-Match": list_etag}).status_code == 200
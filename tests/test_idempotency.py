@@ -0,0 +1,37 @@
+from datetime import datetime, UTC
+
+from app.services.conversations_service import ConversationService
+from app.models import MessageChannel, MessageDirection, MessageType
+from app.utils.idempotency import WebhookDedupeFilter
+
+
+def test_recent_set_is_bounded_and_counts_hits():
+    dedupe = WebhookDedupeFilter(recent_size=2)
+    dedupe.add(["sms:a", "sms:b", "sms:c"])
+
+    assert not dedupe.is_known_duplicate("sms:a")  # evicted, so it goes to the DB
+    assert dedupe.is_known_duplicate("sms:c")
+    stats = dedupe.stats()
+    assert stats["recent_size"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+def test_warm_loads_recent_inbound_keys(db_session):
+    message = dict(
+        channel=MessageChannel.SMS,
+        message_type=MessageType.SMS,
+        direction=MessageDirection.INBOUND,
+        provider_type="sms",
+        provider_message_id="warm-1",
+        from_address="+18045551234",
+        to_address="+12016661234",
+        body="hi",
+        attachments=None,
+        sent_at=datetime.now(UTC),
+    )
+    ConversationService().create_messages(db_session, [message])
+    db_session.commit()
+
+    dedupe = WebhookDedupeFilter()
+    assert dedupe.warm(db_session) == 1
+    assert dedupe.is_known_duplicate(WebhookDedupeFilter.key("sms", "warm-1"))
@@ -0,0 +1,97 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import event
+
+from app.db import engine
+from app.models import MessageChannel, MessageType, MessageDirection
+from app.services.conversations_service import ConversationService
+from app.utils.cache import LRUCache
+from tests.helpers import FakeClock
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires_entries():
+    clock = FakeClock()
+    cache = LRUCache(max_size=2, ttl_seconds=10, clock=clock)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+
+def _count_statements():
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", record)
+
+
+def test_known_pair_resolves_without_lookup_queries(db_session):
+    svc = ConversationService(
+        contact_cache=LRUCache(max_size=100, ttl_seconds=60),
+        conversation_cache=LRUCache(max_size=100, ttl_seconds=60),
+    )
+    customer = "+15551234567"
+    contact = "+15557654321"
+
+    conversation_id = svc.get_or_create_conversation_id(
+        db=db_session, customer_address=customer, contact_address=contact
+    )
+    db_session.commit()
+
+    statements, stop = _count_statements()
+    try:
+        assert conversation_id == svc.get_or_create_conversation_id(
+            db=db_session, customer_address=customer, contact_address=contact
+        )
+        svc.create_message(
+            db=db_session,
+            conversation_id=conversation_id,
+            channel=MessageChannel.SMS,
+            message_type=MessageType.SMS,
+            direction=MessageDirection.OUTBOUND,
+            provider_type="sms",
+            provider_message_id=None,
+            from_address=customer,
+            to_address=contact,
+            body="cached",
+            attachments=None,
+            sent_at=datetime.now(UTC),
+        )
+    finally:
+        stop()
+
+    assert not any("contacts" in s and s.startswith("INSERT") for s in statements)
+    assert not any("conversations" in s and s.startswith("INSERT") for s in statements)
+
+
+def test_ids_from_rolled_back_transaction_are_not_cached(db_session):
+    contact_cache = LRUCache(max_size=100, ttl_seconds=60)
+    conversation_cache = LRUCache(max_size=100, ttl_seconds=60)
+    svc = ConversationService(
+        contact_cache=contact_cache,
+        conversation_cache=conversation_cache,
+    )
+
+    svc.get_or_create_conversation_id(
+        db=db_session, customer_address="+15551234567", contact_address="+15557654321"
+    )
+    db_session.rollback()
+
+    assert len(contact_cache) == 0
+    assert len(conversation_cache) == 0
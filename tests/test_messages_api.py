@@ -0,0 +1,46 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def test_sms_batch_send_returns_result_per_item(db_session):
+    payloads = [
+        {
+            "from": "+12016661234",
+            "to": f"+1804555{i:04d}",
+            "type": "sms" if i % 2 else "mms",
+            "body": f"Batch message {i}",
+            "attachments": None,
+            "timestamp": "2024-11-01T14:00:00Z",
+        }
+        for i in range(5)
+    ]
+    # Same pair twice should land in the same conversation
+    payloads.append(dict(payloads[0], body="Follow-up"))
+
+    response = client.post("/api/messages/sms/batch", json=payloads)
+    assert response.status_code == 200
+
+    results = response.json()
+    assert len(results) == len(payloads)
+    assert all(r["status"] == "accepted" for r in results)
+    assert results[0]["conversation_id"] == results[-1]["conversation_id"]
+    assert len({r["conversation_id"] for r in results}) == 5
+
+
+def test_email_batch_send_rejects_oversized_batch(db_session, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "BATCH_MAX_ITEMS", 1)
+    payload = {
+        "from": "user@usehatchapp.com",
+        "to": "contact@gmail.com",
+        "body": "Hello",
+        "timestamp": "2024-11-01T14:00:00Z",
+    }
+
+    response = client.post("/api/messages/email/batch", json=[payload, payload])
+    assert response.status_code == 413
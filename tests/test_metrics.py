@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.metrics import (
+    REGISTRY,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    http_request_duration,
+    http_requests,
+)
+
+
+client = TestClient(app)
+
+
+def _sample(text: str, prefix: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_counter_and_histogram_merge_per_thread_shards():
+    counter = Counter("test_events_total", "test", ("kind",))
+    histogram = Histogram("test_latency_seconds", "test", ("kind",), buckets=(0.1, 1))
+    try:
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+                histogram.observe(0.5, "a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        histogram.observe(0.1, "a")
+
+        assert counter.values() == {("a",): 4000}
+        lines = histogram.collect()
+        assert 'test_latency_seconds_bucket{kind="a",le="0.1"} 1' in lines
+        assert 'test_latency_seconds_bucket{kind="a",le="1"} 4001' in lines
+        assert 'test_latency_seconds_bucket{kind="a",le="+Inf"} 4001' in lines
+        assert 'test_latency_seconds_count{kind="a"} 4001' in lines
+    finally:
+        REGISTRY.remove(counter)
+        REGISTRY.remove(histogram)
+
+
+def test_metrics_endpoint_reports_routes_db_usage_and_duplicates(db_session):
+    payload = {
+        "from": "+18045551234",
+        "to": "+12016661234",
+        "type": "sms",
+        "messaging_provider_id": "metrics-1",
+        "body": "hi",
+        "attachments": None,
+        "timestamp": "2024-11-01T14:00:00Z",
+    }
+    route = 'route="/api/webhooks/sms"'
+    before = client.get("/metrics").text
+
+    for _ in range(2):
+        assert client.post("/api/webhooks/sms", json=payload).status_code == 200
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    counted = f'http_requests_total{{method="POST",{route},status="200"}}'
+    assert _sample(text, counted) - _sample(before, counted) == 2
+    queries = f"db_queries_per_request_sum{{{route}}}"
+    assert _sample(text, queries) > _sample(before, queries)
+    replays = 'webhook_duplicates_total{channel="sms",caught_by="memory"}'
+    assert _sample(text, replays) - _sample(before, replays) == 1
+    assert "db_pool_checked_out_connections{" in text
+    assert "db_pool_checkout_wait_seconds_count{" in text
+
+
+def test_event_streams_are_counted_but_not_timed():
+    async def stream(scope, receive, send):
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"event: ready\n\n"})
+
+    async def ignore(message):
+        pass
+
+    key = ("GET", "unmatched")
+    timed = http_request_duration.values().get(key)
+    counted = http_requests.values().get(key + ("200",), 0)
+    asyncio.run(MetricsMiddleware(stream)({"type": "http", "method": "GET", "path": "/x"}, None, ignore))
+
+    assert http_request_duration.values().get(key) == timed
+    assert http_requests.values()[key + ("200",)] == counted + 1
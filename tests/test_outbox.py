@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import Message, MessageStatus, OutboxEntry, OutboxStatus
+from app.services.outbox_dispatcher import OutboxDispatcher
+from app.services.outbox_service import OutboxService
+from app.services.providers import provider_registry
+from app.services.providers.types import ProviderResult, ProviderStatus
+
+
+client = TestClient(app)
+
+
+class ScriptedProvider:
+    """Returns the queued results in order, recording every payload sent."""
+
+    def __init__(self, *results: ProviderResult):
+        self.results = list(results)
+        self.sent: list[dict] = []
+
+    def send(self, payload: dict) -> ProviderResult:
+        self.sent.append(payload)
+        return self.results.pop(0)
+
+
+def _send_sms() -> dict:
+    response = client.post(
+        "/api/messages/sms",
+        json={
+            "from": "+12016661234",
+            "to": "+18045551234",
+            "type": "sms",
+            "body": "Hello via the outbox",
+            "timestamp": "2024-11-01T14:00:00Z",
+        },
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_send_is_accepted_pending_and_dispatched_later(db_session, monkeypatch):
+    provider = ScriptedProvider(
+        ProviderResult(status=ProviderStatus.SUCCESS, provider_message_id="sms-abc")
+    )
+    monkeypatch.setitem(provider_registry, "sms", provider)
+
+    body = _send_sms()
+    assert body["status"] == "accepted"
+    assert body["provider_message_id"] is None
+    assert provider.sent == []
+
+    message = db_session.query(Message).filter_by(id=int(body["message_id"])).one()
+    assert message.status == MessageStatus.PENDING
+    version = message.conversation.version
+
+    assert OutboxDispatcher().dispatch_once() == 1
+    assert provider.sent[0]["body"] == "Hello via the outbox"
+
+    db_session.expire_all()
+    message = db_session.query(Message).filter_by(id=int(body["message_id"])).one()
+    assert message.status == MessageStatus.SENT
+    assert message.provider_message_id == "sms-abc"
+    assert db_session.query(OutboxEntry).one().status == OutboxStatus.SENT
+    # Delivery status is part of the thread, so its ETag version moves
+    assert message.conversation.version > version
+
+    # Nothing left to claim
+    assert OutboxDispatcher().dispatch_once() == 0
+
+
+def test_rate_limited_send_is_retried_no_sooner_than_retry_after(db_session, monkeypatch):
+    provider = ScriptedProvider(
+        ProviderResult(status=ProviderStatus.RATE_LIMITED, retry_after_seconds=30)
+    )
+    monkeypatch.setitem(provider_registry, "sms", provider)
+    _send_sms()
+
+    before = datetime.now(UTC).replace(tzinfo=None)
+    OutboxDispatcher().dispatch_once()
+
+    entry = db_session.query(OutboxEntry).one()
+    assert entry.status == OutboxStatus.PENDING
+    assert entry.attempts == 1
+    assert entry.next_attempt_at >= before + timedelta(seconds=30)
+    assert entry.last_error.startswith("rate_limited")
+
+    # Not due yet
+    assert OutboxDispatcher().dispatch_once() == 0
+
+
+def test_permanent_failure_and_exhausted_retries_are_dead_lettered(db_session, monkeypatch):
+    provider = ScriptedProvider(
+        ProviderResult(status=ProviderStatus.TEMPORARY_FAILURE, error_message="503"),
+        ProviderResult(status=ProviderStatus.PERMANENT_FAILURE, error_message="400"),
+    )
+    monkeypatch.setitem(provider_registry, "sms", provider)
+    _send_sms()
+    _send_sms()
+
+    outbox = OutboxService(max_attempts=1)
+    OutboxDispatcher(outbox=outbox).dispatch_once()
+
+    entries = db_session.query(OutboxEntry).order_by(OutboxEntry.id).all()
+    assert [e.status for e in entries] == [OutboxStatus.DEAD, OutboxStatus.DEAD]
+    assert [e.last_error for e in entries] == ["temporary_failure: 503", "permanent_failure: 400"]
+
+    statuses = {m.status for m in db_session.query(Message)}
+    assert statuses == {MessageStatus.FAILED}
+
+
+def test_claimed_entries_are_not_claimed_twice(db_session):
+    _send_sms()
+    outbox = OutboxService()
+
+    first = outbox.claim(db_session, limit=10)
+    second = outbox.claim(db_session, limit=10)
+
+    assert len(first) == 1
+    assert second == []
+
+
+def test_locally_throttled_send_does_not_use_up_an_attempt(db_session, monkeypatch):
+    provider = ScriptedProvider(
+        ProviderResult(
+            status=ProviderStatus.RATE_LIMITED,
+            retry_after_seconds=2,
+            throttled=True,
+        )
+    )
+    monkeypatch.setitem(provider_registry, "sms", provider)
+    _send_sms()
+
+    OutboxDispatcher().dispatch_once()
+
+    entry = db_session.query(OutboxEntry).one()
+    assert entry.status == OutboxStatus.PENDING
+    assert entry.attempts == 0
+
+
+def test_entries_are_leased_one_send_at_a_time(db_session, monkeypatch):
+    statuses_during_sends = []
+
+    class Observing(ScriptedProvider):
+        def send(self, payload: dict) -> ProviderResult:
+            db_session.expire_all()
+            statuses_during_sends.append(
+                [e.status for e in db_session.query(OutboxEntry).order_by(OutboxEntry.id)]
+            )
+            return super().send(payload)
+
+    provider = Observing(*[ProviderResult(status=ProviderStatus.SUCCESS)] * 2)
+    monkeypatch.setitem(provider_registry, "sms", provider)
+    _send_sms()
+    _send_sms()
+
+    assert OutboxDispatcher().dispatch_once() == 2
+    # The second entry is still claimable by other workers while the first is sent
+    assert statuses_during_sends == [
+        [OutboxStatus.IN_FLIGHT, OutboxStatus.PENDING],
+        [OutboxStatus.SENT, OutboxStatus.IN_FLIGHT],
+    ]
+
+
+def test_lease_must_outlast_the_slowest_send():
+    # The default routers allow 2 routes x PROVIDER_SLOW_CALL_SECONDS
+    with pytest.raises(ValueError):
+        OutboxDispatcher(outbox=OutboxService(lease_seconds=5))
@@ -0,0 +1,112 @@
+import gzip
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+from app.models import Message, MessageChannel, MessageDedupeKey, MessageDirection, MessageType
+from app.services.conversations_service import ConversationService
+from app.services.partitions import (
+    apply_retention,
+    ensure_partitions,
+    list_partitions,
+    split_default,
+)
+
+
+svc = ConversationService()
+
+
+def _inbound(provider_id: str, sent_at: datetime, body: str = "hello") -> dict:
+    return dict(
+        channel=MessageChannel.SMS,
+        message_type=MessageType.SMS,
+        direction=MessageDirection.INBOUND,
+        provider_type="sms",
+        provider_message_id=provider_id,
+        from_address="+18045550001",
+        to_address="+12016661234",
+        body=body,
+        attachments=None,
+        sent_at=sent_at,
+    )
+
+
+def _drop(db_session, *names: str) -> None:
+    for name in names:
+        db_session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    db_session.commit()
+
+
+def _rows_in(db_session, table: str) -> int:
+    return db_session.execute(text(f"SELECT count(*) FROM {table}")).scalar_one()
+
+
+def test_new_partition_takes_over_rows_from_default(db_session):
+    _drop(db_session, "messages_y2019m03")
+    svc.create_messages(db_session, [_inbound("p-1", datetime(2019, 3, 5))], skip_duplicates=True)
+    db_session.commit()
+    assert _rows_in(db_session, "messages_default") == 1
+
+    assert split_default(db_session) == ["messages_y2019m03"]
+    db_session.commit()
+
+    assert _rows_in(db_session, "messages_default") == 0
+    assert _rows_in(db_session, "messages_y2019m03") == 1
+    names = {p.name: p for p in list_partitions(db_session)}
+    assert names["messages_y2019m03"].lower == datetime(2019, 3, 1)
+    assert names["messages_y2019m03"].upper == datetime(2019, 4, 1)
+    # Idempotent once the month exists
+    assert ensure_partitions(db_session, datetime(2019, 3, 1), datetime(2019, 3, 31)) == []
+
+
+def test_provider_ids_stay_unique_across_partitions(db_session):
+    ensure_partitions(db_session, datetime(2019, 3, 1), datetime(2019, 4, 1))
+    db_session.commit()
+
+    first = svc.create_messages(db_session, [_inbound("p-2", datetime(2019, 3, 5))], skip_duplicates=True)
+    # Same delivery replayed with a timestamp in another month's partition
+    replay = svc.create_messages(db_session, [_inbound("p-2", datetime(2019, 4, 5))], skip_duplicates=True)
+    db_session.commit()
+
+    assert first[0][0] is not None
+    assert replay[0][0] is None
+    assert db_session.execute(select(func.count()).select_from(Message)).scalar_one() == 1
+    assert svc.inbound_message_exists(db_session, "sms", "p-2")
+
+
+def test_retention_archives_and_drops_expired_partitions(db_session, tmp_path):
+    _drop(db_session, "messages_y2018m01")
+    ensure_partitions(db_session, datetime(2018, 1, 1), datetime(2018, 1, 1))
+    svc.create_messages(
+        db_session, [_inbound("old-1", datetime(2018, 1, 10), body="archive me")], skip_duplicates=True
+    )
+    svc.create_messages(db_session, [_inbound("new-1", datetime(2019, 3, 10))], skip_duplicates=True)
+    db_session.commit()
+
+    # Keep 13 full months before 2019-03: everything from 2018-02 on
+    dropped = apply_retention(db_session, keep_months=13, archive_dir=tmp_path, now=datetime(2019, 3, 15))
+
+    assert [d["partition"] for d in dropped] == ["messages_y2018m01"]
+    assert dropped[0]["rows"] == 1
+    with gzip.open(tmp_path / "messages_y2018m01.csv.gz", "rt") as fh:
+        archived = fh.read()
+    assert "archive me" in archived and archived.startswith("id,")
+    assert "messages_y2018m01" not in {p.name for p in list_partitions(db_session)}
+    keys = db_session.execute(select(MessageDedupeKey.provider_message_id)).scalars().all()
+    assert keys == ["new-1"]
+    assert db_session.execute(select(Message.provider_message_id)).scalars().all() == ["new-1"]
+
+
+def test_retention_finishes_partitions_left_detached(db_session, tmp_path):
+    _drop(db_session, "messages_y2018m02")
+    ensure_partitions(db_session, datetime(2018, 2, 1), datetime(2018, 2, 1))
+    svc.create_messages(db_session, [_inbound("old-2", datetime(2018, 2, 10))], skip_duplicates=True)
+    # A run that detached the partition and then failed
+    db_session.execute(text("ALTER TABLE messages DETACH PARTITION messages_y2018m02"))
+    db_session.commit()
+
+    dropped = apply_retention(db_session, keep_months=12, archive_dir=tmp_path, now=datetime(2019, 3, 15))
+
+    assert [(d["partition"], d["rows"]) for d in dropped] == [("messages_y2018m02", 1)]
+    assert db_session.execute(text("SELECT to_regclass('messages_y2018m02')")).scalar() is None
+    assert db_session.execute(select(MessageDedupeKey.provider_message_id)).scalars().all() == []
@@ -0,0 +1,178 @@
+import json
+import random
+import threading
+import time
+
+from app.services.providers.rate_limiter import RateLimitedProvider
+from app.services.providers.routing import (
+    BreakerState,
+    CircuitBreaker,
+    ProviderRoute,
+    ProviderRouter,
+)
+from app.services.providers.types import ProviderResult, ProviderStatus
+from tests.helpers import FakeClock, StubProvider
+
+
+def test_temporary_failure_fails_over_to_backup():
+    primary = StubProvider(ProviderStatus.TEMPORARY_FAILURE)
+    backup = StubProvider()
+    router = ProviderRouter(
+        [ProviderRoute("primary", primary), ProviderRoute("backup", backup, weight=0)]
+    )
+
+    result = router.send({"from": "+1", "to": "+2"})
+
+    assert result.status == ProviderStatus.SUCCESS
+    assert (primary.calls, backup.calls) == (1, 1)
+    assert [a["provider"] for a in router.stats()["recent_decisions"][-1]["attempts"]] == [
+        "primary",
+        "backup",
+    ]
+
+
+def test_permanent_failure_is_not_retried_elsewhere():
+    primary = StubProvider(ProviderStatus.PERMANENT_FAILURE)
+    backup = StubProvider()
+    router = ProviderRouter(
+        [ProviderRoute("primary", primary), ProviderRoute("backup", backup, weight=0)]
+    )
+
+    assert router.send({}).status == ProviderStatus.PERMANENT_FAILURE
+    assert backup.calls == 0
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=30, clock=clock)
+    primary = StubProvider(ProviderStatus.TEMPORARY_FAILURE)
+    backup = StubProvider()
+    router = ProviderRouter(
+        [
+            ProviderRoute("primary", primary, breaker=breaker),
+            ProviderRoute("backup", backup, weight=0),
+        ]
+    )
+
+    router.send({})
+    router.send({})
+    assert breaker.state == BreakerState.OPEN
+
+    # While open, traffic goes straight to the backup
+    router.send({})
+    assert (primary.calls, backup.calls) == (2, 3)
+
+    clock.now += 30
+    assert breaker.state == BreakerState.HALF_OPEN
+    primary.status = ProviderStatus.SUCCESS
+    assert router.send({}).status == ProviderStatus.SUCCESS
+    assert breaker.state == BreakerState.CLOSED
+    assert primary.calls == 3
+
+
+def test_all_breakers_open_returns_retryable_failure():
+    clock = FakeClock()
+    provider = StubProvider(ProviderStatus.TEMPORARY_FAILURE)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=10, clock=clock)
+    router = ProviderRouter([ProviderRoute("only", provider, breaker=breaker)])
+
+    router.send({})
+    result = router.send({})
+
+    assert provider.calls == 1
+    assert result.status == ProviderStatus.TEMPORARY_FAILURE
+    assert result.retry_after_seconds >= 10
+
+
+def test_slower_route_gets_a_smaller_share_of_traffic():
+    fast, slow = ProviderRoute("fast", StubProvider()), ProviderRoute("slow", StubProvider())
+    fast.latency_ewma, slow.latency_ewma = 0.01, 0.1
+    router = ProviderRouter([fast, slow], rng=random.Random(7))
+
+    firsts = [router._plan()[0].name for _ in range(1000)]
+
+    assert firsts.count("fast") > 800
+
+
+def test_hung_provider_call_is_abandoned_without_failing_over():
+    release = threading.Event()
+
+    class Hanging(StubProvider):
+        def send(self, payload: dict) -> ProviderResult:
+            release.wait(5)
+            return super().send(payload)
+
+    backup = StubProvider()
+    router = ProviderRouter(
+        [ProviderRoute("primary", Hanging()), ProviderRoute("backup", backup, weight=0)],
+        slow_call_seconds=0.1,
+    )
+    started = time.perf_counter()
+    try:
+        result = router.send({"from": "+1", "to": "+2"})
+    finally:
+        release.set()
+
+    # The primary may still deliver it: retry later rather than send it twice
+    assert result.status == ProviderStatus.TEMPORARY_FAILURE
+    assert "no answer within 0.1s" in result.error_message
+    assert backup.calls == 0
+    assert time.perf_counter() - started < 1
+    assert router.routes[0].failures == 1
+
+
+def test_provider_exception_does_not_fail_over():
+    class Raising(StubProvider):
+        def send(self, payload: dict) -> ProviderResult:
+            raise ConnectionResetError("connection reset after request sent")
+
+    backup = StubProvider()
+    router = ProviderRouter([ProviderRoute("primary", Raising()), ProviderRoute("backup", backup, weight=0)])
+
+    result = router.send({})
+
+    assert result.status == ProviderStatus.TEMPORARY_FAILURE
+    assert result.error_message == "primary: connection reset after request sent"
+    assert backup.calls == 0
+
+
+def test_local_throttle_stays_on_its_route_and_provider_429_fails_over():
+    clock = FakeClock()
+    primary = StubProvider()
+    limited = RateLimitedProvider(primary, rate=0, per_sender_rate=1, block=False, clock=clock)
+    backup = StubProvider()
+    router = ProviderRouter([ProviderRoute("primary", limited), ProviderRoute("backup", backup, weight=0)])
+
+    router.send({"from": "+1"})
+    throttled = router.send({"from": "+1"})
+    assert (throttled.status, throttled.throttled) == (ProviderStatus.RATE_LIMITED, True)
+    assert (primary.calls, backup.calls) == (1, 0)
+
+    primary.status = ProviderStatus.RATE_LIMITED
+    clock.now += 1
+    assert router.send({"from": "+1"}).status == ProviderStatus.SUCCESS
+    assert (primary.calls, backup.calls) == (2, 1)
+
+
+def test_latency_excludes_the_rate_limiter_wait():
+    clock = FakeClock()
+    limited = RateLimitedProvider(StubProvider(), rate=1, clock=clock, sleep=clock.sleep)
+    route = ProviderRoute("primary", limited)
+    router = ProviderRouter([route], slow_call_seconds=0.5, clock=clock)
+
+    router.send({})
+    result = router.send({})  # waits a second for a token
+
+    assert (result.status, result.waited_seconds) == (ProviderStatus.SUCCESS, 1.0)
+    assert route.latency_ewma == 0.0
+    assert (route.failures, route.breaker.state) == (0, BreakerState.CLOSED)
+
+
+def test_stats_report_sender_totals_not_senders():
+    limited = RateLimitedProvider(StubProvider(), rate=0, per_sender_rate=1)
+    router = ProviderRouter([ProviderRoute("primary", limited)])
+    router.send({"from": "+12016661234", "to": "+2"})
+
+    stats = router.stats()
+    assert "+12016661234" not in json.dumps(stats)
+    assert stats["routes"]["primary"]["rate_limiter"]["senders"]["size"] == 1
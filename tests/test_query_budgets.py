@@ -0,0 +1,100 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.sql_profiler import (
+    SqlProfilerMiddleware,
+    assert_query_budget,
+    normalize_sql,
+    recent_profiles,
+)
+
+
+client = TestClient(app)
+
+SMS = {
+    "from": "+12016661234",
+    "to": "+18045551234",
+    "type": "sms",
+    "body": "hello",
+    "attachments": None,
+    "timestamp": "2024-11-01T14:00:00Z",
+}
+WEBHOOK = {
+    "from": "+18045551234",
+    "to": "+12016661234",
+    "type": "sms",
+    "messaging_provider_id": "budget-1",
+    "body": "hi",
+    "attachments": None,
+    "timestamp": "2024-11-01T14:00:00Z",
+}
+
+
+def test_normalize_sql_collapses_values_and_lists():
+    a = normalize_sql("SELECT * FROM t WHERE id IN (%(id_1)s, %(id_2)s) AND name = 'x'")
+    b = normalize_sql("SELECT *\n FROM t WHERE id IN (%(id_1)s) AND name = 'o''brien'")
+    assert a == b == "SELECT * FROM t WHERE id IN (...) AND name = ?"
+    assert normalize_sql("INSERT INTO t (a, b) VALUES (1, 2), (3, 4)") == "INSERT INTO t (a, b) VALUES (...)"
+
+
+def test_budget_flags_repeated_statements(db_session):
+    with pytest.raises(AssertionError, match="N\\+1 candidates"):
+        with assert_query_budget(10):
+            for i in range(3):
+                client.get(f"/api/conversations/{i}/messages")
+
+
+def test_send_routes_stay_within_budget(db_session):
+    # Cold caches: contact upsert, conversation lookup and insert,
+    # participants, message, summary, outbox
+    with assert_query_budget(7):
+        assert client.post("/api/messages/sms", json=SMS).status_code == 200
+    # Warm: message, summary, outbox
+    with assert_query_budget(3):
+        assert client.post("/api/messages/sms", json=SMS).status_code == 200
+
+    batch = [dict(SMS, to=f"+1804555{i:04d}") for i in range(25)]
+    with assert_query_budget(7):
+        assert client.post("/api/messages/sms/batch", json=batch).status_code == 200
+
+
+def test_webhook_and_read_routes_stay_within_budget(db_session):
+    client.post("/api/webhooks/sms", json=dict(WEBHOOK, messaging_provider_id="warm-up"))
+    # Dedupe key claim, message, summary
+    with assert_query_budget(3):
+        assert client.post("/api/webhooks/sms", json=WEBHOOK).status_code == 200
+    # Known replays never reach the database
+    with assert_query_budget(0):
+        assert client.post("/api/webhooks/sms", json=WEBHOOK).status_code == 200
+
+    [conversation] = client.get("/api/conversations/").json()
+    # The page is the ETag's version token
+    with assert_query_budget(1):
+        assert client.get("/api/conversations/").status_code == 200
+    with assert_query_budget(2):
+        assert client.get(f"/api/conversations/{conversation['id']}/messages").status_code == 200
+    # Thread check, snapshot horizon, changed rows
+    with assert_query_budget(3):
+        url = f"/api/conversations/{conversation['id']}/messages/changes"
+        assert client.get(url).status_code == 200
+    with assert_query_budget(2):
+        params = {"customer": WEBHOOK["to"]}
+        assert client.get("/api/conversations/changes", params=params).status_code == 200
+    # Match, rank and highlight in one statement
+    with assert_query_budget(1):
+        assert client.get("/api/conversations/search", params={"q": "hello"}).status_code == 200
+
+
+def test_profiler_middleware_reports_headers_and_history(db_session):
+    profiled = TestClient(SqlProfilerMiddleware(app))
+
+    response = profiled.get("/api/conversations/")
+
+    assert response.status_code == 200
+    assert response.headers["x-sql-queries"] == "1"
+    assert response.headers["x-sql-repeated"] == "0"
+    [latest] = recent_profiles(1)
+    assert latest["path"] == "/api/conversations/"
+    assert latest["queries"] == 1
+    assert latest["n_plus_one"] == {}
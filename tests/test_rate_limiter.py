@@ -0,0 +1,96 @@
+from app.services.providers.rate_limiter import RateLimitedProvider, TokenBucket
+from app.services.providers.types import ProviderStatus
+from tests.helpers import FakeClock, StubProvider
+
+
+def test_token_bucket_refills_at_rate_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert bucket.take(max_wait=0) == 0
+    assert bucket.take(max_wait=0) == 0
+    assert bucket.take(max_wait=0) is None  # empty, not reserved
+    assert bucket.take(max_wait=1) == 0.5  # reserved, usable in half a second
+
+    clock.now += 10
+    assert bucket.take(max_wait=0) == 0
+
+
+def test_per_sender_bucket_throttles_one_long_code_but_not_another():
+    clock = FakeClock()
+    provider = StubProvider()
+    limited = RateLimitedProvider(
+        provider,
+        rate=100,
+        per_sender_rate=1,
+        per_sender_burst=1,
+        block=False,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    assert limited.send({"from": "+12016661234"}).status == ProviderStatus.SUCCESS
+    throttled = limited.send({"from": "+12016661234"})
+    assert throttled.status == ProviderStatus.RATE_LIMITED
+    assert throttled.throttled
+    assert throttled.retry_after_seconds >= 1
+    assert limited.send({"from": "+12016669999"}).status == ProviderStatus.SUCCESS
+
+    assert provider.calls == 2
+
+
+def test_sender_buckets_are_bounded_and_dropped_when_idle():
+    clock = FakeClock()
+    limited = RateLimitedProvider(
+        StubProvider(),
+        rate=0,
+        per_sender_rate=1,
+        block=False,
+        max_senders=2,
+        sender_idle_seconds=60,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    for n in range(5):
+        limited.send({"from": f"+1201666000{n}"})
+    assert limited.stats()["senders"]["size"] == 2
+
+    # Each use pushes a bucket's expiry back; an unused one expires
+    clock.now = 50
+    limited.send({"from": "+12016660004"})
+    clock.now = 100
+    assert limited._sender_buckets.get("+12016660004") is not None
+    assert limited._sender_buckets.get("+12016660003") is None
+
+
+def test_blocking_send_waits_for_a_token():
+    clock = FakeClock()
+    limited = RateLimitedProvider(
+        StubProvider(), rate=1, burst=1, clock=clock, sleep=clock.sleep
+    )
+
+    limited.send({})
+    limited.send({})
+    assert clock.now == 1.0
+
+
+def test_provider_rate_limited_shrinks_rate_and_honours_retry_after():
+    clock = FakeClock()
+    provider = StubProvider(ProviderStatus.RATE_LIMITED, retry_after=30)
+    limited = RateLimitedProvider(
+        provider, rate=10, block=False, clock=clock, sleep=clock.sleep
+    )
+
+    assert limited.send({}).status == ProviderStatus.RATE_LIMITED
+    assert limited.bucket.rate == 5
+
+    # Paused for the provider's retry-after, without calling it again
+    clock.now += 10
+    assert limited.send({}).throttled
+    assert provider.calls == 1
+
+    clock.now += 25
+    provider.status = ProviderStatus.SUCCESS
+    assert limited.send({}).status == ProviderStatus.SUCCESS
+    assert limited.bucket.rate > 5
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import SessionLocal, engine
+from app.main import app
+from app.routers.realtime import _sse
+from app.services import realtime
+from app.services.realtime import NotifyListener, broker, customer_topic, publish_on_commit
+from app.utils.pubsub import Broker, SlowConsumer
+
+
+client = TestClient(app)
+
+CUSTOMER = "+12016661234"
+
+
+def _send(body: str = "hello", to: str = "+18045551234") -> dict:
+    response = client.post(
+        "/api/messages/sms",
+        json={"from": CUSTOMER, "to": to, "type": "sms", "body": body, "timestamp": "2024-11-01T14:00:00Z"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_broker_fans_out_once_per_subscriber_and_drops_slow_ones():
+    encoded = []
+
+    def encode(item):
+        encoded.append(item)
+        return str(item)
+
+    async def scenario():
+        fan_out = Broker(queue_size=2, encode=encode)
+        both = fan_out.subscribe(["a", "b"])
+        slow = fan_out.subscribe(["c"])
+        fan_out.publish([(("a", "b"), 1), (("nobody",), 2)])
+        await asyncio.sleep(0)
+        assert await both.get() == "1"
+        assert both.queue.empty()
+        # Encoded once for both subscribers; never for an unheard topic
+        assert encoded == [1]
+
+        fan_out.publish([(("c",), n) for n in range(3, 6)])
+        await asyncio.sleep(0)
+        with pytest.raises(SlowConsumer):
+            await slow.get()
+        assert len(fan_out) == 1
+        fan_out.unsubscribe(both)
+        assert len(fan_out) == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_are_published_on_commit_only(db_session):
+    async def scenario():
+        subscription = broker.subscribe(["t"])
+        try:
+            with SessionLocal() as db:
+                db.execute(text("SELECT 1"))
+                publish_on_commit(db, [(("t",), {"n": 1})])
+                db.rollback()
+                publish_on_commit(db, [(("t",), {"n": 2})])
+                db.commit()
+            assert await asyncio.wait_for(subscription.get(), 5) == '{"n":2}'
+            assert subscription.queue.empty()
+        finally:
+            broker.unsubscribe(subscription)
+
+    asyncio.run(scenario())
+
+
+def test_websocket_receives_new_messages_for_the_customer(db_session):
+    with client.websocket_connect("/api/conversations/ws", params={"customer": CUSTOMER}) as ws:
+        sent = _send("pushed")
+        event = ws.receive_json()
+    assert event["id"] == int(sent["message_id"])
+    assert event["conversation_id"] == sent["conversation_id"]
+    assert (event["body"], event["direction"], event["status"]) == ("pushed", "outbound", "pending")
+    # Same shape as the delta sync endpoint
+    [change] = client.get(f"/api/conversations/{sent['conversation_id']}/messages/changes").json()["messages"]
+    assert event == change
+    assert len(broker) == 0
+
+
+def test_sse_stream_announces_itself_then_frames_events(db_session):
+    async def scenario():
+        stream = _sse([customer_topic(CUSTOMER)])
+        assert await anext(stream) == "event: ready\ndata: {}\n\n"
+        sent = await asyncio.to_thread(_send, "streamed")
+        frame = await asyncio.wait_for(anext(stream), 5)
+        await stream.aclose()
+        return sent, frame
+
+    sent, frame = asyncio.run(scenario())
+    assert frame.startswith("event: message\ndata: {")
+    assert f'"id":{sent["message_id"]}' in frame and '"body":"streamed"' in frame
+    assert len(broker) == 0
+
+
+def test_notify_bridge_delivers_each_commit_once(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "REALTIME_NOTIFY", True)
+    listener = NotifyListener(engine, SessionLocal, poll_seconds=0.05)
+    stop = threading.Event()
+    thread = threading.Thread(target=listener.run, args=(stop,), daemon=True)
+    thread.start()
+    assert listener.listening.wait(5)
+
+    async def scenario():
+        subscription = broker.subscribe([customer_topic(CUSTOMER)])
+        try:
+            # The second body is too long for a NOTIFY payload
+            bodies = ["short", "x" * (realtime.NOTIFY_PAYLOAD_LIMIT + 100)]
+            sent = [await asyncio.to_thread(_send, body) for body in bodies]
+            received = [await asyncio.wait_for(subscription.get(), 5) for _ in sent]
+            await asyncio.sleep(0.2)
+            assert subscription.queue.empty()
+            return sent, received
+        finally:
+            broker.unsubscribe(subscription)
+
+    try:
+        sent, received = asyncio.run(scenario())
+    finally:
+        stop.set()
+        thread.join(5)
+
+    assert [f'"id":{s["message_id"]}' in r for s, r in zip(sent, received)] == [True, True]
+    assert '"body":"short"' in received[0]
+    assert '"x' + "x" * 100 in received[1]
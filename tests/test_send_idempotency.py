@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.main import app
+from app.models import Message, OutboxEntry
+from app.utils.idempotency import send_idempotency
+
+
+client = TestClient(app)
+
+PAYLOAD = {
+    "from": "+12016661234",
+    "to": "+18045551234",
+    "type": "sms",
+    "body": "Hello once",
+    "attachments": None,
+    "timestamp": "2024-11-01T14:00:00Z",
+}
+
+
+def _count(db_session, model) -> int:
+    return db_session.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_retry_with_same_key_replays_response(db_session):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/api/messages/sms", json=PAYLOAD, headers=headers)
+    second = client.post("/api/messages/sms", json=PAYLOAD, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert _count(db_session, Message) == 1
+    assert _count(db_session, OutboxEntry) == 1
+
+
+def test_replay_survives_losing_the_in_memory_cache(db_session):
+    headers = {"Idempotency-Key": "retry-2"}
+    first = client.post("/api/messages/sms", json=PAYLOAD, headers=headers)
+    send_idempotency.cache.clear()  # e.g. a different API process
+
+    second = client.post("/api/messages/sms", json=PAYLOAD, headers=headers)
+
+    assert second.json() == first.json()
+    assert _count(db_session, Message) == 1
+
+
+def test_same_key_with_different_body_is_rejected(db_session):
+    headers = {"Idempotency-Key": "retry-3"}
+    client.post("/api/messages/sms", json=PAYLOAD, headers=headers)
+
+    response = client.post(
+        "/api/messages/sms", json=dict(PAYLOAD, body="Something else"), headers=headers
+    )
+
+    assert response.status_code == 422
+    assert _count(db_session, Message) == 1
+
+
+def test_concurrent_requests_with_same_key_are_coalesced(db_session):
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(
+                *(
+                    ac.post(
+                        "/api/messages/sms",
+                        json=PAYLOAD,
+                        headers={"Idempotency-Key": "burst-1"},
+                    )
+                    for _ in range(5)
+                )
+            )
+
+    responses = asyncio.run(burst())
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["message_id"] for r in responses}) == 1
+    assert _count(db_session, OutboxEntry) == 1
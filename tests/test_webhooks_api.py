@@ -0,0 +1,76 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.main import app
+from app.models import Message
+
+
+client = TestClient(app)
+
+
+def _sms_payload(provider_id: str) -> dict:
+    return {
+        "from": "+18045551234",
+        "to": "+12016661234",
+        "type": "sms",
+        "messaging_provider_id": provider_id,
+        "body": "This is an incoming SMS message",
+        "attachments": None,
+        "timestamp": "2024-11-01T14:00:00Z",
+    }
+
+
+def _message_count(db_session) -> int:
+    return db_session.execute(select(func.count()).select_from(Message)).scalar_one()
+
+
+def test_sms_webhook_replay_is_acknowledged_without_duplicate_insert(db_session):
+    for _ in range(3):
+        response = client.post("/api/webhooks/sms", json=_sms_payload("message-1"))
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok"}
+
+    assert _message_count(db_session) == 1
+
+
+def test_email_webhook_batch_dedupes_within_and_across_batches(db_session):
+    def email(xillio_id: str) -> dict:
+        return {
+            "from": "contact@gmail.com",
+            "to": "user@usehatchapp.com",
+            "xillio_id": xillio_id,
+            "body": "Inbound email",
+            "timestamp": "2024-11-01T14:00:00Z",
+        }
+
+    first = client.post(
+        "/api/webhooks/email/batch",
+        json=[email("x-1"), email("x-2"), email("x-1")],
+    )
+    assert first.status_code == 200
+    assert first.json() == {"status": "ok", "received": 3, "inserted": 2, "duplicates": 1}
+
+    second = client.post(
+        "/api/webhooks/email/batch",
+        json=[email("x-2"), email("x-3")],
+    )
+    assert second.json() == {"status": "ok", "received": 2, "inserted": 1, "duplicates": 1}
+
+    assert _message_count(db_session) == 3
+
+
+def test_known_replay_is_acknowledged_from_the_dedupe_filter(db_session, monkeypatch):
+    from app.routers import webhooks
+    from app.utils.idempotency import webhook_dedupe
+
+    assert client.post("/api/webhooks/sms", json=_sms_payload("message-2")).status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError("replay should not reach the database")
+
+    monkeypatch.setattr(webhooks.conversation_service, "create_messages", fail)
+    response = client.post("/api/webhooks/sms", json=_sms_payload("message-2"))
+
+    assert response.status_code == 200
+    assert webhook_dedupe.stats()["known_duplicates"] == 1
+    assert _message_count(db_session) == 1